@@ -4,3 +4,28 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from main.models import Product
+
+        from .keys import drop_cached_keys
+        from .models import IntegrationKey
+        from .product_cache import drop_deleted_product
+
+        post_delete.connect(
+            drop_deleted_product,
+            sender=Product,
+            dispatch_uid="api.product_cache.drop_deleted_product",
+        )
+        post_save.connect(
+            drop_cached_keys,
+            sender=IntegrationKey,
+            dispatch_uid="api.keys.drop_cached_keys.save",
+        )
+        post_delete.connect(
+            drop_cached_keys,
+            sender=IntegrationKey,
+            dispatch_uid="api.keys.drop_cached_keys.delete",
+        )
@@ -0,0 +1,186 @@
+"""Async versions of the hot 1C endpoints, served when ``ONEC_ASYNC_VIEWS`` is on.
+
+Under ASGI (``DJANGO_SERVER=asgi``: gunicorn with uvicorn workers) one worker
+process interleaves many requests instead of holding one per sync worker.
+Parsing, validation and responses reuse the helpers from ``api.views``, so
+both variants answer identically; only the database access differs.
+
+Django's async ORM cannot open transactions, so ``_process_receipt`` and
+``_apply_product_update`` run through ``sync_to_async``. Under the ASGI
+handler that is a per-request thread holding the request's connection; the
+event loop stays free while they wait on the database. Customer sync only
+issues single-row queries and uses the async ORM directly.
+
+The transaction export streams from an async generator that fetches one
+keyset page at a time through ``sync_to_async``. Django buffers a sync
+iterator of a ``StreamingHttpResponse`` in full under ASGI, so the sync
+view would hold the whole export in memory before sending the first byte.
+"""
+
+from __future__ import annotations
+
+import csv
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from backend.db.router import read_from_replica
+from main.models import CustomUser, Product
+
+from .codec import json_response
+from .metrics import receipt_rejected
+from .models import OneCClientMap
+from .security import require_onec_auth
+from . import views
+from .views import (
+    _Echo,
+    _apply_product_update,
+    _customer_response,
+    _csv_line,
+    _customer_write_mode,
+    _export_page,
+    _export_response,
+    _match_customer,
+    _ndjson_line,
+    _parse_export_request,
+    _parse_customer_request,
+    _parse_product_request,
+    _parse_receipt_request,
+    _prepare_customer_update,
+    _process_receipt,
+    _product_response,
+)
+
+
+@require_GET
+@csrf_exempt
+async def healthz(_request):
+    """Public health-check endpoint for container orchestration."""
+
+    return json_response({"status": "ok"})
+
+
+@csrf_exempt
+@require_POST
+@require_onec_auth(scope="receipts")
+async def onec_receipt(request):
+    parsed = _parse_receipt_request(request)
+    if isinstance(parsed, HttpResponse):
+        receipt_rejected(parsed.status_code)
+        return parsed
+    return await sync_to_async(_process_receipt)(*parsed)
+
+
+@csrf_exempt
+@require_POST
+@require_onec_auth(scope="customers")
+async def onec_customer_sync(request):
+    parsed = _parse_customer_request(request)
+    if isinstance(parsed, HttpResponse):
+        return parsed
+    data, telegram_id, qr_code = parsed
+
+    with nullcontext() if _customer_write_mode(data) else read_from_replica():
+        return await _sync_customer(data, telegram_id, qr_code)
+
+
+async def _sync_customer(data, telegram_id: int | None, qr_code: str) -> HttpResponse:
+    customers = CustomUser.objects.select_related("referrer")
+    user = _match_customer(
+        telegram_id,
+        qr_code,
+        await customers.filter(qr_code=qr_code).afirst() if qr_code else None,
+        await customers.filter(telegram_id=telegram_id).afirst() if telegram_id is not None else None,
+    )
+    if isinstance(user, HttpResponse):
+        return user
+
+    update = _prepare_customer_update(data, user)
+    if isinstance(update, HttpResponse):
+        return update
+
+    if update["referrer_telegram_id"]:
+        ref_user = await CustomUser.objects.filter(
+            telegram_id=update["referrer_telegram_id"]
+        ).afirst()
+        if ref_user:
+            user.referrer = ref_user
+
+    if update["write_mode"]:
+        await user.asave()
+
+    one_c_guid = update["one_c_guid"]
+    if one_c_guid:
+        await OneCClientMap.objects.aupdate_or_create(
+            one_c_guid=one_c_guid,
+            defaults={"user": user},
+        )
+
+    mapping = await OneCClientMap.objects.filter(user=user).afirst()
+    guid_for_resp = getattr(mapping, "one_c_guid", None) or (one_c_guid or None)
+    return _customer_response(user, guid_for_resp, update["write_mode"])
+
+
+@csrf_exempt
+@require_POST
+@require_onec_auth(scope="products")
+async def onec_product_sync(request):
+    data = _parse_product_request(request)
+    if isinstance(data, HttpResponse):
+        return data
+
+    sync_status = await sync_to_async(_apply_product_update)(data)
+    product = await Product.objects.aget(product_code=data["product_code"])
+    return _product_response(product, sync_status)
+
+
+async def _aiter_export_rows(filters, after_id: int, limit: int | None):
+    """Async twin of ``views._iter_export_rows``: one keyset page per query."""
+
+    fetch_page = sync_to_async(_export_page)
+    remaining = limit
+    last_id = after_id
+    while remaining is None or remaining > 0:
+        page_size = (
+            views.EXPORT_PAGE_SIZE if remaining is None else min(views.EXPORT_PAGE_SIZE, remaining)
+        )
+        rows = await fetch_page(filters, last_id, page_size)
+        for row in rows:
+            yield row
+        if rows:
+            last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < page_size:
+            return
+
+
+async def _andjson_lines(rows):
+    async for row in rows:
+        yield _ndjson_line(row)
+
+
+async def _acsv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(views.EXPORT_COLUMNS)
+    async for row in rows:
+        yield _csv_line(writer, row)
+
+
+@csrf_exempt
+@require_GET
+@require_onec_auth(scope="export")
+async def onec_export_transactions(request):
+    """Stream transactions as NDJSON (default) or CSV, one page in memory at a time."""
+
+    parsed = _parse_export_request(request)
+    if isinstance(parsed, HttpResponse):
+        return parsed
+    export_format, filters, after_id, limit = parsed
+
+    rows = _aiter_export_rows(filters, after_id, limit)
+    lines = _acsv_lines(rows) if export_format == "csv" else _andjson_lines(rows)
+    return _export_response(lines, export_format)
@@ -0,0 +1,84 @@
+"""JSON codec for the ``/onec/*`` endpoints.
+
+Uses orjson when it is installed and the standard library otherwise. Request
+bodies are parsed straight from bytes, without decoding them to ``str`` first.
+The stdlib fallback parses JSON numbers with a fraction as ``Decimal``. orjson
+returns ``float``; DRF's DecimalField and ``_as_decimal`` turn it back into a
+Decimal through ``str()``, which is exact for amounts of up to 15 significant
+digits only. ``loads(..., exact_decimals=True)`` always parses with the
+stdlib and ``Decimal``, so money payloads validate to the same values
+whichever backend is installed, and excess digits are rejected by
+``max_digits`` instead of being rounded away.
+
+``Decimal`` values are written as JSON numbers, so views can pass amounts
+as-is instead of calling ``float()``. On orjson 3.9+ the digits are copied
+verbatim via ``orjson.Fragment``. Otherwise the value is written as the
+shortest float repr, which gives the same text for money amounts.
+``decimal_as_string=True`` keeps the ``DjangoJSONEncoder`` convention of
+quoted decimals used by the export.
+"""
+
+from __future__ import annotations
+
+import json
+from decimal import Decimal
+from typing import Any
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError  # orjson.JSONDecodeError is a subclass
+BACKEND = "orjson" if orjson is not None else "json"
+_FRAGMENT = getattr(orjson, "Fragment", None)
+
+
+def loads(data: bytes | bytearray | str, *, exact_decimals: bool = False) -> Any:
+    if orjson is not None and not exact_decimals:
+        return orjson.loads(data)
+    return json.loads(data, parse_float=Decimal)
+
+
+def _decimal_number(obj):
+    if isinstance(obj, Decimal):
+        if _FRAGMENT is not None and obj.is_finite():
+            return _FRAGMENT(str(obj).encode())
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _decimal_string(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return DjangoJSONEncoder().default(obj)
+
+
+class _NumberEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+def dumps(obj: Any, *, decimal_as_string: bool = False) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=_decimal_string if decimal_as_string else _decimal_number,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+        )
+    encoder = DjangoJSONEncoder if decimal_as_string else _NumberEncoder
+    return json.dumps(obj, cls=encoder, ensure_ascii=False).encode()
+
+
+def json_response(payload: Any, *, status: int = 200) -> HttpResponse:
+    """Drop-in for ``JsonResponse`` that serializes through this codec."""
+
+    return HttpResponse(dumps(payload), status=status, content_type="application/json")
+
+
+__all__ = ["BACKEND", "JSONDecodeError", "dumps", "json_response", "loads"]
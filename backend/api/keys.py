@@ -0,0 +1,153 @@
+"""In-process registry of per-store integration API keys.
+
+Keys are stored only as an HMAC-SHA256 digest keyed with
+``settings.INTEGRATION_KEY_PEPPER``. Each worker keeps every usable key in a
+dict keyed by that digest, so authenticating a request costs one HMAC and one
+dict lookup, with no database query. The map is reloaded after
+``settings.INTEGRATION_KEY_CACHE_TTL`` seconds. It is also reloaded right away
+when a key is saved or deleted in this process, so a revocation reaches other
+workers within the TTL. Under ASGI the map is never loaded from the event loop;
+async callers refresh it with ``aensure_loaded`` first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+KEY_PREFIX_LENGTH = 8
+SCOPES = frozenset({"receipts", "customers", "products", "export", "messages"})
+# Only these endpoints check the key's store; the others act on all stores.
+STORE_SCOPES = frozenset({"receipts", "export"})
+
+
+@dataclass(frozen=True)
+class ApiKeyIdentity:
+    """Who is calling: attached to the request as ``request.onec_key``."""
+
+    name: str
+    store_id: int | None
+    scopes: frozenset[str]
+    valid_from: datetime | None = None
+    valid_until: datetime | None = None
+
+    def is_valid(self, now: datetime) -> bool:
+        if self.valid_from is not None and now < self.valid_from:
+            return False
+        return self.valid_until is None or now < self.valid_until
+
+    def allows(self, scope: str | None) -> bool:
+        if scope is None:
+            return True
+        if self.store_id is not None and scope not in STORE_SCOPES:
+            return False
+        return "*" in self.scopes or scope in self.scopes
+
+    def allows_store(self, store_id) -> bool:
+        return self.store_id is None or str(self.store_id) == str(store_id).strip()
+
+
+def parse_scopes(value: str) -> frozenset[str]:
+    return frozenset(scope.strip() for scope in (value or "").split(",") if scope.strip())
+
+
+def hash_key(raw_key: str) -> str:
+    pepper = getattr(settings, "INTEGRATION_KEY_PEPPER", None) or settings.SECRET_KEY
+    return hmac.new(pepper.encode(), raw_key.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_key() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class KeyRegistry:
+    def __init__(self):
+        self._keys: dict[str, ApiKeyIdentity] = {}
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from .models import IntegrationKey
+
+        now = timezone.now()
+        rows = (
+            IntegrationKey.objects.filter(is_active=True)
+            .exclude(valid_until__lte=now)
+            .values_list("key_hash", "name", "store_id", "scopes", "valid_from", "valid_until")
+        )
+        keys = {
+            key_hash: ApiKeyIdentity(name, store_id, parse_scopes(scopes), valid_from, valid_until)
+            for key_hash, name, store_id, scopes, valid_from, valid_until in rows
+        }
+        with self._lock:
+            self._keys = keys
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        ttl = getattr(settings, "INTEGRATION_KEY_CACHE_TTL", 60)
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at >= ttl
+
+    def _current(self) -> dict[str, ApiKeyIdentity]:
+        # В event loop запросы к БД запрещены: там ключи обновляет aensure_loaded
+        if self.is_stale() and not _in_event_loop():
+            self._load()
+        return self._keys
+
+    async def aensure_loaded(self):
+        """Reload outside the event loop, so async callers never query the DB inline."""
+
+        if self.is_stale():
+            await sync_to_async(self._load)()
+
+    def resolve(self, raw_key: str) -> ApiKeyIdentity | None:
+        identity = self._current().get(hash_key(raw_key))
+        if identity is None or not identity.is_valid(timezone.now()):
+            return None
+        return identity
+
+    def has_keys(self) -> bool:
+        return bool(self._current())
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+key_registry = KeyRegistry()
+
+
+def drop_cached_keys(sender, **kwargs):
+    key_registry.invalidate()
+
+
+__all__ = [
+    "ApiKeyIdentity",
+    "KEY_PREFIX_LENGTH",
+    "KeyRegistry",
+    "SCOPES",
+    "STORE_SCOPES",
+    "drop_cached_keys",
+    "generate_key",
+    "hash_key",
+    "key_registry",
+    "parse_scopes",
+]
@@ -0,0 +1,142 @@
+"""Measure per-request CPU spent on JSON for ``/onec/receipt``.
+
+Builds synthetic receipts with 10, 100 and 1000 lines. For each size it times
+parsing the body, validating it and rendering a response with one allocation
+per line. The stdlib path (``json.loads`` on a decoded ``str`` plus
+``JsonResponse`` with ``float()`` amounts) is compared with ``api.codec``, and
+with ``api.codec`` plus the compiled validator from ``api.receipt_schema``.
+Only CPU time is counted (``time.process_time``); the database is not touched.
+
+Usage:
+    python manage.py benchmark_onec_codec
+    python manage.py benchmark_onec_codec --sizes 10,1000 --iterations 50
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+
+from api import codec
+from api.receipt_schema import validate_receipt
+from api.serializers import ReceiptSerializer
+
+
+def build_receipt(lines: int) -> bytes:
+    positions = [
+        {
+            "product_code": f"SKU-{i}",
+            "name": f"Товар {i}",
+            "quantity": "1.000",
+            "price": "123.45",
+            "discount_amount": "0.00",
+            "line_number": i,
+            "bonus_earned": "1.23",
+        }
+        for i in range(1, lines + 1)
+    ]
+    payload = {
+        "receipt_guid": f"BENCH-{lines}",
+        "datetime": "2025-03-10T12:30:00+09:00",
+        "store_id": "1",
+        "customer": {"telegram_id": 1},
+        "positions": positions,
+        "totals": {
+            "total_amount": str(Decimal("123.45") * lines),
+            "discount_total": "0.00",
+            "bonus_spent": "0.00",
+            "bonus_earned": str(Decimal("1.23") * lines),
+        },
+    }
+    return json.dumps(payload, ensure_ascii=False).encode()
+
+
+def _allocations(data):
+    return [
+        {
+            "product_code": p["product_code"],
+            "quantity": p["quantity"],
+            "total_amount": p["price"] * p["quantity"],
+            "bonus_earned": p.get("bonus_earned") or Decimal("0"),
+        }
+        for p in data["positions"]
+    ]
+
+
+def stdlib_request(body: bytes):
+    serializer = ReceiptSerializer(data=json.loads(body.decode("utf-8")))
+    serializer.is_valid(raise_exception=True)
+    allocations = [
+        {key: float(value) if isinstance(value, Decimal) else value for key, value in item.items()}
+        for item in _allocations(serializer.validated_data)
+    ]
+    return JsonResponse({"status": "ok", "allocations": allocations}, status=201)
+
+
+def codec_request(body: bytes):
+    serializer = ReceiptSerializer(data=codec.loads(body))
+    serializer.is_valid(raise_exception=True)
+    allocations = _allocations(serializer.validated_data)
+    return codec.json_response({"status": "ok", "allocations": allocations}, status=201)
+
+
+def compiled_request(body: bytes):
+    data = validate_receipt(codec.loads(body))
+    if data is None:
+        raise CommandError("benchmark receipt rejected by the compiled validator")
+    allocations = _allocations(data)
+    return codec.json_response({"status": "ok", "allocations": allocations}, status=201)
+
+
+def cpu_per_call(func, body: bytes, iterations: int) -> float:
+    func(body)  # warm-up
+    started = time.process_time()
+    for _ in range(iterations):
+        func(body)
+    return (time.process_time() - started) / iterations
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON parsing/rendering for /onec/receipt payloads"
+
+    variants = (
+        ("stdlib", stdlib_request),
+        ("codec", codec_request),
+        ("compiled", compiled_request),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10,100,1000",
+            help="Comma-separated receipt line counts (default 10,100,1000)",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Requests per measurement (default 20)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers") from None
+        if not sizes or min(sizes) < 1 or options["iterations"] < 1:
+            raise CommandError("--sizes and --iterations must be positive")
+
+        self.stdout.write(f"JSON backend: {codec.BACKEND}")
+        header = f"{'lines':>6}" + "".join(f"{name:>12}" for name, _ in self.variants)
+        self.stdout.write(header + "   (ms CPU per request)")
+        for size in sizes:
+            body = build_receipt(size)
+            timings = [
+                cpu_per_call(func, body, options["iterations"]) * 1000
+                for _, func in self.variants
+            ]
+            self.stdout.write(f"{size:>6}" + "".join(f"{ms:>12.3f}" for ms in timings))
@@ -0,0 +1,137 @@
+"""Issue, list, rotate and revoke per-store integration API keys.
+
+A new key is printed exactly once; only its HMAC digest is stored. Rotation
+issues a replacement with the same store and scopes. The old key keeps working
+for ``--overlap-hours``, so registers can be switched over without downtime.
+
+Usage:
+    python manage.py integration_keys create --name store-12 --store-id 12 --scopes receipts,export
+    python manage.py integration_keys list
+    python manage.py integration_keys rotate 5 --overlap-hours 48
+    python manage.py integration_keys revoke 5
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.keys import (
+    KEY_PREFIX_LENGTH,
+    SCOPES,
+    STORE_SCOPES,
+    generate_key,
+    hash_key,
+    parse_scopes,
+)
+from api.models import IntegrationKey
+
+
+class Command(BaseCommand):
+    help = "Manage per-store integration API keys"
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest="action", required=True)
+
+        create = actions.add_parser("create", help="Issue a new key")
+        create.add_argument("--name", required=True, help="Human-readable key name")
+        create.add_argument("--store-id", type=int, help="Bind the key to one store")
+        create.add_argument(
+            "--scopes",
+            required=True,
+            help=(
+                "Comma-separated scopes: receipts, customers, products, export, messages, "
+                "or * for all; a key with --store-id may only get receipts and export"
+            ),
+        )
+        create.add_argument("--valid-days", type=int, help="Expire the key after this many days")
+
+        actions.add_parser("list", help="List keys")
+
+        rotate = actions.add_parser("rotate", help="Replace a key, keeping the old one for a while")
+        rotate.add_argument("key_id", type=int)
+        rotate.add_argument(
+            "--overlap-hours",
+            type=int,
+            default=24,
+            help="How long the old key stays valid (default 24)",
+        )
+
+        revoke = actions.add_parser("revoke", help="Disable a key immediately")
+        revoke.add_argument("key_id", type=int)
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['action']}")(options)
+
+    def _issue(self, **fields) -> IntegrationKey:
+        raw_key = generate_key()
+        key = IntegrationKey.objects.create(
+            key_hash=hash_key(raw_key), key_prefix=raw_key[:KEY_PREFIX_LENGTH], **fields
+        )
+        self.stdout.write(self.style.SUCCESS(f"Key #{key.pk} {key.name}: {raw_key}"))
+        self.stdout.write("Store it now; it cannot be shown again.")
+        return key
+
+    def _get(self, key_id: int) -> IntegrationKey:
+        try:
+            return IntegrationKey.objects.get(pk=key_id)
+        except IntegrationKey.DoesNotExist:
+            raise CommandError(f"Key #{key_id} not found") from None
+
+    def _create(self, options):
+        scopes = parse_scopes(options["scopes"])
+        if not scopes:
+            raise CommandError("--scopes must not be empty")
+        unknown = scopes - SCOPES - {"*"}
+        if unknown:
+            raise CommandError(f"Unknown scopes: {', '.join(sorted(unknown))}")
+        if options["store_id"] is not None and not scopes <= STORE_SCOPES:
+            raise CommandError(
+                "A store key may only have the scopes " + ", ".join(sorted(STORE_SCOPES))
+            )
+        valid_until = None
+        if options["valid_days"] is not None:
+            if options["valid_days"] < 1:
+                raise CommandError("--valid-days must be positive")
+            valid_until = timezone.now() + timedelta(days=options["valid_days"])
+        self._issue(
+            name=options["name"],
+            store_id=options["store_id"],
+            scopes=",".join(sorted(scopes)),
+            valid_until=valid_until,
+        )
+
+    def _list(self, options):
+        now = timezone.now()
+        for key in IntegrationKey.objects.order_by("pk"):
+            expired = key.valid_until is not None and key.valid_until <= now
+            state = "revoked" if not key.is_active else "expired" if expired else "active"
+            store = key.store_id if key.store_id is not None else "all"
+            until = key.valid_until.isoformat() if key.valid_until else "-"
+            self.stdout.write(
+                f"#{key.pk} {key.name} {key.key_prefix}… store={store} "
+                f"scopes={key.scopes} until={until} {state}"
+            )
+
+    def _rotate(self, options):
+        if options["overlap_hours"] < 0:
+            raise CommandError("--overlap-hours must not be negative")
+        old = self._get(options["key_id"])
+        if not old.is_active:
+            raise CommandError(f"Key #{old.pk} is revoked")
+        cutoff = timezone.now() + timedelta(hours=options["overlap_hours"])
+        with transaction.atomic():
+            self._issue(name=old.name, store_id=old.store_id, scopes=old.scopes)
+            if old.valid_until is None or old.valid_until > cutoff:
+                old.valid_until = cutoff
+                old.save(update_fields=["valid_until"])
+        self.stdout.write(f"Key #{old.pk} stays valid until {old.valid_until.isoformat()}")
+
+    def _revoke(self, options):
+        key = self._get(options["key_id"])
+        key.is_active = False
+        key.save(update_fields=["is_active"])
+        self.stdout.write(self.style.SUCCESS(f"Key #{key.pk} revoked"))
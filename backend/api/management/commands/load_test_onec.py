@@ -0,0 +1,167 @@
+"""Load-test a running backend and report concurrency per worker.
+
+Fires ``--requests`` calls at one endpoint with ``--concurrency`` of them in
+flight, then prints throughput, latency percentiles and the error breakdown.
+The average number of requests the server held at once follows from Little's
+law (throughput x mean latency); divided by ``--workers`` it gives the
+concurrency each gunicorn worker sustained. A sync worker cannot exceed 1.0;
+uvicorn workers (``DJANGO_SERVER=asgi``) should go well above it while latency
+stays flat. Run it once against each mode with the same settings to compare.
+
+Receipts and products get unique codes on every call, so point this at a
+staging database, not production.
+
+Usage:
+    python manage.py load_test_onec --endpoint healthz --concurrency 100
+    python manage.py load_test_onec --url http://staging:8000 --endpoint receipt \\
+        --api-key ... --telegram-id 123 --requests 2000 --workers 3
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import aiohttp
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_onec_codec import build_receipt
+
+ENDPOINTS = {
+    "healthz": ("GET", "/healthz/"),
+    "receipt": ("POST", "/onec/receipt"),
+    "customer": ("POST", "/onec/customer"),
+    "product": ("POST", "/onec/product"),
+}
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Load-test /healthz/ or an /onec endpoint and report concurrency per worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend base URL")
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="healthz")
+        parser.add_argument(
+            "--api-key",
+            default=os.getenv("INTEGRATION_API_KEY", ""),
+            help="X-Api-Key for /onec endpoints (default INTEGRATION_API_KEY)",
+        )
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight")
+        parser.add_argument("--requests", type=int, default=1000, help="Total requests")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=int(os.getenv("GUNICORN_WORKERS", "3")),
+            help="Worker processes serving the target (default GUNICORN_WORKERS or 3)",
+        )
+        parser.add_argument("--lines", type=int, default=10, help="Lines per receipt")
+        parser.add_argument(
+            "--telegram-id",
+            type=int,
+            default=1,
+            help="Existing customer used by receipt and customer requests",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout, s")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["requests"] < 1 or options["workers"] < 1:
+            raise CommandError("--concurrency, --requests and --workers must be positive")
+        if options["endpoint"] != "healthz" and not options["api_key"]:
+            raise CommandError("--api-key is required for /onec endpoints")
+
+        latencies, statuses, elapsed = asyncio.run(self._run(options))
+        self._report(options, latencies, statuses, elapsed)
+
+    def _build_body(self, endpoint: str, options) -> tuple[bytes | None, dict[str, str]]:
+        headers = {"X-Api-Key": options["api_key"]} if endpoint != "healthz" else {}
+        unique = uuid.uuid4().hex
+        if endpoint == "receipt":
+            payload = json.loads(build_receipt(options["lines"]))
+            payload["receipt_guid"] = f"LOAD-{unique}"
+            payload["customer"] = {"telegram_id": options["telegram_id"]}
+            headers["X-Idempotency-Key"] = unique
+        elif endpoint == "customer":
+            payload = {"telegram_id": options["telegram_id"]}
+        elif endpoint == "product":
+            payload = {
+                "product_code": f"LOAD-{unique[:16]}",
+                "name": "Load test",
+                "price": "10.00",
+                "category": "load-test",
+                "is_promotional": False,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+        else:
+            return None, headers
+        headers["Content-Type"] = "application/json"
+        return json.dumps(payload, ensure_ascii=False).encode(), headers
+
+    async def _run(self, options):
+        endpoint = options["endpoint"]
+        method, path = ENDPOINTS[endpoint]
+        url = options["url"].rstrip("/") + path
+        latencies: list[float] = []
+        statuses: Counter = Counter()
+        remaining = iter(range(options["requests"]))
+
+        async def client(session: aiohttp.ClientSession):
+            for _ in remaining:
+                body, headers = self._build_body(endpoint, options)
+                started = time.perf_counter()
+                try:
+                    async with session.request(method, url, data=body, headers=headers) as resp:
+                        await resp.read()
+                        statuses[resp.status] += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    statuses[type(exc).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        timeout = aiohttp.ClientTimeout(total=options["timeout"])
+        connector = aiohttp.TCPConnector(limit=options["concurrency"])
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            started = time.perf_counter()
+            await asyncio.gather(*(client(session) for _ in range(options["concurrency"])))
+            elapsed = time.perf_counter() - started
+        return latencies, statuses, elapsed
+
+    def _report(self, options, latencies: list[float], statuses: Counter, elapsed: float):
+        ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+        latencies.sort()
+        mean = statistics.fmean(latencies) if latencies else 0.0
+        throughput = len(latencies) / elapsed if elapsed else 0.0
+        in_flight = throughput * mean
+
+        self.stdout.write(
+            f"{options['endpoint']}: {len(latencies)} requests, concurrency {options['concurrency']}, "
+            f"{elapsed:.2f}s"
+        )
+        self.stdout.write(f"  throughput      {throughput:10.1f} req/s")
+        self.stdout.write(
+            "  latency, ms     "
+            f"p50 {_percentile(latencies, 0.50) * 1000:.1f}  "
+            f"p95 {_percentile(latencies, 0.95) * 1000:.1f}  "
+            f"p99 {_percentile(latencies, 0.99) * 1000:.1f}  "
+            f"max {(latencies[-1] if latencies else 0) * 1000:.1f}"
+        )
+        self.stdout.write(f"  in flight (avg) {in_flight:10.1f}")
+        self.stdout.write(
+            f"  per worker      {in_flight / options['workers']:10.2f} "
+            f"({options['workers']} workers)"
+        )
+        breakdown = ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str))
+        self.stdout.write(f"  responses       {breakdown}")
+        if ok < len(latencies):
+            self.stdout.write(self.style.WARNING(f"  {len(latencies) - ok} requests failed"))
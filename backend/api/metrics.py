@@ -0,0 +1,151 @@
+"""Prometheus metrics for the ``/onec/receipt`` hot path.
+
+``django_prometheus`` only shows how long the whole view takes. These metrics
+split that time into stages and describe each receipt:
+
+* ``onec_receipt_stage_seconds{stage}``: time per stage. The stages are
+  ``parse`` and ``validate`` (no database), then ``idempotency``,
+  ``customer``, ``allocation`` (bonus split), ``dedupe`` (existing-lines
+  check), ``lines`` (product lookup and the write transaction),
+  ``aggregate`` (customer totals) and ``respond``;
+* ``onec_receipts_total{store,customer,outcome}``: receipts by store (see
+  ``store_label``),
+  ``guest``/``identified`` customer and ``created``/``already_exists``/
+  ``rejected`` outcome;
+* ``onec_receipt_lines{store}`` and ``onec_receipt_db_queries{store}``:
+  lines and SQL queries per receipt;
+* ``onec_receipt_lines_processed_total{store,result}``: ``created`` and
+  ``duplicate`` lines.
+
+Stage timing uses one ``perf_counter`` call per stage. Everything else is
+recorded once per receipt in ``ReceiptTrace.finish``. The metrics are served
+by the existing ``/metrics`` endpoint.
+
+``store_id`` comes from the request body, so it is not used as a label
+directly. A store-bound API key labels its receipts with its own store.
+Otherwise only stores listed in ``settings.ONEC_METRICS_STORES`` get their
+own label, and everything else is counted under ``other``.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from prometheus_client import Counter, Histogram
+
+STAGES = (
+    "parse",
+    "validate",
+    "idempotency",
+    "customer",
+    "allocation",
+    "dedupe",
+    "lines",
+    "aggregate",
+    "respond",
+)
+
+RECEIPT_STAGE_SECONDS = Histogram(
+    "onec_receipt_stage_seconds",
+    "Time spent in each /onec/receipt processing stage",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+RECEIPTS = Counter(
+    "onec_receipts",
+    "Receipts posted to /onec/receipt",
+    ["store", "customer", "outcome"],
+)
+RECEIPT_LINES = Histogram(
+    "onec_receipt_lines",
+    "Lines per receipt",
+    ["store"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+RECEIPT_DB_QUERIES = Histogram(
+    "onec_receipt_db_queries",
+    "SQL queries issued while processing one receipt",
+    ["store"],
+    buckets=(5, 10, 20, 50, 100, 200, 500, 1000, 2000),
+)
+RECEIPT_LINE_RESULTS = Counter(
+    "onec_receipt_lines_processed",
+    "Receipt lines written (created) or found already stored (duplicate)",
+    ["store", "result"],
+)
+
+stage_timer = {stage: RECEIPT_STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+
+def _outcome(status_code: int) -> str:
+    if status_code == 201:
+        return "created"
+    if status_code == 200:
+        return "already_exists"
+    return "rejected"
+
+
+def store_label(store_id, onec_key=None) -> str:
+    """Bounded ``store`` label for a receipt that passed the key's store check."""
+
+    if onec_key is not None and onec_key.store_id is not None:
+        return str(onec_key.store_id)
+    store = str(store_id).strip()
+    return store if store in settings.ONEC_METRICS_STORES else "other"
+
+
+def receipt_rejected(status_code: int):
+    """Count a receipt refused before its store is known (bad JSON, invalid payload)."""
+
+    RECEIPTS.labels("unknown", "unknown", _outcome(status_code)).inc()
+
+
+class ReceiptTrace:
+    """Measurements of one receipt, filled in by ``_apply_receipt``."""
+
+    __slots__ = ("_last", "queries", "guest", "created", "duplicates")
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        self.queries = 0
+        self.guest: bool | None = None
+        self.created = 0
+        self.duplicates = 0
+
+    def lap(self, stage: str):
+        """Close ``stage``: observe the time since the previous lap."""
+
+        now = time.perf_counter()
+        stage_timer[stage].observe(now - self._last)
+        self._last = now
+
+    def count_query(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook."""
+
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def finish(self, store: str, lines: int, status_code: int):
+        customer = "unknown" if self.guest is None else ("guest" if self.guest else "identified")
+        RECEIPTS.labels(store, customer, _outcome(status_code)).inc()
+        RECEIPT_LINES.labels(store).observe(lines)
+        RECEIPT_DB_QUERIES.labels(store).observe(self.queries)
+        if self.created:
+            RECEIPT_LINE_RESULTS.labels(store, "created").inc(self.created)
+        if self.duplicates:
+            RECEIPT_LINE_RESULTS.labels(store, "duplicate").inc(self.duplicates)
+
+
+__all__ = [
+    "RECEIPTS",
+    "RECEIPT_DB_QUERIES",
+    "RECEIPT_LINES",
+    "RECEIPT_LINE_RESULTS",
+    "RECEIPT_STAGE_SECONDS",
+    "STAGES",
+    "ReceiptTrace",
+    "receipt_rejected",
+    "stage_timer",
+    "store_label",
+]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 23:14
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_onecclientmap_user'),
+        ('main', '0016_birthdaygreeting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Отправляется'), ('done', 'Завершена')], default='queued', max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'api_message_job',
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageJobRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('forbidden', 'Бот заблокирован'), ('not_found', 'Клиент не найден')], default='pending', max_length=16)),
+                ('telegram_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.customuser')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='api.messagejob')),
+            ],
+            options={
+                'db_table': 'api_message_job_recipient',
+                'constraints': [models.UniqueConstraint(fields=('job', 'telegram_id'), name='message_job_recipient_uc')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 23:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_message_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntegrationKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('key_prefix', models.CharField(max_length=12)),
+                ('key_hash', models.CharField(max_length=64, unique=True)),
+                ('store_id', models.IntegerField(blank=True, null=True)),
+                ('scopes', models.CharField(default='*', max_length=255)),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'api_integration_key',
+            },
+        ),
+    ]
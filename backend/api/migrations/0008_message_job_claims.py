@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-20 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_integration_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagejobrecipient',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='messagejobrecipient',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('forbidden', 'Бот заблокирован'), ('not_found', 'Клиент не найден')], default='pending', max_length=16),
+        ),
+    ]
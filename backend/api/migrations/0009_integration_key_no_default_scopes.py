@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-20 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_message_job_claims'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='integrationkey',
+            name='scopes',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
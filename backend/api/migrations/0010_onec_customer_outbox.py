@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-20 00:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_integration_key_no_default_scopes'),
+        ('main', '0016_birthdaygreeting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OneCCustomerOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('referrer_id', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('failed', 'Не доставлено')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.customuser')),
+            ],
+            options={
+                'db_table': 'api_onec_customer_outbox',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='onec_outbox_due_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,8 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
 from main.models import CustomUser
 
 
@@ -23,3 +27,115 @@ class ReceiptDedup(models.Model):
 
     class Meta:
         db_table = "api_receipt_dedup"
+
+
+class MessageJob(models.Model):
+    """Пакетная отправка сообщения из /api/send-message/batch/."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "В очереди"),
+        (STATUS_RUNNING, "Отправляется"),
+        (STATUS_DONE, "Завершена"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    text = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "api_message_job"
+
+
+class MessageJobRecipient(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_FORBIDDEN = "forbidden"
+    STATUS_NOT_FOUND = "not_found"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает"),
+        (STATUS_SENDING, "Отправляется"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_FAILED, "Ошибка"),
+        (STATUS_FORBIDDEN, "Бот заблокирован"),
+        (STATUS_NOT_FOUND, "Клиент не найден"),
+    ]
+
+    job = models.ForeignKey(MessageJob, on_delete=models.CASCADE, related_name="recipients")
+    customer = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    telegram_id = models.BigIntegerField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    telegram_message_id = models.BigIntegerField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Когда воркер забрал получателя; «зависшие» в sending после аренды забираются снова
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "api_message_job_recipient"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "telegram_id"], name="message_job_recipient_uc"
+            )
+        ]
+
+
+class IntegrationKey(models.Model):
+    """Ключ доступа магазина к /onec/* и пакетным рассылкам.
+
+    Сам ключ не хранится — только HMAC-SHA256 (см. api/keys.py). Для ротации
+    новый ключ выпускается заранее, а у старого ставится valid_until, так что
+    какое-то время действуют оба.
+    """
+
+    name = models.CharField(max_length=64)
+    key_prefix = models.CharField(max_length=12)  # первые символы ключа, для логов
+    key_hash = models.CharField(max_length=64, unique=True)
+    store_id = models.IntegerField(null=True, blank=True)  # None — любые магазины
+    # Через запятую; * — все. По умолчанию ключ не даёт доступа никуда
+    scopes = models.CharField(max_length=255, default="", blank=True)
+    valid_from = models.DateTimeField(default=timezone.now)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "api_integration_key"
+
+    def __str__(self):
+        return f"{self.name} ({self.key_prefix}…)"
+
+
+class OneCCustomerOutbox(models.Model):
+    """Регистрации клиентов, ещё не доставленные в 1С (разбирает src/onec_client.py).
+
+    Успешно отправленная строка удаляется. Временная ошибка сдвигает
+    next_attempt_at с экспоненциальной паузой, после max_attempts строка
+    остаётся со статусом failed.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_FAILED, "Не доставлено"),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="+")
+    referrer_id = models.BigIntegerField(null=True, blank=True)  # telegram_id пригласившего
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "api_onec_customer_outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="onec_outbox_due_idx"),
+        ]
@@ -0,0 +1,82 @@
+"""In-process ``product_code -> product_id`` map used by receipt processing.
+
+The catalogue changes rarely while the same SKUs appear on most receipts, so
+each worker keeps the whole mapping in memory. It is warmed on first use and
+consulted before the database; unknown codes are resolved with one batched
+query. Product ids never change on sync, so only deletion can make an entry
+stale. Deleting a product drops it from this process's map; other workers keep
+the old id until a receipt using it fails with ``IntegrityError``, after which
+``_process_receipt`` clears the map and applies the receipt again.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Iterable
+
+from main.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ProductIdCache:
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._warm = False
+        self._lock = threading.Lock()
+
+    def warm(self):
+        ids = dict(
+            Product.objects.filter(product_code__isnull=False).values_list(
+                "product_code", "id"
+            )
+        )
+        with self._lock:
+            self._ids.update(ids)
+            self._warm = True
+        logger.info("Product cache warmed with %s products", len(ids))
+
+    def get_many(self, codes: Iterable[str]) -> dict[str, int]:
+        """Return ids for known codes; codes absent from the catalogue are omitted."""
+
+        if not self._warm:
+            self.warm()
+
+        codes = list(dict.fromkeys(codes))
+        found = {code: self._ids[code] for code in codes if code in self._ids}
+        missing = [code for code in codes if code not in found]
+        if missing:
+            loaded = dict(
+                Product.objects.filter(product_code__in=missing).values_list(
+                    "product_code", "id"
+                )
+            )
+            if loaded:
+                with self._lock:
+                    self._ids.update(loaded)
+                found.update(loaded)
+        return found
+
+    def invalidate(self, codes: Iterable[str]):
+        with self._lock:
+            for code in codes:
+                self._ids.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._warm = False
+
+
+product_id_cache = ProductIdCache()
+
+
+def drop_deleted_product(sender, instance, **kwargs):
+    """``post_delete`` receiver: drop the deleted id from this worker's map."""
+
+    if instance.product_code:
+        product_id_cache.invalidate([instance.product_code])
+
+
+__all__ = ["ProductIdCache", "drop_deleted_product", "product_id_cache"]
@@ -0,0 +1,301 @@
+"""Token-bucket rate limiting and load shedding for the ``/onec/*`` endpoints.
+
+Each request takes a token from two buckets:
+
+* the client bucket — one per endpoint and caller; the caller is the store of
+  a per-store API key, otherwise the client IP;
+* the global bucket shared by all ``/onec/*`` traffic.
+
+An empty client bucket answers ``429`` (``rate_limited``). The global bucket
+implements priority: an endpoint may only take a global token while more than
+``reserve * burst`` tokens are left. Under overload low-priority endpoints
+(export, products) are shed first, and ``/onec/receipt`` with ``reserve`` 0
+last. Shed requests also get ``429`` with ``error_code`` ``overloaded``.
+
+Buckets live in Redis (``settings.ONEC_RATE_LIMIT_REDIS_URL``) and are updated
+atomically by a Lua script, so all gunicorn workers share one budget. Without
+Redis, or while it is unreachable, each worker falls back to local buckets.
+The middleware is async-capable; under ASGI the Redis round trip runs in a
+worker thread so it does not block the event loop.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from prometheus_client import Counter
+
+from .keys import key_registry
+from .security import _client_ip, authenticate_key
+
+logger = logging.getLogger(__name__)
+
+ALLOWED, THROTTLED, SHED = 0, 1, 2
+DECISION_LABELS = {ALLOWED: "allowed", THROTTLED: "throttled", SHED: "shed"}
+
+# Порядок важен: /onec/products/batch попадает в "product"
+ENDPOINTS = (
+    ("/onec/receipt", "receipt"),
+    ("/onec/customer", "customer"),
+    ("/onec/product", "product"),
+    ("/onec/export/", "export"),
+)
+GLOBAL_KEY = "onec:rl:global"
+REDIS_TIMEOUT = 0.1
+
+RATE_LIMIT_DECISIONS = Counter(
+    "onec_ratelimit_decisions_total",
+    "Rate limiter decisions for /onec endpoints",
+    ["endpoint", "decision"],
+)
+RATE_LIMIT_BACKEND_ERRORS = Counter(
+    "onec_ratelimit_backend_errors_total",
+    "Redis errors that made the rate limiter fall back to local buckets",
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float
+    burst: float
+    reserve: float = 0.0
+
+    @classmethod
+    def from_setting(cls, value: dict) -> "Limit":
+        return cls(
+            rate=float(value["rate"]),
+            burst=float(value["burst"]),
+            reserve=float(value.get("reserve", 0.0)),
+        )
+
+
+def endpoint_for(path: str) -> str | None:
+    if not path.startswith("/onec/"):
+        return None
+    for prefix, name in ENDPOINTS:
+        if path.startswith(prefix):
+            return name
+    return "default"
+
+
+def _decide(tokens: float, global_tokens: float, limit: Limit, global_limit: Limit):
+    """Shared by both backends: return ``(decision, retry_after)`` for refilled levels."""
+
+    floor = limit.reserve * global_limit.burst
+    decision, wait = ALLOWED, 0.0
+    if tokens < 1:
+        decision, wait = THROTTLED, (1 - tokens) / limit.rate
+    if global_tokens < floor + 1:
+        wait = max(wait, (floor + 1 - global_tokens) / global_limit.rate)
+        if decision == ALLOWED:
+            decision = SHED
+    return decision, wait
+
+
+class LocalBuckets:
+    """Per-process buckets; used without Redis and as the fallback when it fails."""
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _refill(self, key: str, limit: Limit, now: float) -> float:
+        tokens, ts = self._buckets.get(key, (limit.burst, now))
+        return min(limit.burst, tokens + max(0.0, now - ts) * limit.rate)
+
+    def take(self, key: str, limit: Limit, global_limit: Limit):
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._refill(key, limit, now)
+            global_tokens = self._refill(GLOBAL_KEY, global_limit, now)
+            decision, wait = _decide(tokens, global_tokens, limit, global_limit)
+            if decision == ALLOWED:
+                tokens -= 1
+                global_tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets[GLOBAL_KEY] = (global_tokens, now)
+        return decision, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Та же логика, что в LocalBuckets.take + _decide, атомарно на стороне Redis.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rate, burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local grate, gburst = tonumber(ARGV[4]), tonumber(ARGV[5])
+local floor = tonumber(ARGV[6]) * gburst
+
+local function refill(key, r, b)
+  local data = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(data[1]) or b
+  local ts = tonumber(data[2]) or now
+  return math.min(b, tokens + math.max(0, now - ts) * r)
+end
+
+local tokens = refill(KEYS[1], rate, burst)
+local gtokens = refill(KEYS[2], grate, gburst)
+local decision, wait = 0, 0
+if tokens < 1 then
+  decision, wait = 1, (1 - tokens) / rate
+end
+if gtokens < floor + 1 then
+  wait = math.max(wait, (floor + 1 - gtokens) / grate)
+  if decision == 0 then decision = 2 end
+end
+if decision == 0 then
+  tokens = tokens - 1
+  gtokens = gtokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+redis.call('HSET', KEYS[2], 'tokens', gtokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], math.ceil(gburst / grate * 1000) + 1000)
+return {decision, tostring(wait)}
+"""
+
+
+class RedisBuckets:
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(
+            url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT
+        )
+        self._script = self._client.register_script(_TAKE_SCRIPT)
+        self._fallback = LocalBuckets()
+        self._warned_at = 0.0
+
+    def take(self, key: str, limit: Limit, global_limit: Limit):
+        try:
+            decision, wait = self._script(
+                keys=[key, GLOBAL_KEY],
+                args=[
+                    time.time(),
+                    limit.rate,
+                    limit.burst,
+                    global_limit.rate,
+                    global_limit.burst,
+                    limit.reserve,
+                ],
+            )
+            return int(decision), float(wait)
+        except Exception as exc:
+            RATE_LIMIT_BACKEND_ERRORS.inc()
+            now = time.monotonic()
+            if now - self._warned_at > 60:
+                self._warned_at = now
+                logger.warning("Rate limiter: Redis unavailable, using local buckets: %s", exc)
+            return self._fallback.take(key, limit, global_limit)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = getattr(settings, "ONEC_RATE_LIMIT_REDIS_URL", None)
+                _backend = RedisBuckets(url) if url else LocalBuckets()
+    return _backend
+
+
+def reset_backend():
+    """Forget the backend and its buckets (settings changes, tests)."""
+
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def _client_key(request) -> str:
+    api_key = (request.META.get("HTTP_X_API_KEY") or "").strip()
+    identity = authenticate_key(api_key) if api_key else None
+    if identity is not None and identity.store_id is not None:
+        return f"store:{identity.store_id}"
+    return f"ip:{_client_ip(request)}"
+
+
+class OnecRateLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self._check(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._applies(request):
+            await key_registry.aensure_loaded()
+            if isinstance(get_backend(), LocalBuckets):
+                response = self._check(request)
+            else:
+                # Redis — блокирующий сетевой вызов, уводим его из event loop
+                response = await sync_to_async(self._check, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    @staticmethod
+    def _applies(request) -> bool:
+        return endpoint_for(request.path) is not None and getattr(
+            settings, "ONEC_RATE_LIMIT_ENABLED", False
+        )
+
+    def _check(self, request):
+        """Take the tokens; return the ``429`` response, or None to let the request in."""
+
+        if not self._applies(request):
+            return None
+        endpoint = endpoint_for(request.path)
+        limits = settings.ONEC_RATE_LIMITS
+        limit = Limit.from_setting(limits.get(endpoint) or limits["default"])
+        global_limit = Limit.from_setting(settings.ONEC_RATE_LIMIT_GLOBAL)
+        client = _client_key(request)
+        decision, wait = get_backend().take(
+            f"onec:rl:{endpoint}:{client}", limit, global_limit
+        )
+        RATE_LIMIT_DECISIONS.labels(endpoint, DECISION_LABELS[decision]).inc()
+        if decision == ALLOWED:
+            return None
+
+        retry_after = max(1, math.ceil(wait))
+        if decision == THROTTLED:
+            logger.info("Rate limited %s on %s, retry in %ss", client, endpoint, retry_after)
+            payload = {"error_code": "rate_limited", "message": "Too many requests."}
+        else:
+            logger.warning("Shedding %s request from %s, retry in %ss", endpoint, client, retry_after)
+            payload = {"error_code": "overloaded", "message": "Server is busy, retry later."}
+        response = JsonResponse(payload, status=429)
+        response["Retry-After"] = str(retry_after)
+        return response
+
+
+__all__ = [
+    "LocalBuckets",
+    "OnecRateLimitMiddleware",
+    "RedisBuckets",
+    "endpoint_for",
+    "get_backend",
+    "reset_backend",
+]
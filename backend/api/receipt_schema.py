@@ -0,0 +1,277 @@
+"""Compiled validator for ``/onec/receipt`` payloads.
+
+``ReceiptSerializer`` remains the single definition of the receipt contract.
+At import its field tree is compiled into plain closures. Each closure
+reproduces what the DRF field would return for well-formed input: decimals
+quantized the same way, strings stripped, defaults filled in, and the
+``validate_<field>`` hooks applied. This avoids building a serializer, deep
+copying its fields and wrapping every line in DRF machinery on each request.
+
+The compiled validator only answers "valid, here is the data" or "not sure".
+On any doubt it returns ``None``, and the caller re-runs ``ReceiptSerializer``,
+so error codes and error details always come from DRF. Set
+``settings.ONEC_RECEIPT_VALIDATOR = "drf"`` to bypass the compiled path.
+"""
+
+from __future__ import annotations
+
+import decimal
+import re
+from collections.abc import Mapping
+from typing import Any, Callable
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import (
+    MaxValueValidator,
+    MinValueValidator,
+    ProhibitNullCharactersValidator,
+)
+from rest_framework import fields as drf_fields
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
+
+from .serializers import ReceiptSerializer
+
+_SURROGATES = re.compile("[\ud800-\udfff]")
+
+Converter = Callable[[Any], Any]
+
+
+class Reject(Exception):
+    """The payload must go through DRF, either to fail or to be checked properly."""
+
+
+def _bounds(field) -> tuple[Any, Any]:
+    """Return ``(min, max)`` if the field's validators are only those bounds, else raise."""
+
+    for validator in field.validators:
+        if not isinstance(validator, (MinValueValidator, MaxValueValidator)):
+            raise TypeError(f"unsupported validator {validator!r} on {field.field_name}")
+    return getattr(field, "min_value", None), getattr(field, "max_value", None)
+
+
+def _check_bounds(value, low, high):
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise Reject
+
+
+def _decimal(field: drf_fields.DecimalField) -> Converter:
+    if field.localize or field.decimal_places is None:
+        return _generic(field)
+    low, high = _bounds(field)
+    max_digits, places, max_whole = field.max_digits, field.decimal_places, field.max_whole_digits
+    limit = field.MAX_STRING_LENGTH
+    exponent = decimal.Decimal(".1") ** places
+    context = decimal.getcontext().copy()
+    if max_digits is not None:
+        context.prec = max_digits
+    rounding = field.rounding
+
+    def convert(data):
+        text = (data if type(data) is str else str(data)).strip()
+        if len(text) > limit:
+            raise Reject
+        try:
+            value = decimal.Decimal(text)
+        except decimal.DecimalException:
+            raise Reject from None
+        if not value.is_finite():
+            raise Reject
+
+        # То же, что DecimalField.validate_precision
+        _, digits, exp = value.as_tuple()
+        if exp >= 0:
+            total = whole = len(digits) + exp
+            decimals = 0
+        elif len(digits) > -exp:
+            total, whole, decimals = len(digits), len(digits) + exp, -exp
+        else:
+            total = decimals = -exp
+            whole = 0
+        if (
+            (max_digits is not None and total > max_digits)
+            or decimals > places
+            or (max_whole is not None and whole > max_whole)
+        ):
+            raise Reject
+
+        value = value.quantize(exponent, rounding=rounding, context=context)
+        _check_bounds(value, low, high)
+        return value
+
+    return convert
+
+
+def _integer(field: drf_fields.IntegerField) -> Converter:
+    low, high = _bounds(field)
+    limit = field.MAX_STRING_LENGTH
+    strip_decimal = field.re_decimal.sub
+
+    def convert(data):
+        if type(data) is int:
+            value = data
+        else:
+            if isinstance(data, str) and len(data) > limit:
+                raise Reject
+            try:
+                value = int(strip_decimal("", str(data)))
+            except (ValueError, TypeError):
+                raise Reject from None
+        _check_bounds(value, low, high)
+        return value
+
+    return convert
+
+
+def _char(field: drf_fields.CharField) -> Converter:
+    expected = (ProhibitNullCharactersValidator, ProhibitSurrogateCharactersValidator)
+    if field.max_length is not None or field.min_length is not None or any(
+        not isinstance(v, expected) for v in field.validators
+    ):
+        return _generic(field)
+    trim, allow_blank = field.trim_whitespace, field.allow_blank
+
+    def convert(data):
+        if type(data) is str:
+            text = data
+        elif type(data) in (int, float):
+            text = str(data)
+        else:
+            raise Reject
+        value = text.strip() if trim else text
+        if text == "" or (trim and value == ""):
+            if not allow_blank:
+                raise Reject
+            return ""
+        if "\x00" in value or (not value.isascii() and _SURROGATES.search(value)):
+            raise Reject
+        return value
+
+    return convert
+
+
+def _generic(field) -> Converter:
+    """Leaf fields without a fast path: run the (pre-built) DRF field itself."""
+
+    def convert(data):
+        try:
+            return field.run_validation(data)
+        except (serializers.ValidationError, DjangoValidationError):
+            raise Reject from None
+
+    return convert
+
+
+def _list(field: serializers.ListSerializer) -> Converter:
+    if field.validators:
+        raise TypeError(f"list-level validators are not supported: {field!r}")
+    child = _with_empty_values(field.child, _compile(field.child))
+    allow_empty, min_length, max_length = field.allow_empty, field.min_length, field.max_length
+    validate = field.validate
+
+    def convert(data):
+        if not isinstance(data, list):
+            raise Reject
+        size = len(data)
+        if (
+            (not allow_empty and size == 0)
+            or (max_length is not None and size > max_length)
+            or (min_length is not None and size < min_length)
+        ):
+            raise Reject
+        return validate([child(item) for item in data])
+
+    return convert
+
+
+def _serializer(serializer: serializers.Serializer) -> Converter:
+    if serializer.validators:
+        raise TypeError(f"serializer-level validators are not supported: {serializer!r}")
+    plan = []
+    for field in serializer._writable_fields:
+        if field.source != field.field_name:
+            raise TypeError(f"field {field.field_name} with a custom source is not supported")
+        plan.append(
+            (
+                field.field_name,
+                _with_empty_values(field, _compile(field)),
+                getattr(serializer, f"validate_{field.field_name}", None),
+            )
+        )
+    validate = serializer.validate
+
+    def convert(data):
+        if not isinstance(data, Mapping):
+            raise Reject
+        result = {}
+        for name, field_convert, hook in plan:
+            value = field_convert(data.get(name, empty))
+            if value is empty:
+                continue
+            if hook is not None:
+                value = hook(value)
+            result[name] = value
+        return validate(result)
+
+    def guarded(data):
+        try:
+            return convert(data)
+        except (serializers.ValidationError, DjangoValidationError):
+            raise Reject from None
+
+    return guarded
+
+
+def _with_empty_values(field, convert: Converter) -> Converter:
+    """Mirror ``Field.validate_empty_values``: missing keys, defaults and nulls."""
+
+    required, allow_null = field.required, field.allow_null
+    has_default = field.default is not empty
+
+    def wrapped(data):
+        if data is empty:
+            if required:
+                raise Reject
+            return field.get_default() if has_default else empty
+        if data is None:
+            if not allow_null:
+                raise Reject
+            return None
+        return convert(data)
+
+    return wrapped
+
+
+def _compile(field) -> Converter:
+    if getattr(field, "read_only", False):
+        raise TypeError(f"read-only field {field.field_name} is not supported")
+    if isinstance(field, serializers.ListSerializer):
+        return _list(field)
+    if isinstance(field, serializers.Serializer):
+        return _serializer(field)
+    if isinstance(field, drf_fields.DecimalField):
+        return _decimal(field)
+    if isinstance(field, drf_fields.IntegerField):
+        return _integer(field)
+    if isinstance(field, drf_fields.CharField) and type(field) is drf_fields.CharField:
+        return _char(field)
+    return _generic(field)
+
+
+def compile_serializer(serializer: serializers.Serializer) -> Callable[[Any], dict | None]:
+    convert = _serializer(serializer)
+
+    def validate(payload) -> dict | None:
+        try:
+            return convert(payload)
+        except Reject:
+            return None
+
+    return validate
+
+
+validate_receipt = compile_serializer(ReceiptSerializer())
+
+
+__all__ = ["Reject", "compile_serializer", "validate_receipt"]
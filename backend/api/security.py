@@ -1,102 +1,288 @@
 """Security helpers for the 1C integration endpoints."""
 
+import ipaddress
 import logging
 import os
-from functools import wraps
+from bisect import bisect_right
+from functools import lru_cache, wraps
 from hmac import compare_digest
 from typing import Iterable
 
+from asgiref.sync import iscoroutinefunction
 from django.http import JsonResponse
 
+from .keys import ApiKeyIdentity, key_registry
+
 logger = logging.getLogger(__name__)
 
 API_KEY = (os.getenv("INTEGRATION_API_KEY") or "").strip()
-_ALLOWED_IPS: tuple[str, ...] = tuple(
-    ip.strip() for ip in (os.getenv("ONEC_ALLOW_IPS") or "").split(",") if ip.strip()
+
+IPAddress = ipaddress.IPv4Address | ipaddress.IPv6Address
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def _split_rules(value: str | None) -> tuple[str, ...]:
+    return tuple(rule.strip() for rule in (value or "").split(",") if rule.strip())
+
+
+def _parse_ip(value: str) -> IPAddress | None:
+    """Parse an address from a header, tolerating ``[v6]``, ports and v4-mapped v6."""
+
+    value = value.strip()
+    if value.startswith("["):
+        value = value[1:].split("]", 1)[0]
+    elif value.count(":") == 1:
+        value = value.split(":", 1)[0]
+    try:
+        addr = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if addr.version == 6 and addr.ipv4_mapped is not None:
+        return addr.ipv4_mapped
+    return addr
+
+
+def _wildcard_networks(prefix: str) -> list[IPNetwork]:
+    """Translate a legacy ``prefix*`` rule into the networks it matches.
+
+    The old matcher compared strings, so ``10.1.*`` means 10.1.0.0/16 and
+    ``10.1.2*`` means 10.1.2.x, 10.1.20-29.x and 10.1.200-255.x. The same
+    address set is reproduced here exactly. IPv6 prefixes must end on a group
+    boundary (``2001:db8:*``).
+    """
+
+    if not prefix:
+        return [ipaddress.ip_network("0.0.0.0/0"), ipaddress.ip_network("::/0")]
+    if ":" in prefix:
+        groups = prefix.rstrip(":").split(":")
+        if not prefix.endswith(":") or len(groups) > 8:
+            raise ValueError(prefix)
+        padded = groups + ["0"] * (8 - len(groups))
+        return [ipaddress.ip_network(f"{':'.join(padded)}/{16 * len(groups)}")]
+
+    *head, tail = prefix.split(".")
+    octets = [int(part) for part in head]
+    if len(octets) > 3 or any(not 0 <= o <= 255 for o in octets):
+        raise ValueError(prefix)
+    if not tail:
+        values: list[int | None] = [None]
+    elif tail.isdigit():
+        values = [v for v in range(256) if str(v).startswith(tail)]
+    else:
+        raise ValueError(prefix)
+
+    networks = []
+    for value in values:
+        parts = octets if value is None else octets + [value]
+        address = ".".join(str(p) for p in parts + [0] * (4 - len(parts)))
+        networks.append(ipaddress.ip_network(f"{address}/{8 * len(parts)}"))
+    return networks
+
+
+def _parse_rule(rule: str) -> list[IPNetwork]:
+    if rule.endswith("*"):
+        return _wildcard_networks(rule[:-1])
+    return [ipaddress.ip_network(rule, strict=False)]
+
+
+class IPAllowList:
+    """Address rules compiled into merged, sorted intervals per IP version.
+
+    Lookups are a bisect over the interval starts, so they stay O(log n) for
+    any number of store subnets. Decisions per address string are cached.
+    """
+
+    def __init__(self, rules: Iterable[str] = (), *, cache_size: int = 4096):
+        self.rules = tuple(rules)
+        intervals: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        for rule in self.rules:
+            try:
+                networks = _parse_rule(rule)
+            except ValueError:
+                logger.error("ONEC AUTH: invalid IP rule ignored: %r", rule)
+                continue
+            for network in networks:
+                intervals[network.version].append(
+                    (int(network.network_address), int(network.broadcast_address))
+                )
+
+        self._starts: dict[int, list[int]] = {}
+        self._ends: dict[int, list[int]] = {}
+        for version, items in intervals.items():
+            merged: list[list[int]] = []
+            for start, end in sorted(items):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+        self.allows = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def __bool__(self) -> bool:
+        # A configured list whose rules are all invalid still denies everyone.
+        return bool(self.rules)
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts in self._starts.values())
+
+    def _lookup(self, ip: str) -> bool:
+        addr = _parse_ip(ip)
+        if addr is None:
+            return False
+        value = int(addr)
+        index = bisect_right(self._starts[addr.version], value) - 1
+        return index >= 0 and value <= self._ends[addr.version][index]
+
+
+_IP_CACHE_SIZE = int(os.getenv("ONEC_IP_CACHE_SIZE") or 4096)
+_ALLOW_LIST = IPAllowList(_split_rules(os.getenv("ONEC_ALLOW_IPS")), cache_size=_IP_CACHE_SIZE)
+_TRUSTED_PROXIES = IPAllowList(
+    _split_rules(os.getenv("ONEC_TRUSTED_PROXIES")), cache_size=_IP_CACHE_SIZE
 )
 
 
 def _client_ip(request) -> str:
-    xff = request.META.get("HTTP_X_FORWARDED_FOR")
-    if xff:
-        return xff.split(",")[0].strip()
-    xri = request.META.get("HTTP_X_REAL_IP")
-    if xri:
-        return xri.strip()
-    return request.META.get("REMOTE_ADDR", "")
+    """Resolve the client address, trusting forwarding headers only from known proxies.
 
+    Without ``ONEC_TRUSTED_PROXIES`` the old behaviour is kept: X-Real-IP set by
+    nginx, then REMOTE_ADDR. With it, X-Forwarded-For is walked from the right
+    and the first hop that is not a trusted proxy is the client.
+    """
 
-def _iter_ip_rules() -> Iterable[str]:
-    if not _ALLOWED_IPS:
-        return ()
-    return _ALLOWED_IPS
+    remote = (request.META.get("REMOTE_ADDR") or "").strip()
+    if not _TRUSTED_PROXIES:
+        return (request.META.get("HTTP_X_REAL_IP") or remote).strip()
+    if not _TRUSTED_PROXIES.allows(remote):
+        return remote
+
+    hops = [
+        hop.strip() for hop in (request.META.get("HTTP_X_FORWARDED_FOR") or "").split(",")
+    ]
+    hops = [hop for hop in hops if hop]
+    for hop in reversed(hops):
+        if not _TRUSTED_PROXIES.allows(hop):
+            return hop
+    if hops:
+        return hops[0]
+    return (request.META.get("HTTP_X_REAL_IP") or remote).strip()
 
 
 def _ip_allowed(request) -> bool:
-    """Allow empty whitelist or match exact/prefix rules."""
+    """Allow empty whitelist or match the client IP against the compiled rules."""
 
-    rules = list(_iter_ip_rules())
-    if not rules:
+    if not _ALLOW_LIST:
         return True
+    return _ALLOW_LIST.allows(_client_ip(request))
+
+
+LEGACY_IDENTITY = ApiKeyIdentity(name="legacy", store_id=None, scopes=frozenset({"*"}))
 
-    real_ip = request.META.get("HTTP_X_REAL_IP") or request.META.get("REMOTE_ADDR") or ""
-    for allowed in rules:
-        if allowed.endswith("*"):
-            if real_ip.startswith(allowed[:-1]):
-                return True
-        elif real_ip == allowed:
-            return True
-    return False
 
+def authenticate_key(api_key: str) -> ApiKeyIdentity | None:
+    """Resolve a presented key: the legacy shared key first, then the per-store registry."""
 
-def require_onec_auth(view_func):
-    """Simple API key authentication with optional IP whitelisting."""
+    if API_KEY and compare_digest(api_key, API_KEY):
+        return LEGACY_IDENTITY
+    return key_registry.resolve(api_key)
+
+
+def _authorize(request, scope: str | None) -> JsonResponse | None:
+    """Run the checks for ``require_onec_auth``; return the rejection, if any."""
 
     def _bad(code, detail):
         return JsonResponse({"detail": detail}, status=code)
 
+    if not API_KEY and not key_registry.has_keys():
+        logger.error("ONEC AUTH denied: server auth not configured")
+        return _bad(401, "Server auth not configured")
+
+    if not _ip_allowed(request):
+        logger.warning(
+            "ONEC AUTH denied: ip not allowed ip=%s path=%s",
+            _client_ip(request),
+            getattr(request, "path", "?"),
+        )
+        return _bad(403, "IP not allowed")
+
+    api_key = (
+        getattr(request, "headers", {}).get("X-Api-Key")
+        or request.META.get("HTTP_X_API_KEY")
+        or ""
+    ).strip()
+    if not api_key:
+        logger.warning(
+            "ONEC AUTH denied: missing api key ip=%s path=%s",
+            _client_ip(request),
+            getattr(request, "path", "?"),
+        )
+        return _bad(401, "Missing API key")
+
+    identity = authenticate_key(api_key)
+    if identity is None:
+        logger.warning(
+            "ONEC AUTH denied: bad api key ip=%s path=%s",
+            _client_ip(request),
+            getattr(request, "path", "?"),
+        )
+        return _bad(401, "Bad API key")
+
+    if not identity.allows(scope):
+        logger.warning(
+            "ONEC AUTH denied: scope %s not granted to key=%s path=%s",
+            scope,
+            identity.name,
+            getattr(request, "path", "?"),
+        )
+        return _bad(403, "API key scope not allowed")
+
+    request.onec_key = identity
+    request.onec_store_id = identity.store_id
+    return None
+
+
+def require_onec_auth(view_func=None, *, scope: str | None = None):
+    """API key authentication with optional IP whitelisting.
+
+    Accepts the shared ``INTEGRATION_API_KEY`` or any per-store key from
+    ``api.keys``. The key must carry ``scope`` when one is given. The resolved
+    identity is stored on ``request.onec_key`` and ``request.onec_store_id``.
+    Use it bare (``@require_onec_auth``) or as ``@require_onec_auth(scope=...)``.
+    Works for both sync and ``async def`` views.
+    """
+
+    if view_func is None:
+        return lambda func: require_onec_auth(func, scope=scope)
+
+    if iscoroutinefunction(view_func):
+
+        @wraps(view_func)
+        async def _async_wrapped(request, *args, **kwargs):
+            await key_registry.aensure_loaded()
+            denied = _authorize(request, scope)
+            if denied is not None:
+                return denied
+            try:
+                return await view_func(request, *args, **kwargs)
+            except Exception:  # pragma: no cover - defensive logging
+                logger.exception("require_onec_auth crashed")
+                return JsonResponse({"detail": "Unauthorized"}, status=401)
+
+        return _async_wrapped
+
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        if not API_KEY:
-            logger.error("ONEC AUTH denied: server auth not configured")
-            return _bad(401, "Server auth not configured")
-
-        if not _ip_allowed(request):
-            logger.warning(
-                "ONEC AUTH denied: ip not allowed ip=%s path=%s",
-                _client_ip(request),
-                getattr(request, "path", "?"),
-            )
-            return _bad(403, "IP not allowed")
-
-        api_key = (
-            getattr(request, "headers", {}).get("X-Api-Key")
-            or request.META.get("HTTP_X_API_KEY")
-            or ""
-        ).strip()
-        if not api_key:
-            logger.warning(
-                "ONEC AUTH denied: missing api key ip=%s path=%s",
-                _client_ip(request),
-                getattr(request, "path", "?"),
-            )
-            return _bad(401, "Missing API key")
-
-        if not compare_digest(api_key, API_KEY):
-            logger.warning(
-                "ONEC AUTH denied: bad api key ip=%s path=%s",
-                _client_ip(request),
-                getattr(request, "path", "?"),
-            )
-            return _bad(401, "Bad API key")
-
+        denied = _authorize(request, scope)
+        if denied is not None:
+            return denied
         try:
             return view_func(request, *args, **kwargs)
         except Exception:  # pragma: no cover - defensive logging
             logger.exception("require_onec_auth crashed")
-            return _bad(401, "Unauthorized")
+            return JsonResponse({"detail": "Unauthorized"}, status=401)
 
     return _wrapped
 
 
-__all__ = ["API_KEY", "require_onec_auth"]
+__all__ = ["API_KEY", "IPAllowList", "authenticate_key", "require_onec_auth"]
@@ -122,3 +122,35 @@ class ProductUpdateSerializer(serializers.Serializer):
     category = serializers.CharField()
     is_promotional = serializers.BooleanField()
     updated_at = serializers.DateTimeField()
+
+
+class RecipientFilterSerializer(serializers.Serializer):
+    """Customers selected by activity instead of an explicit id list."""
+
+    store_id = serializers.IntegerField(required=False)
+    purchased_since = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Filter must contain store_id or purchased_since.")
+        return attrs
+
+
+class SendMessageBatchSerializer(serializers.Serializer):
+    """Payload of ``/api/send-message/batch/``: a text plus ids or a filter."""
+
+    MAX_RECIPIENTS = 10000
+
+    text = serializers.CharField(max_length=4096)
+    telegram_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=MAX_RECIPIENTS,
+    )
+    filter = RecipientFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ("telegram_ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("Provide either telegram_ids or filter.")
+        return attrs
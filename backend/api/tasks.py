@@ -1,36 +1,110 @@
-import os
+import asyncio
+import logging
 from datetime import date
 
-from celery import shared_task
 import requests
-from dotenv import load_dotenv
+from celery import shared_task
+from django.db import close_old_connections
 
-from main.models import CustomUser
+from . import telegram
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-BOT_TOKEN = os.getenv('BOT_TOKEN')
-BASE_URL = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
 
+@shared_task(bind=True)
+def send_birthday_congratulations(self, day: str | None = None):
+    """Поздравляет именинников через асинхронный отправщик рассылок.
 
-@shared_task
-def send_birthday_congratulations():
-    today = date.today()
-    birthday_users = CustomUser.objects.filter(birth_date__month=today.month, birth_date__day=today.day)
+    Если часть отправок не удалась, задача перезапускается для того же дня:
+    уже поздравленные пропускаются, освобождённые записи забираются заново.
+    """
+    close_old_connections()
+
+    # ленивые импорты, как в main.tasks.broadcast_send_task
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.enums import ParseMode
+
+    from src import config
+    from src.birthday import send_birthday_greetings
+    from src.broadcast import BOT_TOKEN
+    from src.metrics import push_metrics
+
+    async def runner():
+        # Одна сессия aiohttp с пулом соединений на весь запуск
+        bot = Bot(
+            token=BOT_TOKEN,
+            session=AiohttpSession(limit=max(1, config.BIRTHDAY_CONCURRENCY)),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        try:
+            return await send_birthday_greetings(today, bot_instance=bot)
+        finally:
+            await bot.session.close()
 
-    for user in birthday_users:
-        if not user.telegram_id:
-            continue
+    today = date.fromisoformat(day) if day else date.today()
+    try:
+        stats = asyncio.run(runner())
+    finally:
+        push_metrics()
 
-        message = f"🎉 Поздравляем тебя с Днём Рождения, {user.full_name or 'друг'}! Желаем счастья, здоровья и успехов! 🎂"
+    if stats.get("error"):
+        if self.request.retries < config.BIRTHDAY_RETRIES:
+            raise self.retry(
+                kwargs={"day": today.isoformat()}, countdown=config.BIRTHDAY_RETRY_SECONDS
+            )
+        logger.warning(
+            "Birthday greetings for %s: %s failed after %s retries",
+            today.isoformat(),
+            stats["error"],
+            self.request.retries,
+        )
+    return stats
 
-        payload = {
-            "chat_id": user.telegram_id,
-            "text": message,
-        }
 
+@shared_task(bind=True, max_retries=5)
+def send_telegram_message(self, chat_id: int, text: str) -> bool:
+    """Отправка сообщения из /api/send-message/ в фоне через общий пул соединений."""
+    try:
+        telegram.send_message(chat_id, text)
+    except requests.RequestException as exc:
+        if not telegram.is_retryable(exc):
+            logger.warning("Telegram rejected message to %s: %s", chat_id, exc)
+            return False
+        # При 429 ждём столько, сколько просит Telegram: ранний повтор продлевает бан
+        countdown = telegram.retry_after(exc) or min(60, 2 ** self.request.retries)
+        raise self.retry(exc=exc, countdown=countdown)
+    return True
+
+
+@shared_task
+def run_message_job(job_id: str):
+    """Фоновая отправка пакетного задания из /api/send-message/batch/."""
+    close_old_connections()
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.enums import ParseMode
+
+    from src import config
+    from src.broadcast import BOT_TOKEN
+    from src.message_jobs import send_message_job
+    from src.metrics import push_metrics
+
+    async def runner():
+        bot = Bot(
+            token=BOT_TOKEN,
+            session=AiohttpSession(limit=max(1, config.MESSAGE_JOB_CONCURRENCY)),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
         try:
-            response = requests.post(BASE_URL, data=payload)
-            response.raise_for_status()
-        except Exception as e:
-            print(f"Ошибка при отправке сообщения пользователю {user.telegram_id}: {e}")
+            return await send_message_job(job_id, bot_instance=bot)
+        finally:
+            await bot.session.close()
+
+    try:
+        return asyncio.run(runner())
+    finally:
+        push_metrics()
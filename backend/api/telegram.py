@@ -0,0 +1,81 @@
+"""Pooled HTTP client for the Telegram Bot API used by views and Celery tasks.
+
+One ``requests.Session`` per process keeps TLS connections to api.telegram.org
+alive between requests instead of doing a handshake for every message. Only
+connection errors are retried at the transport level; a request that reached
+Telegram is never re-sent here, because that could deliver a message twice.
+"""
+
+from __future__ import annotations
+
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src import config
+
+API_BASE_URL = "https://api.telegram.org"
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    pool_size = max(1, getattr(settings, "TELEGRAM_HTTP_POOL_SIZE", 10))
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def send_message(chat_id: int, text: str, *, parse_mode: str = "HTML") -> requests.Response:
+    """POST ``sendMessage``; raises ``requests.RequestException`` on failure."""
+
+    response = get_session().post(
+        f"{API_BASE_URL}/bot{config.BOT_TOKEN}/sendMessage",
+        json={"chat_id": chat_id, "text": text, "parse_mode": parse_mode},
+        timeout=getattr(settings, "TELEGRAM_HTTP_TIMEOUT", 5),
+    )
+    response.raise_for_status()
+    return response
+
+
+def is_retryable(exc: requests.RequestException) -> bool:
+    """Network errors, 429 and 5xx are worth retrying; other 4xx are not."""
+
+    response = getattr(exc, "response", None)
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def retry_after(exc: requests.RequestException) -> int | None:
+    """Seconds Telegram asks to wait after a 429 (``parameters.retry_after``), if given."""
+
+    response = getattr(exc, "response", None)
+    if response is None or response.status_code != 429:
+        return None
+    try:
+        value = response.json()["parameters"]["retry_after"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return int(value) if isinstance(value, (int, float)) and value > 0 else None
+
+
+__all__ = ["get_session", "is_retryable", "retry_after", "send_message"]
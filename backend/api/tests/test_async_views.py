@@ -0,0 +1,167 @@
+import json
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+
+from api import async_views, ratelimit, security, views
+from api.keys import key_registry
+from api.product_cache import product_id_cache
+from main.models import CustomUser, Product, Transaction
+
+RECEIPT = {
+    "receipt_guid": "R-ASYNC-1",
+    "datetime": "2025-03-10T12:30:00+00:00",
+    "store_id": "1",
+    "customer": {"telegram_id": 9001},
+    "positions": [{"product_code": "SKU-1", "quantity": "1", "price": "10.00", "line_number": 1}],
+    "totals": {
+        "total_amount": "10.00",
+        "discount_total": "0",
+        "bonus_spent": "0",
+        "bonus_earned": "0",
+    },
+}
+
+
+class AsyncOnecViewTests(TestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        key_registry.invalidate()
+        product_id_cache.clear()
+        self.factory = AsyncRequestFactory()
+        CustomUser.objects.create(telegram_id=9001, qr_code="QR-9001")
+        Product.objects.create(
+            product_code="SKU-1", name="Milk", price=Decimal("10.00"), category="Dairy", store_id=1
+        )
+
+    def _post(self, path, payload, api_key="test-key", **headers):
+        return self.factory.post(
+            path,
+            data=json.dumps(payload),
+            content_type="application/json",
+            headers={"X-Api-Key": api_key, **headers},
+        )
+
+    async def test_healthz(self):
+        response = await async_views.healthz(self.factory.get("/healthz/"))
+
+        self.assertEqual(json.loads(response.content), {"status": "ok"})
+
+    async def test_receipt_is_processed_and_seen_by_the_sync_view(self):
+        idem_key = str(uuid.uuid4())
+
+        response = await async_views.onec_receipt(
+            self._post("/onec/receipt", RECEIPT, **{"X-Idempotency-Key": idem_key})
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await Transaction.objects.filter(receipt_guid="R-ASYNC-1").acount(), 1)
+
+        sync_request = RequestFactory().post(
+            "/onec/receipt",
+            data=json.dumps(RECEIPT),
+            content_type="application/json",
+            headers={"X-Api-Key": "test-key", "X-Idempotency-Key": idem_key},
+        )
+        replay = await sync_to_async(views.onec_receipt)(sync_request)
+        self.assertEqual(json.loads(replay.content)["status"], "already exists")
+        self.assertEqual(await Transaction.objects.filter(receipt_guid="R-ASYNC-1").acount(), 1)
+
+    async def test_receipt_validation_errors_do_not_touch_the_database(self):
+        response = await async_views.onec_receipt(self._post("/onec/receipt", RECEIPT))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)["error_code"], "missing_idempotency_key")
+
+    async def test_customer_sync_lookup_and_guid_assignment(self):
+        response = await async_views.onec_customer_sync(
+            self._post("/onec/customer", {"qr_code": "QR-9001", "one_c_guid": "GUID-1"})
+        )
+
+        self.assertEqual(response.status_code, 200)
+        customer = json.loads(response.content)["customer"]
+        self.assertEqual(customer["telegram_id"], 9001)
+        self.assertEqual(customer["one_c_guid"], "GUID-1")
+
+        missing = await async_views.onec_customer_sync(
+            self._post("/onec/customer", {"telegram_id": 404})
+        )
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_product_sync_creates_then_ignores_stale_update(self):
+        payload = {
+            "product_code": "SKU-2",
+            "name": "Bread",
+            "price": "3.50",
+            "category": "Bakery",
+            "is_promotional": False,
+            "updated_at": "2025-03-10T12:00:00+00:00",
+        }
+
+        created = await async_views.onec_product_sync(self._post("/onec/product", payload))
+        stale = await async_views.onec_product_sync(
+            self._post("/onec/product", {**payload, "updated_at": "2025-03-09T12:00:00+00:00"})
+        )
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(json.loads(stale.content)["status"], "unchanged")
+
+    async def test_export_streams_pages_without_buffering(self):
+        customer = await CustomUser.objects.aget(telegram_id=9001)
+        for line in range(1, 4):
+            await Transaction.objects.acreate(
+                customer=customer, total_amount=Decimal("10.00"), store_id=1,
+                receipt_guid=f"R-EXPORT-{line}", receipt_line=1,
+            )
+        original = views.EXPORT_PAGE_SIZE
+        views.EXPORT_PAGE_SIZE = 2
+        self.addCleanup(setattr, views, "EXPORT_PAGE_SIZE", original)
+
+        response = await async_views.onec_export_transactions(
+            self.factory.get("/onec/export/transactions", headers={"X-Api-Key": "test-key"})
+        )
+
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            [row["receipt_guid"] for row in rows], ["R-EXPORT-1", "R-EXPORT-2", "R-EXPORT-3"]
+        )
+
+    async def test_auth_is_enforced(self):
+        response = await async_views.onec_receipt(
+            self._post("/onec/receipt", RECEIPT, api_key="nope")
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    ONEC_RATE_LIMIT_ENABLED=True,
+    ONEC_RATE_LIMIT_REDIS_URL=None,
+    ONEC_RATE_LIMITS={"default": {"rate": 1, "burst": 1, "reserve": 0.0}},
+    ONEC_RATE_LIMIT_GLOBAL={"rate": 1, "burst": 100},
+)
+class AsyncRateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        key_registry.invalidate()
+        ratelimit.reset_backend()
+        self.addCleanup(ratelimit.reset_backend)
+
+    async def test_middleware_runs_in_async_mode(self):
+        async def view(request):
+            return HttpResponse("ok")
+
+        middleware = ratelimit.OnecRateLimitMiddleware(view)
+        factory = AsyncRequestFactory()
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        first = await middleware(factory.post("/onec/health"))
+        second = await middleware(factory.post("/onec/health"))
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
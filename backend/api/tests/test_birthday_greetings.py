@@ -0,0 +1,138 @@
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from celery.exceptions import Retry
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from main.models import BirthdayGreeting, CustomUser
+
+os.environ.setdefault("BOT_TOKEN", "123456:TESTTOKEN")
+
+from api import tasks  # noqa: E402  pylint: disable=wrong-import-position
+from src import birthday  # noqa: E402  pylint: disable=wrong-import-position
+
+TODAY = date(2025, 5, 17)
+
+
+class DummyTelegramBot:
+    def __init__(self, forbidden=(), failing=()):
+        self.sent_messages = []
+        self._forbidden = set(forbidden)
+        self._failing = set(failing)
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id in self._forbidden:
+            raise TelegramForbiddenError(
+                method=SendMessage(chat_id=chat_id, text=text), message="blocked"
+            )
+        if chat_id in self._failing:
+            raise RuntimeError("boom")
+        self.sent_messages.append({"chat_id": chat_id, "text": text})
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=len(self.sent_messages))
+
+
+class BirthdayGreetingsTests(TransactionTestCase):
+    def _user(self, telegram_id, birth_date, **extra):
+        return CustomUser.objects.create(telegram_id=telegram_id, birth_date=birth_date, **extra)
+
+    def _run(self, bot):
+        return asyncio.run(
+            birthday.send_birthday_greetings(TODAY, bot_instance=bot, rate=0, batch_size=2)
+        )
+
+    def test_greets_todays_birthdays_once_per_year(self):
+        first = self._user(101, datetime(1990, 5, 17), full_name="<Анна>")
+        second = self._user(102, datetime(1985, 5, 17))
+        third = self._user(103, datetime(2000, 5, 17))
+        self._user(104, datetime(1990, 5, 18))
+        self._user(-5, datetime(1990, 5, 17))
+
+        bot = DummyTelegramBot()
+        stats = self._run(bot)
+
+        self.assertEqual(stats["sent"], 3)
+        self.assertEqual(
+            sorted(m["chat_id"] for m in bot.sent_messages), [101, 102, 103]
+        )
+        self.assertIn("&lt;Анна&gt;", bot.sent_messages[0]["text"])
+        greetings = BirthdayGreeting.objects.filter(year=2025)
+        self.assertEqual(
+            set(greetings.values_list("customer_id", flat=True)),
+            {first.id, second.id, third.id},
+        )
+        self.assertFalse(greetings.filter(sent_at__isnull=True).exists())
+
+        repeat_bot = DummyTelegramBot()
+        stats = self._run(repeat_bot)
+        self.assertEqual(repeat_bot.sent_messages, [])
+        self.assertEqual(stats["skipped"], 3)
+
+    def test_transient_failures_are_retried_on_next_run(self):
+        blocked = self._user(201, datetime(1990, 5, 17))
+        flaky = self._user(202, datetime(1990, 5, 17))
+
+        stats = self._run(DummyTelegramBot(forbidden={201}, failing={202}))
+        self.assertEqual(stats["forbidden"], 1)
+        self.assertEqual(stats["error"], 1)
+        self.assertEqual(BirthdayGreeting.objects.get(customer=blocked).error, "forbidden")
+        self.assertFalse(BirthdayGreeting.objects.filter(customer=flaky).exists())
+
+        bot = DummyTelegramBot()
+        self._run(bot)
+        self.assertEqual([m["chat_id"] for m in bot.sent_messages], [202])
+
+    def test_stale_claim_of_a_crashed_run_is_taken_over(self):
+        stale = self._user(301, datetime(1990, 5, 17))
+        fresh = self._user(302, datetime(1990, 5, 17))
+        BirthdayGreeting.objects.create(
+            customer=stale, year=2025, run_id=uuid.uuid4(),
+            created_at=timezone.now() - timedelta(hours=1),
+        )
+        BirthdayGreeting.objects.create(customer=fresh, year=2025, run_id=uuid.uuid4())
+
+        bot = DummyTelegramBot()
+        stats = self._run(bot)
+
+        self.assertEqual([m["chat_id"] for m in bot.sent_messages], [301])
+        self.assertEqual(stats["skipped"], 1)
+        self.assertIsNotNone(BirthdayGreeting.objects.get(customer=stale).sent_at)
+
+
+class BirthdayTaskRetryTests(SimpleTestCase):
+    def _call(self, stats, retries=0):
+        async def fake_send(today, *, bot_instance):
+            self.days.append(today)
+            return stats
+
+        self.days = []
+        task = tasks.send_birthday_congratulations
+        with mock.patch.object(birthday, "send_birthday_greetings", fake_send), mock.patch(
+            "src.metrics.push_metrics"
+        ), mock.patch.object(task, "retry", side_effect=Retry()) as retry:
+            task.push_request(retries=retries)
+            try:
+                try:
+                    task.run("2025-05-17")
+                except Retry:
+                    pass
+            finally:
+                task.pop_request()
+        return retry
+
+    def test_failed_sends_are_retried_for_the_same_day(self):
+        retry = self._call({"sent": 2, "error": 1})
+
+        self.assertEqual(self.days, [TODAY])
+        retry.assert_called_once_with(kwargs={"day": "2025-05-17"}, countdown=900)
+
+    def test_no_retry_without_errors_or_after_the_last_retry(self):
+        self.assertFalse(self._call({"sent": 3}).called)
+        with self.assertLogs("api.tasks", level="WARNING"):
+            self.assertFalse(self._call({"error": 1}, retries=3).called)
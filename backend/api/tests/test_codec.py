@@ -0,0 +1,65 @@
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from api import codec
+
+
+class CodecTests(SimpleTestCase):
+    def test_parses_bytes(self):
+        self.assertEqual(codec.loads('{"name": "Молоко"}'.encode()), {"name": "Молоко"})
+
+    def test_invalid_json_raises_stdlib_error(self):
+        with self.assertRaises(codec.JSONDecodeError):
+            codec.loads(b"{not json")
+
+    def test_decimals_are_rendered_as_numbers(self):
+        body = codec.dumps({"amount": Decimal("123.45"), "qty": Decimal("1.000")})
+
+        self.assertEqual(json.loads(body, parse_float=Decimal), {"amount": Decimal("123.45"), "qty": 1})
+
+    def test_decimal_as_string_matches_django_encoder(self):
+        body = codec.dumps({"amount": Decimal("10.00")}, decimal_as_string=True)
+
+        self.assertEqual(json.loads(body), {"amount": "10.00"})
+
+    def test_stdlib_fallback(self):
+        with mock.patch.object(codec, "orjson", None):
+            self.assertEqual(codec.loads(b'{"price": 10.10}'), {"price": Decimal("10.10")})
+            body = codec.dumps({"price": Decimal("10.10"), "at": datetime(2025, 1, 2, 3, 4, 5)})
+
+        self.assertEqual(json.loads(body), {"price": 10.1, "at": "2025-01-02T03:04:05"})
+
+    def test_exact_decimals_use_the_stdlib_parser(self):
+        body = b'{"price": 10.0000000000000000001}'
+
+        self.assertEqual(
+            codec.loads(body, exact_decimals=True),
+            {"price": Decimal("10.0000000000000000001")},
+        )
+        with mock.patch.object(codec, "orjson", None):
+            self.assertEqual(
+                codec.loads(body, exact_decimals=True),
+                {"price": Decimal("10.0000000000000000001")},
+            )
+
+    def test_json_response(self):
+        response = codec.json_response({"status": "ok"}, status=201)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content), {"status": "ok"})
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def test_reports_each_size(self):
+        out = io.StringIO()
+        call_command("benchmark_onec_codec", "--sizes", "1,2", "--iterations", "1", stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[2:]], ["1", "2"])
@@ -0,0 +1,121 @@
+import importlib.util
+from unittest import mock
+
+from django.db.backends.postgresql import base as postgresql_base
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY, CollectorRegistry
+
+from backend import settings as settings_module
+from backend.db.postgresql import base as pool_base
+
+SETTINGS = {
+    "NAME": "lakshmi",
+    "USER": "",
+    "PASSWORD": "",
+    "HOST": "",
+    "PORT": "",
+    "OPTIONS": {"pool": {"max_size": 2}},
+    "CONN_MAX_AGE": 0,
+    "CONN_HEALTH_CHECKS": False,
+    "AUTOCOMMIT": True,
+    "ATOMIC_REQUESTS": False,
+    "TIME_ZONE": None,
+    "TEST": {},
+}
+
+
+class FakePool:
+    def get_stats(self):
+        # psycopg_pool omits counters that are still zero
+        return {
+            "pool_min": 1,
+            "pool_max": 4,
+            "pool_size": 3,
+            "pool_available": 1,
+            "requests_waiting": 2,
+        }
+
+
+class PoolCollectorTests(SimpleTestCase):
+    def test_exports_stats_of_open_pools(self):
+        registry = CollectorRegistry()
+        registry.register(pool_base.PoolCollector())
+
+        pools = {"default": FakePool()}
+        with mock.patch.dict(postgresql_base.DatabaseWrapper._connection_pools, pools):
+            value = registry.get_sample_value
+
+            open_, idle = ({"alias": "default", "state": state} for state in ("open", "idle"))
+            self.assertEqual(value("django_db_pool_connections", open_), 3)
+            self.assertEqual(value("django_db_pool_connections", idle), 1)
+            self.assertEqual(value("django_db_pool_max_connections", {"alias": "default"}), 4)
+            self.assertEqual(value("django_db_pool_waiting_requests", {"alias": "default"}), 2)
+            self.assertEqual(value("django_db_pool_checkout_errors_total", {"alias": "default"}), 0)
+
+    def test_no_pools_no_samples(self):
+        registry = CollectorRegistry()
+        registry.register(pool_base.PoolCollector())
+
+        with mock.patch.dict(postgresql_base.DatabaseWrapper._connection_pools, clear=True):
+            self.assertIsNone(
+                registry.get_sample_value("django_db_pool_max_connections", {"alias": "default"})
+            )
+
+
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    def setUp(self):
+        self.wrapper = pool_base.DatabaseWrapper(dict(SETTINGS), alias="pooltest")
+        patcher = mock.patch.object(
+            pool_base.DatabaseWrapper, "pool", new_callable=mock.PropertyMock, return_value=object()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cursor_wrapper_is_applied_once_per_physical_connection(self):
+        connection = mock.Mock(cursor_factory=None)
+        with mock.patch.object(
+            postgresql_base.DatabaseWrapper, "_configure_connection", return_value=False
+        ):
+            self.wrapper._configure_connection(connection)
+        wrapped = connection.cursor_factory
+        self.assertIsNotNone(wrapped)
+
+        with mock.patch.object(
+            postgresql_base.DatabaseWrapper, "get_new_connection", return_value=connection
+        ):
+            for _ in range(3):
+                self.assertIs(self.wrapper.get_new_connection({}), connection)
+
+        self.assertIs(connection.cursor_factory, wrapped)
+
+    def test_checkouts_are_timed(self):
+        def checkouts():
+            return REGISTRY.get_sample_value(
+                "django_db_pool_checkout_seconds_count", {"alias": "pooltest"}
+            ) or 0
+
+        before = checkouts()
+        with mock.patch.object(
+            postgresql_base.DatabaseWrapper, "get_new_connection", return_value=mock.Mock()
+        ):
+            self.wrapper.get_new_connection({})
+            self.wrapper.get_new_connection({})
+
+        self.assertEqual(checkouts(), before + 2)
+
+
+class ConnMaxAgeSettingsTests(SimpleTestCase):
+    def _conn_max_age(self, **env):
+        env = {"SECRET_KEY": "x", "DJANGO_DB_CONN_MAX_AGE": "60", **env}
+        with mock.patch.dict("os.environ", env):
+            spec = importlib.util.spec_from_file_location(
+                "settings_under_test", settings_module.__file__
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        return module.DATABASES["default"]["CONN_MAX_AGE"]
+
+    def test_persistent_connections_only_for_wsgi_without_pool(self):
+        self.assertEqual(self._conn_max_age(DJANGO_DB_POOL="false", DJANGO_SERVER="wsgi"), 60)
+        self.assertEqual(self._conn_max_age(DJANGO_DB_POOL="false", DJANGO_SERVER="asgi"), 0)
+        self.assertEqual(self._conn_max_age(DJANGO_DB_POOL="true", DJANGO_SERVER="wsgi"), 0)
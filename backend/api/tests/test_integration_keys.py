@@ -0,0 +1,173 @@
+import io
+import json
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from api import security
+from api.keys import hash_key, key_registry
+from api.models import IntegrationKey
+from api.product_cache import product_id_cache
+from main.models import CustomUser, Product, Transaction
+
+
+def _issue(raw_key, **fields):
+    return IntegrationKey.objects.create(
+        name=fields.pop("name", "store"),
+        key_hash=hash_key(raw_key),
+        key_prefix=raw_key[:8],
+        **fields,
+    )
+
+
+class IntegrationKeyAuthTests(TestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        key_registry.invalidate()
+        product_id_cache.clear()
+        self.client = Client()
+        CustomUser.objects.create(telegram_id=9001)
+        Product.objects.create(
+            product_code="SKU-1", name="Milk", price=Decimal("10.00"), category="Dairy", store_id=1
+        )
+
+    def _receipt(self, api_key, store_id, guid="R-1"):
+        payload = {
+            "receipt_guid": guid,
+            "datetime": "2025-03-10T12:30:00+00:00",
+            "store_id": str(store_id),
+            "customer": {"telegram_id": 9001},
+            "positions": [
+                {"product_code": "SKU-1", "quantity": "1", "price": "10.00", "line_number": 1}
+            ],
+            "totals": {
+                "total_amount": "10.00",
+                "discount_total": "0",
+                "bonus_spent": "0",
+                "bonus_earned": "0",
+            },
+        }
+        return self.client.post(
+            "/onec/receipt",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_X_API_KEY=api_key,
+            HTTP_X_IDEMPOTENCY_KEY=str(uuid.uuid4()),
+        )
+
+    def test_store_key_accepted_for_its_store_only(self):
+        _issue("store-7-key", store_id=7, scopes="receipts")
+
+        self.assertEqual(self._receipt("store-7-key", 7).status_code, 201)
+        response = self._receipt("store-7-key", 8, guid="R-22")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["error_code"], "store_not_allowed")
+
+    def test_scope_is_enforced(self):
+        _issue("export-only", scopes="export")
+
+        self.assertEqual(self._receipt("export-only", 1).status_code, 403)
+
+    def test_unknown_and_revoked_keys_are_rejected(self):
+        key = _issue("store-key", store_id=1)
+
+        self.assertEqual(self._receipt("other-key", 1).status_code, 401)
+        key.is_active = False
+        key.save()
+        self.assertEqual(self._receipt("store-key", 1).status_code, 401)
+
+    def test_store_key_cannot_use_endpoints_of_all_stores(self):
+        _issue("store-5-key", store_id=5, scopes="*")
+        body = json.dumps({"product_code": "SKU-9", "name": "Tea", "price": "5.00",
+                           "updated_at": "2025-09-01T12:00:00+09:00"})
+
+        response = self.client.post(
+            "/onec/product", data=body, content_type="application/json",
+            HTTP_X_API_KEY="store-5-key",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self._receipt("store-5-key", 5).status_code, 201)
+
+    def test_new_key_has_no_scopes(self):
+        _issue("bare-key")
+
+        self.assertEqual(self._receipt("bare-key", 1).status_code, 403)
+
+    def test_legacy_key_keeps_full_access(self):
+        self.assertEqual(self._receipt("test-key", 99).status_code, 201)
+
+    def test_lookup_is_served_from_memory(self):
+        _issue("store-key", store_id=1)
+        key_registry.resolve("store-key")
+
+        with self.assertNumQueries(0):
+            identity = key_registry.resolve("store-key")
+        self.assertEqual(identity.store_id, 1)
+
+    def test_export_is_limited_to_key_store(self):
+        _issue("store-2-key", store_id=2, scopes="export")
+        customer = CustomUser.objects.create(telegram_id=5)
+        product = Product.objects.get(product_code="SKU-1")
+        for store_id in (1, 2):
+            Transaction.objects.create(
+                customer=customer, product=product, quantity=1,
+                total_amount=Decimal("10.00"), price=Decimal("10.00"),
+                purchase_date=timezone.now().date(), store_id=store_id,
+                receipt_guid=f"E-{store_id}", receipt_line=1,
+            )
+
+        response = self.client.get("/onec/export/transactions", HTTP_X_API_KEY="store-2-key")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["store_id"] for row in rows], [2])
+        response = self.client.get(
+            "/onec/export/transactions", {"store_id": 1}, HTTP_X_API_KEY="store-2-key"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class IntegrationKeysCommandTests(TestCase):
+    def setUp(self):
+        key_registry.invalidate()
+
+    def _call(self, *args):
+        out = io.StringIO()
+        call_command("integration_keys", *args, stdout=out)
+        return out.getvalue()
+
+    def test_create_stores_only_the_hash(self):
+        output = self._call("create", "--name", "store-3", "--store-id", "3", "--scopes", "receipts")
+        raw_key = output.split(": ", 1)[1].split()[0]
+
+        key = IntegrationKey.objects.get()
+        self.assertEqual(key.key_hash, hash_key(raw_key))
+        self.assertNotIn(raw_key, key.key_hash)
+        self.assertEqual(key_registry.resolve(raw_key).store_id, 3)
+
+    def test_create_rejects_unknown_scopes_and_global_scopes_on_store_keys(self):
+        with self.assertRaisesMessage(CommandError, "Unknown scopes: refunds"):
+            self._call("create", "--name", "k", "--scopes", "receipts,refunds")
+        for scopes in ("customers", "receipts,messages", "*"):
+            with self.assertRaisesMessage(CommandError, "A store key may only have"):
+                self._call("create", "--name", "k", "--store-id", "3", "--scopes", scopes)
+        self.assertFalse(IntegrationKey.objects.exists())
+
+    def test_rotate_keeps_old_key_valid_during_overlap(self):
+        old = _issue("old-key", store_id=4, scopes="receipts")
+
+        self._call("rotate", str(old.pk), "--overlap-hours", "2")
+
+        old.refresh_from_db()
+        self.assertEqual(IntegrationKey.objects.count(), 2)
+        self.assertAlmostEqual(
+            old.valid_until, timezone.now() + timedelta(hours=2), delta=timedelta(minutes=1)
+        )
+        self.assertIsNotNone(key_registry.resolve("old-key"))
+
+        old.valid_until = timezone.now() - timedelta(seconds=1)
+        old.save()
+        self.assertIsNone(key_registry.resolve("old-key"))
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.test import Client, TestCase
+
+from api import security
+from api import views
+from main.models import CustomUser, Product, Transaction
+
+
+class OneCExportTransactionsTests(TestCase):
+    def setUp(self):
+        security.API_KEY = 'test-key'
+        self.client = Client()
+        self.user = CustomUser.objects.create(telegram_id=501)
+        self.product = Product.objects.create(
+            product_code='SKU-1', name='Milk', price=Decimal('10.00'),
+            category='Dairy', store_id=1,
+        )
+        for line, (store_id, day) in enumerate(
+            [(1, date(2025, 1, 10)), (1, date(2025, 2, 10)), (2, date(2025, 2, 11))], start=1
+        ):
+            Transaction.objects.create(
+                customer=self.user, product=self.product, quantity=1,
+                total_amount=Decimal('10.00'), price=Decimal('10.00'),
+                purchase_date=day, purchased_at=datetime(day.year, day.month, day.day, 23, 30),
+                store_id=store_id,
+                receipt_guid=f'R-{line}', receipt_line=1,
+            )
+
+    def _get(self, **params):
+        return self.client.get(
+            '/onec/export/transactions', params, HTTP_X_API_KEY=security.API_KEY
+        )
+
+    def _ndjson(self, response):
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_requires_api_key(self):
+        resp = self.client.get('/onec/export/transactions')
+        self.assertEqual(resp.status_code, 401)
+
+    def test_streams_ndjson_across_keyset_pages(self):
+        original = views.EXPORT_PAGE_SIZE
+        views.EXPORT_PAGE_SIZE = 2
+        try:
+            resp = self._get()
+            rows = self._ndjson(resp)
+        finally:
+            views.EXPORT_PAGE_SIZE = original
+
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([row['receipt_guid'] for row in rows], ['R-1', 'R-2', 'R-3'])
+        self.assertEqual(rows[0]['telegram_id'], 501)
+        self.assertEqual(rows[0]['product_code'], 'SKU-1')
+        self.assertEqual(rows[0]['total_amount'], '10.00')
+
+    def test_filters_and_resume(self):
+        rows = self._ndjson(self._get(date_from='2025-02-01', store_id='1'))
+        self.assertEqual([row['receipt_guid'] for row in rows], ['R-2'])
+
+        first = self._ndjson(self._get(limit='1'))
+        rest = self._ndjson(self._get(after_id=str(first[-1]['id'])))
+        self.assertEqual([row['receipt_guid'] for row in first + rest], ['R-1', 'R-2', 'R-3'])
+
+    def test_csv_format(self):
+        resp = self._get(format='csv', telegram_id='501', date_to='2025-01-31')
+        reader = csv.DictReader(io.StringIO(b''.join(resp.streaming_content).decode()))
+        rows = list(reader)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['receipt_guid'], 'R-1')
+        self.assertEqual(rows[0]['purchase_date'], '2025-01-10')
+
+    def test_invalid_filter(self):
+        resp = self._get(date_from='yesterday')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['error_code'], 'invalid_filter')
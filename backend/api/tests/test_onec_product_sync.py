@@ -1,6 +1,8 @@
 import json
+from unittest import mock
+
 from django.test import TestCase, Client
-from api import security
+from api import security, views
 from main.models import Product
 
 
@@ -37,11 +39,116 @@ class OneCProductSyncTests(TestCase):
 
         # update
         payload['name'] = 'Milk 2'
+        payload['updated_at'] = '2025-09-02T12:00:00+09:00'
         body = json.dumps(payload).encode()
         resp = self.client.post(
             '/onec/product', data=body, content_type='application/json',
             **self._headers(body)
         )
         self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['status'], 'updated')
         prod.refresh_from_db()
         self.assertEqual(prod.name, 'Milk 2')
+        self.assertIsNotNone(prod.updated_at)
+
+    def test_stale_or_repeated_update_is_unchanged(self):
+        payload = {
+            'product_code': 'P002',
+            'name': 'Bread',
+            'price': '50.00',
+            'category': 'Bakery',
+            'is_promotional': False,
+            'updated_at': '2025-09-02T12:00:00+09:00'
+        }
+        self.client.post(
+            '/onec/product', data=json.dumps(payload), content_type='application/json',
+            HTTP_X_API_KEY=security.API_KEY,
+        )
+
+        for updated_at in ('2025-09-02T12:00:00+09:00', '2025-09-01T12:00:00+09:00'):
+            stale = {**payload, 'price': '1.00', 'updated_at': updated_at}
+            resp = self.client.post(
+                '/onec/product', data=json.dumps(stale), content_type='application/json',
+                HTTP_X_API_KEY=security.API_KEY,
+            )
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.json()['status'], 'unchanged')
+
+        self.assertEqual(str(Product.objects.get(product_code='P002').price), '50.00')
+
+
+class OneCProductBatchSyncTests(TestCase):
+    def setUp(self):
+        security.API_KEY = 'test-key'
+        self.client = Client()
+
+    def _item(self, code, name, updated_at='2025-09-01T12:00:00+09:00', **extra):
+        return {
+            'product_code': code,
+            'name': name,
+            'price': '10.00',
+            'category': 'Dairy',
+            'is_promotional': False,
+            'updated_at': updated_at,
+            **extra,
+        }
+
+    def _post(self, body, content_type='application/json'):
+        return self.client.post(
+            '/onec/products/batch', data=body, content_type=content_type,
+            HTTP_X_API_KEY=security.API_KEY,
+        )
+
+    def test_json_array_creates_and_skips_unchanged(self):
+        items = [self._item('P1', 'Milk'), self._item('P2', 'Kefir')]
+        resp = self._post(json.dumps(items))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['summary'], {'created': 2})
+        self.assertEqual(Product.objects.count(), 2)
+
+        items[1] = self._item('P2', 'Kefir 2', updated_at='2025-09-02T12:00:00+09:00')
+        resp = self._post(json.dumps(items))
+        data = resp.json()
+        self.assertEqual(data['summary'], {'unchanged': 1, 'updated': 1})
+        self.assertEqual([item['status'] for item in data['items']], ['unchanged', 'updated'])
+        self.assertEqual(Product.objects.get(product_code='P2').name, 'Kefir 2')
+
+    def test_ndjson_reports_invalid_lines_and_keeps_newest_duplicate(self):
+        lines = [
+            json.dumps(self._item('P1', 'New', updated_at='2025-09-03T12:00:00+09:00')),
+            'not json',
+            json.dumps(self._item('P1', 'Old', updated_at='2025-09-01T12:00:00+09:00')),
+            json.dumps({'product_code': 'P3'}),
+        ]
+        resp = self._post('\n'.join(lines) + '\n', content_type='application/x-ndjson')
+
+        self.assertEqual(resp.status_code, 200)
+        statuses = {item['index']: item['status'] for item in resp.json()['items']}
+        self.assertEqual(statuses, {0: 'created', 1: 'invalid', 2: 'superseded', 3: 'invalid'})
+        self.assertEqual(Product.objects.get(product_code='P1').name, 'New')
+
+    def test_non_array_json_is_rejected(self):
+        resp = self._post(json.dumps(self._item('P1', 'Milk')))
+        self.assertEqual(resp.status_code, 400)
+
+    def test_stale_batch_row_after_newer_single_sync_is_unchanged(self):
+        newer = self._item('P1', 'Newer', updated_at='2025-09-03T12:00:00+09:00', price='99.00')
+        stale = self._item('P1', 'Stale', updated_at='2025-09-01T12:00:00+09:00')
+
+        def sync_newer_after_read(codes):
+            existing = original(codes)
+            resp = self.client.post(
+                '/onec/product', data=json.dumps(newer), content_type='application/json',
+                HTTP_X_API_KEY=security.API_KEY,
+            )
+            self.assertEqual(resp.status_code, 201)
+            return existing
+
+        original = views._existing_product_codes
+        with mock.patch.object(views, '_existing_product_codes', side_effect=sync_newer_after_read):
+            resp = self._post(json.dumps([stale]))
+
+        self.assertEqual(resp.json()['summary'], {'unchanged': 1})
+        product = Product.objects.get(product_code='P1')
+        self.assertEqual(product.name, 'Newer')
+        self.assertEqual(str(product.price), '99.00')
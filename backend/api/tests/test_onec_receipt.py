@@ -5,12 +5,14 @@ from django.conf import settings
 from django.test import Client, TestCase
 
 from api import security
-from main.models import CustomUser, Transaction
+from api.product_cache import product_id_cache
+from main.models import CustomUser, Receipt, Transaction
 
 
 class OneCReceiptTests(TestCase):
     def setUp(self):
         security.API_KEY = "test-key"
+        product_id_cache.clear()
         self.client = Client()
         CustomUser.objects.update_or_create(
             telegram_id=settings.GUEST_TELEGRAM_ID,
@@ -71,6 +73,72 @@ class OneCReceiptTests(TestCase):
         self.assertEqual(data["created_count"], 1)
         self.assertEqual(Transaction.objects.count(), 1)
 
+    def test_receipt_header_holds_receipt_level_totals(self):
+        payload = self._base_payload()
+        user = CustomUser.objects.create(telegram_id=payload["customer"]["telegram_id"])
+        payload["totals"]["discount_total"] = "5.00"
+
+        response = self._post_receipt(
+            payload,
+            api_key=security.API_KEY,
+            idem="00000000-0000-0000-0000-000000000011",
+        )
+        self.assertEqual(response.status_code, 201)
+
+        receipt = Receipt.objects.get()
+        self.assertEqual(receipt.receipt_guid, "R-123")
+        self.assertEqual(receipt.customer_id, user.id)
+        self.assertEqual(receipt.store_id, 77)
+        self.assertEqual(receipt.total_amount, Decimal("100.00"))
+        self.assertEqual(receipt.discount_total, Decimal("5.00"))
+        self.assertEqual(str(receipt.idempotency_key), "00000000-0000-0000-0000-000000000011")
+
+        tx = Transaction.objects.get()
+        self.assertEqual(tx.receipt_id, receipt.id)
+        self.assertIsNone(tx.receipt_total_amount)
+        self.assertIsNone(tx.receipt_discount_total)
+
+    def test_later_delivery_adds_its_totals_to_the_header(self):
+        payload = self._base_payload()
+        payload["totals"]["discount_total"] = "5.00"
+        CustomUser.objects.create(telegram_id=payload["customer"]["telegram_id"])
+        first = self._post_receipt(
+            payload,
+            api_key=security.API_KEY,
+            idem="00000000-0000-0000-0000-000000000012",
+        )
+        self.assertEqual(first.status_code, 201)
+
+        payload["positions"] = [
+            {
+                "product_code": "SKU-2",
+                "quantity": "1",
+                "price": "50.00",
+                "line_number": 2,
+                "bonus_earned": "0.50",
+            }
+        ]
+        payload["totals"] = {
+            "total_amount": "50.00",
+            "discount_total": "2.00",
+            "bonus_spent": "10.00",
+            "bonus_earned": "0.50",
+        }
+        second = self._post_receipt(
+            payload,
+            api_key=security.API_KEY,
+            idem="00000000-0000-0000-0000-000000000013",
+        )
+        self.assertEqual(second.status_code, 201)
+
+        receipt = Receipt.objects.get()
+        self.assertEqual(receipt.total_amount, Decimal("150.00"))
+        self.assertEqual(receipt.discount_total, Decimal("7.00"))
+        self.assertEqual(receipt.bonus_spent, Decimal("10.00"))
+        self.assertEqual(receipt.bonus_earned, Decimal("1.50"))
+        self.assertEqual(str(receipt.idempotency_key), "00000000-0000-0000-0000-000000000012")
+        self.assertEqual(Transaction.objects.filter(receipt=receipt).count(), 2)
+
     def test_receipt_without_position_bonus_allocates_totals(self):
         payload = self._base_payload()
         payload["positions"][0].pop("bonus_earned")
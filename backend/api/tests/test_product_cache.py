@@ -0,0 +1,82 @@
+import json
+import uuid
+
+from django.test import Client, TestCase, TransactionTestCase
+
+from api import security
+from api.product_cache import product_id_cache
+from main.models import CustomUser, Product, Transaction
+
+
+class ProductIdCacheTests(TestCase):
+    def setUp(self):
+        product_id_cache.clear()
+        self.milk = Product.objects.create(
+            product_code="SKU-MILK", name="Milk", price="10.00", store_id=1
+        )
+
+    def test_warm_cache_resolves_without_queries(self):
+        product_id_cache.get_many(["SKU-MILK"])
+
+        with self.assertNumQueries(0):
+            ids = product_id_cache.get_many(["SKU-MILK"])
+        self.assertEqual(ids, {"SKU-MILK": self.milk.id})
+
+    def test_unknown_codes_are_loaded_in_one_query(self):
+        product_id_cache.get_many([])
+        bread = Product.objects.create(
+            product_code="SKU-BREAD", name="Bread", price="5.00", store_id=1
+        )
+
+        with self.assertNumQueries(1):
+            ids = product_id_cache.get_many(["SKU-MILK", "SKU-BREAD", "SKU-NONE"])
+        self.assertEqual(ids, {"SKU-MILK": self.milk.id, "SKU-BREAD": bread.id})
+
+    def test_deleted_product_is_dropped(self):
+        product_id_cache.get_many(["SKU-MILK"])
+        self.milk.delete()
+
+        self.assertEqual(product_id_cache.get_many(["SKU-MILK"]), {})
+
+
+class StaleProductIdTests(TransactionTestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        product_id_cache.clear()
+        CustomUser.objects.create(telegram_id=9001)
+        self.milk = Product.objects.create(
+            product_code="SKU-MILK", name="Milk", price="10.00", store_id=1
+        )
+
+    def test_receipt_is_retried_when_a_cached_product_was_deleted_elsewhere(self):
+        product_id_cache.get_many(["SKU-MILK"])
+        # Другой воркер удалил товар: в этом процессе остался его старый id
+        Product.objects.filter(pk=self.milk.pk)._raw_delete(using="default")
+
+        payload = {
+            "receipt_guid": "R-STALE",
+            "datetime": "2025-03-10T12:30:00+00:00",
+            "store_id": "1",
+            "customer": {"telegram_id": 9001},
+            "positions": [
+                {"product_code": "SKU-MILK", "quantity": "1", "price": "10.00", "line_number": 1}
+            ],
+            "totals": {
+                "total_amount": "10.00",
+                "discount_total": "0",
+                "bonus_spent": "0",
+                "bonus_earned": "0",
+            },
+        }
+        response = Client().post(
+            "/onec/receipt",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_X_API_KEY="test-key",
+            HTTP_X_IDEMPOTENCY_KEY=str(uuid.uuid4()),
+        )
+
+        self.assertEqual(response.status_code, 201)
+        line = Transaction.objects.get(receipt_guid="R-STALE")
+        self.assertNotEqual(line.product_id, self.milk.pk)
+        self.assertEqual(line.product.product_code, "SKU-MILK")
@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+
+from api import ratelimit, security
+from api.keys import hash_key, key_registry
+from api.models import IntegrationKey
+from api.ratelimit import Limit, LocalBuckets, RedisBuckets
+
+LIMITS = {
+    "receipt": {"rate": 1, "burst": 2, "reserve": 0.0},
+    "export": {"rate": 1, "burst": 2, "reserve": 0.5},
+    "default": {"rate": 1, "burst": 2, "reserve": 0.0},
+}
+
+
+@override_settings(
+    ONEC_RATE_LIMIT_ENABLED=True,
+    ONEC_RATE_LIMIT_REDIS_URL=None,
+    ONEC_RATE_LIMITS=LIMITS,
+    ONEC_RATE_LIMIT_GLOBAL={"rate": 1, "burst": 100},
+)
+class OnecRateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        key_registry.invalidate()
+        ratelimit.reset_backend()
+        self.addCleanup(ratelimit.reset_backend)
+        self.client = Client()
+
+    def _health(self, api_key="test-key", ip="10.0.0.1"):
+        return self.client.post("/onec/health", HTTP_X_API_KEY=api_key, REMOTE_ADDR=ip)
+
+    def test_returns_429_with_retry_after_when_bucket_is_empty(self):
+        self.assertEqual(self._health().status_code, 200)
+        self.assertEqual(self._health().status_code, 200)
+
+        response = self._health()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["error_code"], "rate_limited")
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_clients_have_separate_buckets(self):
+        for _ in range(2):
+            self._health(ip="10.0.0.1")
+
+        self.assertEqual(self._health(ip="10.0.0.1").status_code, 429)
+        self.assertEqual(self._health(ip="10.0.0.2").status_code, 200)
+
+    def test_store_keys_are_limited_per_store(self):
+        for store_id in (1, 2):
+            IntegrationKey.objects.create(
+                name=f"store-{store_id}",
+                key_hash=hash_key(f"key-{store_id}"),
+                key_prefix="key",
+                store_id=store_id,
+            )
+        for _ in range(2):
+            self._health(api_key="key-1")
+
+        self.assertEqual(self._health(api_key="key-1", ip="10.0.0.9").status_code, 429)
+        self.assertEqual(self._health(api_key="key-2").status_code, 200)
+
+    def test_other_paths_are_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get("/healthz/").status_code, 200)
+
+    def test_decisions_are_counted(self):
+        before = ratelimit.RATE_LIMIT_DECISIONS.labels("default", "throttled")._value.get()
+        for _ in range(3):
+            self._health()
+
+        after = ratelimit.RATE_LIMIT_DECISIONS.labels("default", "throttled")._value.get()
+        self.assertEqual(after - before, 1)
+
+
+class LocalBucketsTests(TestCase):
+    def test_low_priority_endpoint_is_shed_before_receipts(self):
+        buckets = LocalBuckets()
+        global_limit = Limit(rate=0.001, burst=4)
+        receipt = Limit(rate=100, burst=100, reserve=0.0)
+        export = Limit(rate=100, burst=100, reserve=0.5)
+
+        # Export may not dip below half of the global burst.
+        self.assertEqual(buckets.take("export:a", export, global_limit)[0], ratelimit.ALLOWED)
+        self.assertEqual(buckets.take("export:a", export, global_limit)[0], ratelimit.ALLOWED)
+        decision, wait = buckets.take("export:a", export, global_limit)
+
+        self.assertEqual(decision, ratelimit.SHED)
+        self.assertGreater(wait, 0)
+        self.assertEqual(buckets.take("receipt:a", receipt, global_limit)[0], ratelimit.ALLOWED)
+        self.assertEqual(buckets.take("receipt:a", receipt, global_limit)[0], ratelimit.ALLOWED)
+        self.assertEqual(buckets.take("receipt:a", receipt, global_limit)[0], ratelimit.SHED)
+
+    def test_bucket_refills_over_time(self):
+        buckets = LocalBuckets()
+        limit = Limit(rate=1, burst=1)
+        global_limit = Limit(rate=100, burst=100)
+
+        with mock.patch.object(ratelimit.time, "monotonic", side_effect=[0.0, 0.5, 1.5]):
+            self.assertEqual(buckets.take("k", limit, global_limit)[0], ratelimit.ALLOWED)
+            self.assertEqual(buckets.take("k", limit, global_limit)[0], ratelimit.THROTTLED)
+            self.assertEqual(buckets.take("k", limit, global_limit)[0], ratelimit.ALLOWED)
+
+    def test_redis_outage_falls_back_to_local_buckets(self):
+        buckets = RedisBuckets("redis://127.0.0.1:1/0")
+        limit = Limit(rate=1, burst=1)
+        global_limit = Limit(rate=100, burst=100)
+
+        self.assertEqual(buckets.take("k", limit, global_limit)[0], ratelimit.ALLOWED)
+        self.assertEqual(buckets.take("k", limit, global_limit)[0], ratelimit.THROTTLED)
@@ -0,0 +1,171 @@
+import json
+import uuid
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from prometheus_client import REGISTRY
+
+from api import security
+from api.keys import hash_key, key_registry
+from api.metrics import STAGES
+from api.models import IntegrationKey
+from api.product_cache import product_id_cache
+from main.models import CustomUser
+
+STORE = "4242"
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(ONEC_METRICS_STORES=frozenset({STORE}))
+class ReceiptMetricsTests(TestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        key_registry.invalidate()
+        product_id_cache.clear()
+        self.client = Client()
+        CustomUser.objects.update_or_create(
+            telegram_id=settings.GUEST_TELEGRAM_ID,
+            defaults={"full_name": "Гость"},
+        )
+        CustomUser.objects.create(telegram_id=9001, qr_code="QR-9001")
+
+    def _post(self, payload, idem, api_key="test-key"):
+        return self.client.post(
+            "/onec/receipt",
+            data=json.dumps(payload).encode(),
+            content_type="application/json",
+            HTTP_X_API_KEY=api_key,
+            HTTP_X_IDEMPOTENCY_KEY=idem,
+        )
+
+    def _payload(self, guid, customer=None, lines=(1, 2), store=STORE):
+        return {
+            "receipt_guid": guid,
+            "datetime": "2025-03-10T12:30:00+00:00",
+            "store_id": store,
+            "customer": customer,
+            "positions": [
+                {
+                    "product_code": f"SKU-{line}",
+                    "quantity": "1",
+                    "price": "10.00",
+                    "line_number": line,
+                }
+                for line in lines
+            ],
+            "totals": {
+                "total_amount": f"{10 * len(lines)}.00",
+                "discount_total": "0",
+                "bonus_spent": "0",
+                "bonus_earned": "0",
+            },
+        }
+
+    def test_created_receipt_records_stages_lines_and_queries(self):
+        receipts = dict(store=STORE, customer="identified", outcome="created")
+        before = {
+            "receipts": _value("onec_receipts_total", **receipts),
+            "lines": _value("onec_receipt_lines_sum", store=STORE),
+            "queries": _value("onec_receipt_db_queries_count", store=STORE),
+            "created": _value("onec_receipt_lines_processed_total", store=STORE, result="created"),
+            "stages": {s: _value("onec_receipt_stage_seconds_count", stage=s) for s in STAGES},
+        }
+
+        response = self._post(
+            self._payload("R-METRICS-1", {"telegram_id": 9001}), str(uuid.uuid4())
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(_value("onec_receipts_total", **receipts), before["receipts"] + 1)
+        self.assertEqual(_value("onec_receipt_lines_sum", store=STORE), before["lines"] + 2)
+        self.assertEqual(
+            _value("onec_receipt_lines_processed_total", store=STORE, result="created"),
+            before["created"] + 2,
+        )
+        self.assertEqual(
+            _value("onec_receipt_db_queries_count", store=STORE), before["queries"] + 1
+        )
+        self.assertGreater(_value("onec_receipt_db_queries_sum", store=STORE), 0)
+        for stage in STAGES:
+            self.assertEqual(
+                _value("onec_receipt_stage_seconds_count", stage=stage),
+                before["stages"][stage] + 1,
+                stage,
+            )
+
+    def test_replay_counts_duplicates_and_guest(self):
+        payload = self._payload("R-METRICS-2")
+        idem = str(uuid.uuid4())
+        self.assertEqual(self._post(payload, idem).status_code, 201)
+
+        replays = dict(store=STORE, customer="unknown", outcome="already_exists")
+        before_replays = _value("onec_receipts_total", **replays)
+        before_dupes = _value(
+            "onec_receipt_lines_processed_total", store=STORE, result="duplicate"
+        )
+        before_guest = _value(
+            "onec_receipts_total", store=STORE, customer="guest", outcome="created"
+        )
+
+        self.assertEqual(self._post(payload, idem).status_code, 200)
+        self.assertEqual(self._post(self._payload("R-METRICS-3"), str(uuid.uuid4())).status_code, 201)
+
+        self.assertEqual(_value("onec_receipts_total", **replays), before_replays + 1)
+        self.assertEqual(
+            _value("onec_receipt_lines_processed_total", store=STORE, result="duplicate"),
+            before_dupes + 2,
+        )
+        self.assertEqual(
+            _value("onec_receipts_total", store=STORE, customer="guest", outcome="created"),
+            before_guest + 1,
+        )
+
+    def test_unlisted_stores_share_one_label_and_store_keys_use_their_store(self):
+        other = dict(store="other", customer="guest", outcome="created")
+        bound = dict(store="77", customer="guest", outcome="created")
+        before_other = _value("onec_receipts_total", **other)
+        before_bound = _value("onec_receipts_total", **bound)
+        IntegrationKey.objects.create(
+            name="store-77", key_hash=hash_key("store-77-key"), key_prefix="store-77",
+            store_id=77, scopes="receipts",
+        )
+
+        for index, store in enumerate(("501", "502")):
+            response = self._post(self._payload(f"R-OTHER-{index}", store=store), str(uuid.uuid4()))
+            self.assertEqual(response.status_code, 201)
+        response = self._post(
+            self._payload("R-BOUND", store=" 77"), str(uuid.uuid4()), api_key="store-77-key"
+        )
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(_value("onec_receipts_total", **other), before_other + 2)
+        self.assertEqual(_value("onec_receipts_total", **bound), before_bound + 1)
+        self.assertEqual(
+            _value("onec_receipts_total", store="501", customer="guest", outcome="created"), 0
+        )
+
+    def test_rejected_payloads_are_counted(self):
+        rejected = dict(store="unknown", customer="unknown", outcome="rejected")
+        before = _value("onec_receipts_total", **rejected)
+
+        response = self.client.post(
+            "/onec/receipt",
+            data=b"{not json",
+            content_type="application/json",
+            HTTP_X_API_KEY="test-key",
+            HTTP_X_IDEMPOTENCY_KEY=str(uuid.uuid4()),
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(_value("onec_receipts_total", **rejected), before + 1)
+
+    def test_metrics_endpoint_exposes_receipt_metrics(self):
+        self._post(self._payload("R-METRICS-4"), str(uuid.uuid4()))
+
+        body = self.client.get("/metrics").content.decode()
+
+        self.assertIn("onec_receipt_stage_seconds_bucket", body)
+        self.assertIn(f'onec_receipts_total{{customer="guest",outcome="created",store="{STORE}"}}', body)
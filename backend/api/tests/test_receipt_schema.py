@@ -0,0 +1,193 @@
+import copy
+import json
+from collections.abc import Mapping
+from decimal import Decimal
+from unittest import mock
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from api import codec, security
+from api.receipt_schema import validate_receipt
+from api.serializers import ReceiptSerializer
+
+
+def _receipt(**overrides):
+    payload = {
+        "receipt_guid": "R-1",
+        "datetime": "2025-03-10T12:30:00+00:00",
+        "store_id": "77",
+        "customer": {"telegram_id": 9001},
+        "positions": [
+            {
+                "product_code": "SKU-1",
+                "quantity": "1",
+                "price": "100.00",
+                "line_number": 1,
+                "bonus_earned": "1.00",
+            }
+        ],
+        "totals": {
+            "total_amount": "100.00",
+            "discount_total": "0",
+            "bonus_spent": "0",
+            "bonus_earned": "1.00",
+        },
+    }
+    payload.update(overrides)
+    return payload
+
+
+def _position(**overrides):
+    position = copy.deepcopy(_receipt()["positions"][0])
+    position.update(overrides)
+    return position
+
+
+def _plain(value):
+    """Make validated data comparable including Decimal exponents and types."""
+
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return type(value).__name__, str(value)
+
+
+VALID = {
+    "minimal": _receipt(),
+    "numbers_as_json_numbers": _receipt(
+        store_id=77,
+        positions=[_position(quantity=2, price=10.5, bonus_earned=0, line_number=1)],
+    ),
+    "optional_fields": _receipt(
+        positions=[
+            _position(
+                name="  Молоко  ",
+                category="",
+                discount_amount="5",
+                is_promotional="yes",
+                line_number="2",
+            )
+        ]
+    ),
+    "decimal_exponent": _receipt(positions=[_position(quantity="1E+1", price="1e2")]),
+    "no_customer": {k: v for k, v in _receipt().items() if k != "customer"},
+    "null_customer": _receipt(customer=None),
+    "guid_customer": _receipt(customer={"one_c_guid": " GUID-1 ", "extra": 1}),
+    "naive_datetime": _receipt(datetime="2025-03-10T12:30:00"),
+    "many_lines": _receipt(positions=[_position(line_number=i) for i in range(1, 51)]),
+    "unknown_keys_ignored": _receipt(extra={"a": 1}),
+}
+
+INVALID = {
+    "missing_guid": ({k: v for k, v in _receipt().items() if k != "receipt_guid"}, "missing_field"),
+    "missing_line_number": (
+        _receipt(positions=[{k: v for k, v in _position().items() if k != "line_number"}]),
+        "missing_field",
+    ),
+    "duplicate_lines": (
+        _receipt(positions=[_position(line_number=1), _position(line_number=1)]),
+        "duplicate_receipt_line",
+    ),
+    "not_an_object": ([1, 2], "invalid_payload"),
+    "bad_decimal": (_receipt(positions=[_position(price="abc")]), "invalid_payload"),
+    "nan": (_receipt(positions=[_position(price="NaN")]), "invalid_payload"),
+    "null_guid": (_receipt(receipt_guid=None), "invalid_payload"),
+    "blank_guid": (_receipt(receipt_guid="   "), "invalid_payload"),
+    "bool_store": (_receipt(store_id=True), "invalid_payload"),
+    "bad_datetime": (_receipt(datetime="yesterday"), "invalid_payload"),
+    "customer_not_object": (_receipt(customer="x"), "invalid_payload"),
+    "position_not_object": (_receipt(positions=["x"]), "invalid_payload"),
+    "positions_not_list": (_receipt(positions={"a": 1}), "not_a_list"),
+    "empty_positions": (_receipt(positions=[]), "min_length"),
+    "zero_quantity": (_receipt(positions=[_position(quantity="0")]), "min_value"),
+    "too_many_places": (_receipt(positions=[_position(price="1.001")]), "max_decimal_places"),
+    "too_many_digits": (_receipt(positions=[_position(price="1" * 13)]), "max_digits"),
+    "negative_total": (
+        _receipt(totals={**_receipt()["totals"], "total_amount": "-1"}),
+        "min_value",
+    ),
+    "line_number_float": (_receipt(positions=[_position(line_number=1.5)]), "invalid_payload"),
+    "telegram_id_zero": (_receipt(customer={"telegram_id": 0}), "min_value"),
+    "null_char": (_receipt(receipt_guid="R\x00"), "null_characters_not_allowed"),
+}
+
+
+class CompiledReceiptValidatorTests(SimpleTestCase):
+    def test_valid_payloads_match_drf_exactly(self):
+        for label, payload in VALID.items():
+            with self.subTest(label):
+                serializer = ReceiptSerializer(data=copy.deepcopy(payload))
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+
+                compiled = validate_receipt(copy.deepcopy(payload))
+
+                self.assertIsNotNone(compiled)
+                self.assertEqual(_plain(compiled), _plain(serializer.validated_data))
+
+    def test_invalid_payloads_are_left_to_drf(self):
+        for label, (payload, _) in INVALID.items():
+            with self.subTest(label):
+                self.assertFalse(ReceiptSerializer(data=copy.deepcopy(payload)).is_valid())
+                self.assertIsNone(validate_receipt(copy.deepcopy(payload)))
+
+    def test_defaults_are_filled(self):
+        position = validate_receipt(_receipt())["positions"][0]
+
+        self.assertEqual(position["discount_amount"], Decimal("0"))
+        self.assertIs(position["is_promotional"], False)
+        self.assertEqual(str(position["quantity"]), "1.000")
+
+
+class ReceiptErrorMappingTests(TestCase):
+    """Both validator modes must answer invalid receipts with the same body."""
+
+    def setUp(self):
+        security.API_KEY = "test-key"
+        self.client = Client()
+
+    def _post(self, payload):
+        return self.client.post(
+            "/onec/receipt",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_X_API_KEY="test-key",
+            HTTP_X_IDEMPOTENCY_KEY="00000000-0000-0000-0000-000000000001",
+        )
+
+    def test_error_codes_match_between_modes(self):
+        for label, (payload, error_code) in INVALID.items():
+            with self.subTest(label):
+                with override_settings(ONEC_RECEIPT_VALIDATOR="compiled"):
+                    compiled = self._post(payload)
+                with override_settings(ONEC_RECEIPT_VALIDATOR="drf"):
+                    drf = self._post(payload)
+
+                self.assertEqual(compiled.status_code, 400)
+                self.assertEqual(compiled.json()["error_code"], error_code)
+                self.assertEqual(compiled.json(), drf.json())
+
+    def test_numeric_amounts_are_parsed_as_decimal_with_either_backend(self):
+        body = json.dumps(_receipt()).replace('"price": "100.00"', '"price": 100.0000000000000000001')
+        self.assertIn("100.0000000000000000001", body)
+
+        for backend in (codec.orjson, None):
+            with self.subTest(backend=getattr(backend, "__name__", "json")):
+                with mock.patch.object(codec, "orjson", backend):
+                    response = self.client.post(
+                        "/onec/receipt",
+                        data=body,
+                        content_type="application/json",
+                        HTTP_X_API_KEY="test-key",
+                        HTTP_X_IDEMPOTENCY_KEY="00000000-0000-0000-0000-000000000001",
+                    )
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["error_code"], "max_digits")
+
+    @override_settings(ONEC_RECEIPT_VALIDATOR="compiled")
+    def test_valid_receipt_skips_drf_serializer(self):
+        with mock.patch("api.views.ReceiptSerializer") as serializer:
+            self._post(_receipt(store_id="1"))
+
+        serializer.assert_not_called()
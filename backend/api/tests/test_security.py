@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from api import security
+from api.security import IPAllowList
+
+
+class IPAllowListTests(SimpleTestCase):
+    def test_cidr_and_single_addresses(self):
+        allow = IPAllowList(["10.0.0.0/8", "192.168.1.5", "2001:db8::/32"])
+
+        self.assertTrue(allow.allows("10.20.30.40"))
+        self.assertTrue(allow.allows("192.168.1.5"))
+        self.assertFalse(allow.allows("192.168.1.6"))
+        self.assertTrue(allow.allows("2001:db8:1::7"))
+        self.assertFalse(allow.allows("2001:db9::1"))
+        self.assertFalse(allow.allows("not-an-ip"))
+
+    def test_legacy_wildcards_keep_string_prefix_semantics(self):
+        allow = IPAllowList(["192.168.*", "10.1.2*"])
+
+        self.assertTrue(allow.allows("192.168.200.1"))
+        self.assertFalse(allow.allows("192.169.0.1"))
+        for ip in ("10.1.2.1", "10.1.25.1", "10.1.201.9"):
+            self.assertTrue(allow.allows(ip), ip)
+        for ip in ("10.1.3.1", "10.1.30.1", "10.1.1.2"):
+            self.assertFalse(allow.allows(ip), ip)
+
+    def test_overlapping_rules_are_merged(self):
+        allow = IPAllowList(["10.0.0.0/24", "10.0.1.0/24", "10.0.0.128/25", "10.*"])
+
+        self.assertEqual(len(allow), 1)
+
+    def test_mapped_ipv4_and_ports_are_normalised(self):
+        allow = IPAllowList(["203.0.113.0/24"])
+
+        self.assertTrue(allow.allows("::ffff:203.0.113.9"))
+        self.assertTrue(allow.allows("203.0.113.9:51234"))
+        self.assertTrue(IPAllowList(["::1"]).allows("[::1]:8000"))
+
+    def test_invalid_rules_deny_instead_of_opening_access(self):
+        allow = IPAllowList(["nonsense"])
+
+        self.assertTrue(allow)
+        self.assertFalse(allow.allows("127.0.0.1"))
+
+    def test_decisions_are_cached(self):
+        allow = IPAllowList(["10.0.0.0/8"])
+        allow.allows("10.0.0.1")
+        allow.allows("10.0.0.1")
+
+        self.assertEqual(allow.allows.cache_info().hits, 1)
+
+
+class ClientIPTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_without_trusted_proxies_uses_real_ip_header(self):
+        request = self.factory.get("/", HTTP_X_REAL_IP="198.51.100.7", REMOTE_ADDR="172.18.0.2")
+
+        with mock.patch.object(security, "_TRUSTED_PROXIES", IPAllowList()):
+            self.assertEqual(security._client_ip(request), "198.51.100.7")
+
+    def test_forwarded_for_is_walked_from_the_right(self):
+        request = self.factory.get(
+            "/",
+            HTTP_X_FORWARDED_FOR="1.1.1.1, 198.51.100.7, 172.18.0.5",
+            REMOTE_ADDR="172.18.0.2",
+        )
+
+        with mock.patch.object(security, "_TRUSTED_PROXIES", IPAllowList(["172.16.0.0/12"])):
+            self.assertEqual(security._client_ip(request), "198.51.100.7")
+
+    def test_forwarded_for_ignored_from_untrusted_peer(self):
+        request = self.factory.get(
+            "/", HTTP_X_FORWARDED_FOR="10.0.0.1", REMOTE_ADDR="198.51.100.7"
+        )
+
+        with mock.patch.object(security, "_TRUSTED_PROXIES", IPAllowList(["172.16.0.0/12"])):
+            self.assertEqual(security._client_ip(request), "198.51.100.7")
+
+
+@mock.patch.object(security, "API_KEY", "test-key")
+class RequireOnecAuthIPTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.view = security.require_onec_auth(lambda request: JsonResponse({"ok": True}))
+
+    def _get(self, ip):
+        return self.view(
+            self.factory.get("/onec/health", HTTP_X_API_KEY="test-key", REMOTE_ADDR=ip)
+        )
+
+    def test_allowed_and_denied_addresses(self):
+        with mock.patch.object(security, "_ALLOW_LIST", IPAllowList(["10.0.0.0/8"])):
+            self.assertEqual(self._get("10.2.3.4").status_code, 200)
+            self.assertEqual(self._get("11.2.3.4").status_code, 403)
+
+    def test_empty_allow_list_allows_everyone(self):
+        with mock.patch.object(security, "_ALLOW_LIST", IPAllowList()):
+            self.assertEqual(self._get("11.2.3.4").status_code, 200)
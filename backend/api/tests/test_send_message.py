@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+from celery.exceptions import Retry
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import tasks, telegram
+from main.models import CustomUser
+
+
+def _http_error(status_code, body=None):
+    return requests.HTTPError(
+        response=SimpleNamespace(status_code=status_code, json=lambda: body or {})
+    )
+
+
+@mock.patch("api.views.config.BOT_TOKEN", "123:TEST")
+class SendMessageAPIViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        CustomUser.objects.create(telegram_id=777)
+
+    def _post(self, **extra):
+        return self.client.post(
+            "/api/send-message/", {"telegram_id": 777, "text": "Hi", **extra}, format="json"
+        )
+
+    def test_sends_synchronously_through_shared_session(self):
+        with mock.patch.object(telegram, "send_message") as send:
+            response = self._post()
+
+        self.assertEqual(response.status_code, 200)
+        send.assert_called_once_with(777, "Hi")
+
+    def test_telegram_failure_returns_502(self):
+        with mock.patch.object(telegram, "send_message", side_effect=requests.ConnectionError()):
+            response = self._post()
+
+        self.assertEqual(response.status_code, 502)
+
+    def test_async_flag_queues_task(self):
+        with mock.patch.object(tasks.send_telegram_message, "delay") as delay:
+            delay.return_value = SimpleNamespace(id="task-1")
+            response = self._post(**{"async": True})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["task_id"], "task-1")
+        delay.assert_called_once_with(777, "Hi")
+
+    @override_settings(TELEGRAM_SEND_ASYNC=True)
+    def test_async_by_default_when_configured(self):
+        with mock.patch.object(tasks.send_telegram_message, "delay") as delay:
+            delay.return_value = SimpleNamespace(id="task-2")
+            response = self._post()
+
+        self.assertEqual(response.status_code, 202)
+
+
+class TelegramClientTests(TestCase):
+    def test_session_is_shared(self):
+        self.assertIs(telegram.get_session(), telegram.get_session())
+
+    def test_retryable_errors(self):
+        self.assertTrue(telegram.is_retryable(requests.ConnectionError()))
+        self.assertTrue(telegram.is_retryable(_http_error(429)))
+        self.assertTrue(telegram.is_retryable(_http_error(502)))
+        self.assertFalse(telegram.is_retryable(_http_error(403)))
+
+    def test_flood_control_retry_waits_for_retry_after(self):
+        flood = _http_error(429, {"ok": False, "parameters": {"retry_after": 37}})
+        self.assertEqual(telegram.retry_after(flood), 37)
+        self.assertIsNone(telegram.retry_after(_http_error(429)))
+        self.assertIsNone(telegram.retry_after(_http_error(502)))
+
+        task = tasks.send_telegram_message
+        with mock.patch.object(telegram, "send_message", side_effect=flood), \
+                mock.patch.object(task, "retry", side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                task.run(777, "Hi")
+
+        self.assertEqual(retry.call_args.kwargs["countdown"], 37)
+
+    def test_task_does_not_retry_rejected_message(self):
+        with mock.patch.object(telegram, "send_message", side_effect=_http_error(400)):
+            result = tasks.send_telegram_message.apply(args=(777, "Hi"))
+
+        self.assertIs(result.result, False)
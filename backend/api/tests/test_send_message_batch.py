@@ -0,0 +1,148 @@
+import asyncio
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import security, tasks
+from api.models import MessageJob, MessageJobRecipient
+from main.models import CustomUser, Receipt
+
+os.environ.setdefault("BOT_TOKEN", "123456:TESTTOKEN")
+
+from src import message_jobs  # noqa: E402  pylint: disable=wrong-import-position
+
+
+class SendMessageBatchAPITests(TestCase):
+    def setUp(self):
+        security.API_KEY = "test-key"
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY="test-key")
+        self.first = CustomUser.objects.create(telegram_id=11)
+        self.second = CustomUser.objects.create(telegram_id=12)
+
+    def _post(self, payload):
+        with mock.patch.object(tasks.run_message_job, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/send-message/batch/", payload, format="json")
+        return response, delay
+
+    def test_requires_api_key(self):
+        response = APIClient().post(
+            "/api/send-message/batch/", {"text": "Hi", "telegram_ids": [11]}, format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_ids_are_resolved_in_one_query_and_job_is_queued(self):
+        # lookup, job, recipients + SAVEPOINT/RELEASE of the atomic block
+        with self.assertNumQueries(5):
+            response, delay = self._post({"text": "Заказ готов", "telegram_ids": [11, 12, 99, 11]})
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(data["not_found"], 1)
+        delay.assert_called_once_with(data["job_id"])
+
+        statuses = dict(
+            MessageJobRecipient.objects.filter(job_id=data["job_id"]).values_list(
+                "telegram_id", "status"
+            )
+        )
+        self.assertEqual(statuses, {11: "pending", 12: "pending", 99: "not_found"})
+
+    def test_filter_by_store(self):
+        Receipt.objects.create(receipt_guid="R-1", customer=self.second, store_id=5)
+
+        response, _ = self._post({"text": "Акция", "filter": {"store_id": 5}})
+
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        self.assertEqual(
+            list(MessageJobRecipient.objects.filter(job_id=job_id).values_list("telegram_id", flat=True)),
+            [12],
+        )
+
+    def test_ids_and_filter_are_mutually_exclusive(self):
+        response, delay = self._post({"text": "Hi", "telegram_ids": [11], "filter": {"store_id": 5}})
+
+        self.assertEqual(response.status_code, 400)
+        delay.assert_not_called()
+
+    def test_job_results_endpoint(self):
+        response, _ = self._post({"text": "Hi", "telegram_ids": [11, 99]})
+        job_id = response.json()["job_id"]
+
+        response = self.client.get(f"/api/send-message/jobs/{job_id}/", {"status": "not_found"})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["summary"], {"pending": 1, "not_found": 1})
+        self.assertEqual([r["telegram_id"] for r in data["results"]], [99])
+
+
+class DummyTelegramBot:
+    def __init__(self, forbidden=()):
+        self.sent = []
+        self._forbidden = set(forbidden)
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id in self._forbidden:
+            raise TelegramForbiddenError(
+                method=SendMessage(chat_id=chat_id, text=text), message="blocked"
+            )
+        self.sent.append(chat_id)
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=len(self.sent))
+
+
+class SendMessageJobTests(TransactionTestCase):
+    def test_sends_pending_recipients_and_records_results(self):
+        job = MessageJob.objects.create(text="Hi")
+        for telegram_id in (21, 22, 23):
+            customer = CustomUser.objects.create(telegram_id=telegram_id)
+            MessageJobRecipient.objects.create(job=job, customer=customer, telegram_id=telegram_id)
+        MessageJobRecipient.objects.create(job=job, telegram_id=24, status="not_found")
+
+        bot = DummyTelegramBot(forbidden={22})
+        stats = asyncio.run(
+            message_jobs.send_message_job(job.id, bot_instance=bot, rate=0, batch_size=2)
+        )
+
+        self.assertEqual(stats, {"sent": 2, "forbidden": 1})
+        self.assertEqual(sorted(bot.sent), [21, 23])
+        job.refresh_from_db()
+        self.assertEqual(job.status, MessageJob.STATUS_DONE)
+        self.assertIsNotNone(job.finished_at)
+        sent = MessageJobRecipient.objects.get(job=job, telegram_id=21)
+        self.assertEqual(sent.status, "sent")
+        self.assertIsNotNone(sent.sent_at)
+
+        repeat = DummyTelegramBot()
+        asyncio.run(message_jobs.send_message_job(job.id, bot_instance=repeat, rate=0))
+        self.assertEqual(repeat.sent, [])
+
+    def test_claimed_recipients_are_skipped_until_their_lease_expires(self):
+        job = MessageJob.objects.create(text="Hi")
+        now = timezone.now()
+        MessageJobRecipient.objects.create(
+            job=job, telegram_id=31, status="sending", claimed_at=now
+        )
+        MessageJobRecipient.objects.create(
+            job=job, telegram_id=32, status="sending", claimed_at=now - timedelta(hours=1)
+        )
+
+        bot = DummyTelegramBot()
+        asyncio.run(message_jobs.send_message_job(job.id, bot_instance=bot, rate=0))
+
+        self.assertEqual(bot.sent, [32])
+        self.assertEqual(
+            MessageJobRecipient.objects.get(job=job, telegram_id=31).status, "sending"
+        )
+        job.refresh_from_db()
+        self.assertEqual(job.status, MessageJob.STATUS_RUNNING)
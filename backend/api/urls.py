@@ -1,21 +1,40 @@
+from django.conf import settings
 from django.urls import path
 
 from .views import (
+    MessageJobAPIView,
     PurchaseAPIView,
     SendMessageAPIView,
+    SendMessageBatchAPIView,
     healthz,
     onec_customer_sync,
+    onec_export_transactions,
     onec_health,
+    onec_product_batch_sync,
     onec_product_sync,
     onec_receipt,
 )
 
+if settings.ONEC_ASYNC_VIEWS:
+    # Под ASGI; sync-версии остаются для WSGI и для сравнения нагрузочным тестом
+    from .async_views import (
+        healthz,
+        onec_customer_sync,
+        onec_export_transactions,
+        onec_product_sync,
+        onec_receipt,
+    )
+
 urlpatterns = [
     path("healthz/", healthz, name="healthz"),
     path('onec/health', onec_health, name='onec_health'),
     path('onec/receipt', onec_receipt, name='onec_receipt'),
     path('onec/customer', onec_customer_sync, name='onec_customer_sync'),
     path('onec/product', onec_product_sync, name='onec_product_sync'),
+    path('onec/products/batch', onec_product_batch_sync, name='onec_product_batch_sync'),
+    path('onec/export/transactions', onec_export_transactions, name='onec_export_transactions'),
     path('api/purchase/', PurchaseAPIView.as_view(), name='purchase'),
     path('api/send-message/', SendMessageAPIView.as_view(), name='send-message'),
+    path('api/send-message/batch/', SendMessageBatchAPIView.as_view(), name='send-message-batch'),
+    path('api/send-message/jobs/<uuid:job_id>/', MessageJobAPIView.as_view(), name='send-message-job'),
 ]
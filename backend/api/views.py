@@ -2,19 +2,21 @@
 
 from __future__ import annotations
 
-import json
+import csv
 import logging
-from datetime import datetime, timezone
+from collections import Counter
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal as D, ROUND_HALF_UP
 from typing import Any
 
 import requests
 from django.conf import settings
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db import IntegrityError, transaction as db_tx
-from django.db.models import F, Value
+from django.db import IntegrityError, connection as db_connection, transaction as db_tx
+from django.db.models import Count, F, Q, Value
 from django.db.models.functions import Coalesce
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone as dj_tz
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -25,18 +27,51 @@ from rest_framework.response import Response
 from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 from rest_framework.views import APIView
 
-from main.models import CustomUser, Product, Transaction
+from backend.db.router import read_from_replica
+from main.models import CustomUser, Product, Receipt, Transaction
 from src import config
 
-from .models import OneCClientMap
+from . import codec, telegram
+from .codec import json_response
+from .metrics import ReceiptTrace, receipt_rejected, stage_timer, store_label
+from .models import MessageJob, MessageJobRecipient, OneCClientMap
+from .product_cache import product_id_cache
+from .receipt_schema import validate_receipt
 from .security import require_onec_auth
 from .serializers import (
     ProductUpdateSerializer,
     ReceiptSerializer,
+    SendMessageBatchSerializer,
 )
+from .tasks import run_message_job, send_telegram_message
 
 logger = logging.getLogger(__name__)
 
+PRODUCT_BATCH_CHUNK_SIZE = 500
+PRODUCT_SYNC_FIELDS = ("one_c_guid", "name", "price", "category", "is_promotional", "updated_at")
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/jsonl", "application/json-seq"}
+EXPORT_PAGE_SIZE = 5000
+EXPORT_FIELDS = (
+    "id",
+    "receipt_guid",
+    "receipt_line",
+    "purchased_at",
+    "purchase_date",
+    "purchase_time",
+    "store_id",
+    "customer__telegram_id",
+    "product__product_code",
+    "quantity",
+    "price",
+    "total_amount",
+    "bonus_earned",
+    "is_promotional",
+)
+EXPORT_COLUMNS = tuple(
+    {"customer__telegram_id": "telegram_id", "product__product_code": "product_code"}.get(f, f)
+    for f in EXPORT_FIELDS
+)
+
 
 def _as_decimal(value: Any) -> D:
     if isinstance(value, D):
@@ -52,7 +87,7 @@ def _onec_error(error_code: str, message: str, *, details: Any | None = None, st
     payload: dict[str, Any] = {"error_code": error_code, "message": message}
     if details is not None:
         payload["details"] = details
-    return JsonResponse(payload, status=status_code)
+    return json_response(payload, status=status_code)
 
 
 def _find_first_error_code(errors: Any) -> str | None:
@@ -71,6 +106,34 @@ def _find_first_error_code(errors: Any) -> str | None:
     return None
 
 
+def _resolve_product_ids(positions: list[dict[str, Any]], store_id: Any) -> dict[str, int]:
+    """Map every product_code on the receipt to a product id.
+
+    Known codes come from the in-process catalogue cache; unknown ones are
+    created in one INSERT (first position wins for name/price) and reloaded
+    with one SELECT.
+    """
+
+    product_ids = product_id_cache.get_many(p["product_code"] for p in positions)
+    new_products: dict[str, Product] = {}
+    for position in positions:
+        code = position["product_code"]
+        if code in product_ids or code in new_products:
+            continue
+        new_products[code] = Product(
+            product_code=code,
+            name=position.get("name") or "UNKNOWN",
+            price=_as_decimal(position["price"]),
+            is_promotional=bool(position.get("is_promotional", False)),
+            category=position.get("category"),
+            store_id=store_id,
+        )
+    if new_products:
+        Product.objects.bulk_create(list(new_products.values()), ignore_conflicts=True)
+        product_ids.update(product_id_cache.get_many(new_products))
+    return product_ids
+
+
 class DuplicateReceiptLineError(Exception):
     def __init__(self, line_number: int):
         super().__init__(f"Duplicate receipt line {line_number}")
@@ -78,7 +141,7 @@ class DuplicateReceiptLineError(Exception):
 
 
 @method_decorator(csrf_exempt, name="dispatch")
-@method_decorator(require_onec_auth, name="dispatch")
+@method_decorator(require_onec_auth(scope="receipts"), name="dispatch")
 class PurchaseAPIView(APIView):
     """Legacy endpoint — disabled. Use /onec/receipt instead."""
 
@@ -89,6 +152,12 @@ class PurchaseAPIView(APIView):
         )
 
 
+def _wants_async(value: Any) -> bool:
+    if value is None:
+        return getattr(settings, "TELEGRAM_SEND_ASYNC", False)
+    return str(value).strip().lower() in {"1", "true", "yes"}
+
+
 class SendMessageAPIView(APIView):
     """Minimal wrapper to send a Telegram message on behalf of the bot."""
 
@@ -114,17 +183,16 @@ class SendMessageAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        telegram_url = f"https://api.telegram.org/bot{config.BOT_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": user.telegram_id,
-            "text": text,
-            "parse_mode": "HTML",
-        }
+        if _wants_async(request.data.get("async")):
+            result = send_telegram_message.delay(user.telegram_id, text)
+            return Response(
+                {"msg": "Message queued.", "task_id": result.id},
+                status=status.HTTP_202_ACCEPTED,
+            )
 
         try:
-            response = requests.post(telegram_url, json=payload, timeout=5)
-            response.raise_for_status()
-        except requests.RequestException as exc:  # pragma: no cover - network failure
+            telegram.send_message(user.telegram_id, text)
+        except requests.RequestException as exc:
             logger.warning("Failed to send Telegram message: %s", exc)
             return Response(
                 {"err": "Failed to send message to Telegram."},
@@ -134,37 +202,140 @@ class SendMessageAPIView(APIView):
         return Response({"msg": "Message sent successfully."})
 
 
+MESSAGE_JOB_PAGE_SIZE = 1000
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(require_onec_auth(scope="messages"), name="dispatch")
+class SendMessageBatchAPIView(APIView):
+    """Queue one text for many customers; results are read from the job endpoint."""
+
+    def post(self, request):
+        serializer = SendMessageBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"err": "Invalid payload.", "details": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        data = serializer.validated_data
+        limit = SendMessageBatchSerializer.MAX_RECIPIENTS
+
+        if "telegram_ids" in data:
+            telegram_ids = list(dict.fromkeys(data["telegram_ids"]))
+            customers = dict(
+                CustomUser.objects.filter(telegram_id__in=telegram_ids).values_list(
+                    "telegram_id", "id"
+                )
+            )
+        else:
+            filters = data["filter"]
+            qs = CustomUser.objects.filter(telegram_id__gt=0)
+            if "store_id" in filters:
+                qs = qs.filter(receipts__store_id=filters["store_id"]).distinct()
+            if "purchased_since" in filters:
+                qs = qs.filter(last_purchase_date__date__gte=filters["purchased_since"])
+            customers = dict(qs.order_by("id").values_list("telegram_id", "id")[: limit + 1])
+            if len(customers) > limit:
+                return Response(
+                    {"err": f"Filter matches more than {limit} customers."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            telegram_ids = list(customers)
+
+        with db_tx.atomic():
+            job = MessageJob.objects.create(text=data["text"])
+            MessageJobRecipient.objects.bulk_create(
+                [
+                    MessageJobRecipient(
+                        job=job,
+                        telegram_id=telegram_id,
+                        customer_id=customers.get(telegram_id),
+                        status=(
+                            MessageJobRecipient.STATUS_PENDING
+                            if telegram_id in customers
+                            else MessageJobRecipient.STATUS_NOT_FOUND
+                        ),
+                    )
+                    for telegram_id in telegram_ids
+                ],
+                batch_size=1000,
+            )
+            if customers:
+                db_tx.on_commit(lambda: run_message_job.delay(str(job.id)))
+            else:
+                MessageJob.objects.filter(pk=job.pk).update(
+                    status=MessageJob.STATUS_DONE, finished_at=dj_tz.now()
+                )
+                job.status = MessageJob.STATUS_DONE
+
+        return Response(
+            {
+                "job_id": str(job.id),
+                "status": job.status,
+                "total": len(telegram_ids),
+                "not_found": len(telegram_ids) - len(customers),
+                "status_url": f"/api/send-message/jobs/{job.id}/",
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+@method_decorator(require_onec_auth(scope="messages"), name="dispatch")
+class MessageJobAPIView(APIView):
+    """Job status with per-recipient results, paged by ``after_id``."""
+
+    def get(self, request, job_id):
+        job = MessageJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return Response({"err": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        summary = dict(
+            job.recipients.values_list("status").annotate(count=Count("id")).order_by()
+        )
+        recipients = job.recipients.order_by("id")
+        status_filter = request.query_params.get("status")
+        if status_filter:
+            recipients = recipients.filter(status=status_filter)
+        try:
+            after_id = int(request.query_params.get("after_id") or 0)
+        except ValueError:
+            return Response({"err": "after_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        page = list(
+            recipients.filter(id__gt=after_id).values(
+                "id", "telegram_id", "status", "error", "telegram_message_id", "sent_at"
+            )[:MESSAGE_JOB_PAGE_SIZE]
+        )
+
+        return Response(
+            {
+                "job_id": str(job.id),
+                "status": job.status,
+                "created_at": job.created_at,
+                "finished_at": job.finished_at,
+                "summary": summary,
+                "results": page,
+                "next_after_id": page[-1]["id"] if len(page) == MESSAGE_JOB_PAGE_SIZE else None,
+            }
+        )
+
+
 @require_GET
 @csrf_exempt
 def healthz(_request):
     """Public health-check endpoint for container orchestration."""
 
-    return JsonResponse({"status": "ok"})
+    return json_response({"status": "ok"})
 
 
 @csrf_exempt
 @require_POST
 @require_onec_auth
 def onec_health(_request):
-    return JsonResponse({"status": "ok"})
+    return json_response({"status": "ok"})
 
 
-@csrf_exempt
-@require_POST
-@require_onec_auth
-def onec_receipt(request):
-    raw_body = request.body or b"{}"
-    if isinstance(raw_body, (bytes, bytearray)):
-        raw_body = raw_body.decode("utf-8")
-    try:
-        payload = json.loads(raw_body)
-    except json.JSONDecodeError as exc:
-        logger.warning("onec_receipt: invalid JSON payload: %s", exc)
-        return _onec_error(
-            "invalid_json",
-            "Request body must be valid JSON.",
-            details={"error": str(exc)},
-        )
+def _validate_receipt_drf(payload: Any) -> dict[str, Any] | HttpResponse:
+    """Validate with ``ReceiptSerializer``; returns the data or the error response."""
 
     serializer = ReceiptSerializer(data=payload)
     if not serializer.is_valid():
@@ -185,7 +356,44 @@ def onec_receipt(request):
             errors,
         )
         return _onec_error(error_code, message, details=errors)
-    data = serializer.validated_data
+    return serializer.validated_data
+
+
+def _parse_receipt_request(request) -> tuple[dict[str, Any], str, str] | HttpResponse:
+    """Decode and validate an ``/onec/receipt`` call without touching the database.
+
+    Returns ``(data, idempotency_key, store metrics label)``.
+    """
+
+    try:
+        with stage_timer["parse"].time():
+            payload = codec.loads(request.body or b"{}", exact_decimals=True)
+    except codec.JSONDecodeError as exc:
+        logger.warning("onec_receipt: invalid JSON payload: %s", exc)
+        return _onec_error(
+            "invalid_json",
+            "Request body must be valid JSON.",
+            details={"error": str(exc)},
+        )
+
+    with stage_timer["validate"].time():
+        data = validate_receipt(payload) if settings.ONEC_RECEIPT_VALIDATOR == "compiled" else None
+        if data is None:
+            data = _validate_receipt_drf(payload)
+    if isinstance(data, HttpResponse):
+        return data
+
+    onec_key = getattr(request, "onec_key", None)
+    if onec_key is not None and not onec_key.allows_store(data["store_id"]):
+        logger.warning(
+            "onec_receipt: key %s is not allowed for store %s", onec_key.name, data["store_id"]
+        )
+        return _onec_error(
+            "store_not_allowed",
+            "API key is not allowed to post receipts for this store.",
+            details={"store_id": data["store_id"]},
+            status_code=403,
+        )
 
     idem_key = (
         getattr(request, "headers", {}).get("X-Idempotency-Key")
@@ -196,21 +404,42 @@ def onec_receipt(request):
             "missing_idempotency_key",
             "Header X-Idempotency-Key is required.",
         )
+    return data, idem_key, store_label(data["store_id"], onec_key)
+
 
-    existing_by_idem = False
-    if hasattr(Transaction, "idempotency_key"):
+def _process_receipt(data: dict[str, Any], idem_key: str, store: str) -> HttpResponse:
+    """Apply a validated receipt and record its metrics (see ``api.metrics``)."""
+
+    trace = ReceiptTrace()
+    with db_connection.execute_wrapper(trace.count_query):
         try:
-            existing_by_idem = Transaction.objects.filter(
-                idempotency_key=idem_key
-            ).exists()
-        except DjangoValidationError:
-            return _onec_error(
-                "invalid_idempotency_key",
-                "Header X-Idempotency-Key must be a valid UUID.",
-                details={"idempotency_key": idem_key},
-            )
+            response = _apply_receipt(data, idem_key, trace)
+        except IntegrityError as exc:
+            # Кэш мог отдать id товара, удалённого в другом воркере: перечитываем
+            # каталог и применяем чек заново (транзакция уже откатилась).
+            logger.warning("onec_receipt: retrying receipt %s: %s", data["receipt_guid"], exc)
+            product_id_cache.clear()
+            trace.created = trace.duplicates = 0
+            response = _apply_receipt(data, idem_key, trace)
+    trace.finish(store, len(data["positions"]), response.status_code)
+    return response
+
+
+def _apply_receipt(data: dict[str, Any], idem_key: str, trace: ReceiptTrace) -> HttpResponse:
+    """Idempotency check, customer lookup, bonus allocation, lines and balances."""
+
+    try:
+        existing_by_idem = Receipt.objects.filter(idempotency_key=idem_key).exists()
+    except DjangoValidationError:
+        return _onec_error(
+            "invalid_idempotency_key",
+            "Header X-Idempotency-Key must be a valid UUID.",
+            details={"idempotency_key": idem_key},
+        )
+    trace.lap("idempotency")
     if existing_by_idem:
-        return JsonResponse(
+        trace.duplicates = len(data["positions"])
+        return json_response(
             {"status": "already exists", "created_count": 0, "allocations": []},
             status=200,
         )
@@ -293,6 +522,8 @@ def onec_receipt(request):
         OneCClientMap.objects.update_or_create(
             one_c_guid=one_c_guid, defaults={"user": user}
         )
+    trace.guest = is_guest
+    trace.lap("customer")
 
     totals = data["totals"]
     total_amount = _as_decimal(totals["total_amount"])
@@ -361,6 +592,7 @@ def onec_receipt(request):
     elif pos_without:
         for p in pos_without:
             p["bonus_earned"] = str(D("0"))
+    trace.lap("allocation")
 
     if hasattr(Transaction, "receipt_guid") and hasattr(Transaction, "receipt_line"):
         existing_lines = set(
@@ -375,7 +607,18 @@ def onec_receipt(request):
         for pos in positions
         if pos["line_number"] in existing_lines
     ]
+    trace.lap("dedupe")
     if duplicate_lines:
+        trace.duplicates = len(duplicate_lines)
+        # Повтор дозагрузки (partial delivery): её ключ лежит на первой строке
+        # этой поставки, а не в заголовке чека.
+        if Transaction.objects.filter(
+            receipt_guid=data["receipt_guid"], idempotency_key=idem_key
+        ).exists():
+            return json_response(
+                {"status": "already exists", "created_count": 0, "allocations": []},
+                status=200,
+            )
         logger.info(
             "onec_receipt: duplicate lines for receipt %s: %s",
             data["receipt_guid"],
@@ -396,14 +639,33 @@ def onec_receipt(request):
     first_line = True
     delta_bonus = D("0")
     total_spent_delta = D("0")
+    discount_delta = D("0")
+    bonus_earned_delta = D("0")
+    bonus_spent_delta = D("0")
     purchase_increment = 1 if not existing_lines else 0
     purchased_at_value = dt_in if settings.USE_TZ else dt_naive
 
     try:
         with db_tx.atomic():
+            receipt, receipt_created = Receipt.objects.get_or_create(
+                receipt_guid=data["receipt_guid"],
+                defaults={
+                    "customer": user,
+                    "store_id": data["store_id"],
+                    "purchased_at": purchased_at_value,
+                    "total_amount": total_amount,
+                    "discount_total": discount_total,
+                    "bonus_spent": bonus_spent,
+                    "bonus_earned": bonus_earned,
+                    "idempotency_key": idem_key,
+                },
+            )
+            # Строки одного чека пишутся по очереди: в секционированной таблице
+            # уникальность строки включает purchased_at и повтор с другим временем не отсечёт.
+            receipt = Receipt.objects.select_for_update().get(pk=receipt.pk)
+            product_ids = _resolve_product_ids(positions, data["store_id"])
             for position in positions:
                 code = position["product_code"]
-                name = position.get("name") or "UNKNOWN"
                 qty = _as_decimal(position["quantity"])
                 price = _as_decimal(position["price"])
                 discount_amount = _as_decimal(position.get("discount_amount", 0))
@@ -414,24 +676,10 @@ def onec_receipt(request):
                 pos_bonus_earned = _quantize(_as_decimal(position["bonus_earned"]))
                 pos_bonus_spent = _quantize(bonus_spent * (pos_total / denom))
 
-                product_defaults = {
-                    "name": name,
-                    "price": price,
-                    "is_promotional": is_promotional,
-                }
-                if "category" in position:
-                    product_defaults["category"] = position["category"]
-                if hasattr(Product, "store_id") and "store_id" in data:
-                    product_defaults.setdefault("store_id", data["store_id"])
-
-                product, _ = Product.objects.get_or_create(
-                    product_code=code,
-                    defaults=product_defaults,
-                )
-
                 transaction_defaults = {
+                    "receipt": receipt,
                     "customer": user,
-                    "product": product,
+                    "product_id": product_ids[code],
                     "quantity": qty,
                     "total_amount": pos_total,
                     "bonus_earned": pos_bonus_earned,
@@ -452,13 +700,8 @@ def onec_receipt(request):
                     transaction_defaults["receipt_bonus_earned"] = pos_bonus_earned
                 if hasattr(Transaction, "receipt_bonus_spent"):
                     transaction_defaults["receipt_bonus_spent"] = pos_bonus_spent
-                if first_line:
-                    if hasattr(Transaction, "idempotency_key"):
-                        transaction_defaults["idempotency_key"] = idem_key
-                    if hasattr(Transaction, "receipt_total_amount"):
-                        transaction_defaults["receipt_total_amount"] = total_amount
-                    if hasattr(Transaction, "receipt_discount_total"):
-                        transaction_defaults["receipt_discount_total"] = discount_total
+                if first_line and hasattr(Transaction, "idempotency_key"):
+                    transaction_defaults["idempotency_key"] = idem_key
 
                 try:
                     transaction, created = Transaction.objects.get_or_create(
@@ -474,17 +717,22 @@ def onec_receipt(request):
                 else:
                     if created:
                         created_count += 1
+                        trace.created += 1
                         total_spent_delta += pos_total
+                        discount_delta += _quantize(discount_amount * qty)
+                        bonus_earned_delta += pos_bonus_earned
+                        bonus_spent_delta += pos_bonus_spent
                         delta_bonus += pos_bonus_earned - pos_bonus_spent
                         allocations.append(
                             {
                                 "product_code": code,
-                                "quantity": float(qty),
-                                "total_amount": float(pos_total),
-                                "bonus_earned": float(pos_bonus_earned),
+                                "quantity": qty,
+                                "total_amount": pos_total,
+                                "bonus_earned": pos_bonus_earned,
                             }
                         )
                     else:
+                        trace.duplicates += 1
                         updates: dict[str, Any] = {}
                         if hasattr(Transaction, "receipt_bonus_earned") and getattr(
                             transaction, "receipt_bonus_earned", None
@@ -504,6 +752,25 @@ def onec_receipt(request):
                             Transaction.objects.filter(pk=transaction.pk).update(**updates)
                 finally:
                     first_line = False
+
+            # Если все позиции чека созданы — берём итоги из 1С (источник истины).
+            # Если только часть (partial delivery) — используем суммы по позициям.
+            if created_count == len(positions):
+                total_spent_delta = _quantize(total_amount)
+                discount_delta = discount_total
+                bonus_spent_delta = bonus_spent
+            else:
+                total_spent_delta = _quantize(total_spent_delta)
+            # Заголовок создан первой поставкой, дозагрузка добавляет к нему свои строки
+            if created_count > 0 and not receipt_created:
+                Receipt.objects.filter(pk=receipt.pk).update(
+                    total_amount=Coalesce(F("total_amount"), Value(D("0"))) + total_spent_delta,
+                    discount_total=Coalesce(F("discount_total"), Value(D("0")))
+                    + discount_delta,
+                    bonus_spent=Coalesce(F("bonus_spent"), Value(D("0"))) + bonus_spent_delta,
+                    bonus_earned=Coalesce(F("bonus_earned"), Value(D("0")))
+                    + bonus_earned_delta,
+                )
     except DuplicateReceiptLineError as exc:
         return _onec_error(
             "duplicate_receipt_line",
@@ -513,15 +780,10 @@ def onec_receipt(request):
                 "line_numbers": [exc.line_number],
             },
         )
+    trace.lap("lines")
 
     if created_count > 0 and not is_guest:
         bonus_delta_to_apply = _quantize(delta_bonus)
-        # Если все позиции чека созданы — берём total_amount из 1С (источник истины).
-        # Если только часть (partial delivery) — используем сумму по позициям.
-        if created_count == len(positions):
-            total_spent_delta = _quantize(total_amount)
-        else:
-            total_spent_delta = _quantize(total_spent_delta)
         update_kwargs: dict[str, Any] = {
             "bonuses": Coalesce(F("bonuses"), Value(D("0"))) + bonus_delta_to_apply,
             "last_purchase_date": purchased_at_value,
@@ -537,6 +799,7 @@ def onec_receipt(request):
         user.refresh_from_db(
             fields=["bonuses", "purchase_count", "total_spent", "last_purchase_date"]
         )
+    trace.lap("aggregate")
 
     guid_for_resp = one_c_guid
     if not guid_for_resp:
@@ -551,37 +814,48 @@ def onec_receipt(request):
         "customer": {
             "telegram_id": user.telegram_id,
             "one_c_guid": guid_for_resp,
-            "bonus_balance": float(user.bonuses or D("0")),
-            "total_spent": float(user.total_spent or D("0")),
+            "bonus_balance": user.bonuses or D("0"),
+            "total_spent": user.total_spent or D("0"),
             "purchase_count": user.purchase_count or 0,
             "last_purchase_date": (
                 dt_in if settings.USE_TZ else dt_naive
             ).isoformat(),
         },
         "totals": {
-            "total_amount": float(total_amount),
-            "discount_total": float(discount_total),
-            "bonus_spent": float(bonus_spent),
-            "bonus_earned": float(bonus_earned),
+            "total_amount": total_amount,
+            "discount_total": discount_total,
+            "bonus_spent": bonus_spent,
+            "bonus_earned": bonus_earned,
         },
     }
 
     status_code = 201 if created_count > 0 else 200
-    return JsonResponse(response, status=status_code)
+    reply = json_response(response, status=status_code)
+    trace.lap("respond")
+    return reply
 
 
 @csrf_exempt
 @require_POST
-@require_onec_auth
-def onec_customer_sync(request):
+@require_onec_auth(scope="receipts")
+def onec_receipt(request):
+    parsed = _parse_receipt_request(request)
+    if isinstance(parsed, HttpResponse):
+        receipt_rejected(parsed.status_code)
+        return parsed
+    return _process_receipt(*parsed)
+
+
+def _parse_customer_request(request) -> tuple[dict[str, Any], int | None, str] | HttpResponse:
+    """Decode an ``/onec/customer`` call into ``(data, telegram_id, qr_code)``."""
+
     raw = request.body or b""
     if not raw:
-        return JsonResponse({"detail": "empty_body"}, status=400)
+        return json_response({"detail": "empty_body"}, status=400)
     try:
-        payload_str = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
-        data = json.loads(payload_str)
-    except json.JSONDecodeError:
-        return JsonResponse({"detail": "invalid_json"}, status=400)
+        data = codec.loads(raw)
+    except codec.JSONDecodeError:
+        return json_response({"detail": "invalid_json"}, status=400)
 
     telegram_raw = data.get("telegram_id")
     qr_code = str(data.get("qr_code") or "").strip()
@@ -593,70 +867,83 @@ def onec_customer_sync(request):
         try:
             telegram_id = int(telegram_raw)
         except (TypeError, ValueError):
-            return JsonResponse({"detail": {"telegram_id": ["Неверное значение"]}}, status=400)
+            return json_response({"detail": {"telegram_id": ["Неверное значение"]}}, status=400)
 
     if telegram_id is None and not qr_code:
-        return JsonResponse(
+        return json_response(
             {"detail": {"telegram_id": ["Нужно указать telegram_id или qr_code."]}},
             status=400,
         )
+    return data, telegram_id, qr_code
 
-    user: CustomUser | None = None
-    if qr_code:
-        user = CustomUser.objects.filter(qr_code=qr_code).first()
-        if not user:
-            return JsonResponse(
-                {"detail": {"qr_code": ["Пользователь не найден"]}},
-                status=404,
-            )
 
+def _match_customer(
+    telegram_id: int | None,
+    qr_code: str,
+    by_qr: CustomUser | None,
+    by_telegram_id: CustomUser | None,
+) -> CustomUser | HttpResponse:
+    """Pick the customer from the QR and telegram_id lookups, or explain the mismatch."""
+
+    if qr_code and not by_qr:
+        return json_response({"detail": {"qr_code": ["Пользователь не найден"]}}, status=404)
+
+    user = by_qr
     if telegram_id is not None:
-        if user and user.telegram_id != telegram_id:
-            return JsonResponse(
+        if by_qr and by_qr.telegram_id != telegram_id:
+            return json_response(
                 {"detail": {"telegram_id": ["Не совпадает с QR-кодом"]}},
                 status=400,
             )
-
-        user_by_tid = CustomUser.objects.filter(telegram_id=telegram_id).first()
-        if not user_by_tid:
-            return JsonResponse(
+        if not by_telegram_id:
+            return json_response(
                 {"detail": {"telegram_id": ["Пользователь не найден"]}},
                 status=404,
             )
-        if user and user_by_tid.id != user.id:
-            return JsonResponse(
+        if by_qr and by_telegram_id.id != by_qr.id:
+            return json_response(
                 {"detail": {"telegram_id": ["Не совпадает с QR-кодом"]}},
                 status=400,
             )
-        user = user or user_by_tid
+        user = by_qr or by_telegram_id
 
     if not user:
-        return JsonResponse(
-            {"detail": {"qr_code": ["Пользователь не найден"]}},
-            status=404,
-        )
+        return json_response({"detail": {"qr_code": ["Пользователь не найден"]}}, status=404)
+    return user
 
-    if telegram_id is not None and user.telegram_id != telegram_id:
-        return JsonResponse(
-            {"detail": {"telegram_id": ["Не совпадает с QR-кодом"]}},
-            status=400,
-        )
 
-    if telegram_id is None:
-        telegram_id = user.telegram_id
+def _customer_write_mode(data: dict[str, Any]) -> bool:
+    """Whether the call updates the customer; otherwise it is a read-only lookup."""
+
+    return any(
+        [
+            data.get("bonus_balance") is not None,
+            data.get("referrer_telegram_id"),
+            data.get("one_c_guid"),
+        ]
+    )
+
+
+def _prepare_customer_update(
+    data: dict[str, Any], user: CustomUser
+) -> dict[str, Any] | HttpResponse:
+    """Validate the writable part of the payload and apply plain fields to ``user``.
+
+    Returns what is left for the database: the 1C GUID, the referrer to look
+    up and whether the user must be saved.
+    """
 
     one_c_guid = str(data.get("one_c_guid") or "")
     bonus_balance = data.get("bonus_balance")
     referrer_tid = data.get("referrer_telegram_id")
-
-    write_mode = any([bonus_balance is not None, referrer_tid, one_c_guid])
+    write_mode = _customer_write_mode(data)
 
     raw_dt = data.get("created_at") or data.get("registration_date")
     if raw_dt:
         try:
             dt = datetime.fromisoformat(str(raw_dt).replace("Z", "+00:00"))
         except ValueError:
-            return JsonResponse({"detail": {"created_at": ["Неверный формат datetime"]}}, status=400)
+            return json_response({"detail": {"created_at": ["Неверный формат datetime"]}}, status=400)
         if dj_tz.is_naive(dt):
             dt_aware = dj_tz.make_aware(dt, timezone=timezone.utc)
         else:
@@ -669,7 +956,7 @@ def onec_customer_sync(request):
         try:
             new_balance = _as_decimal(bonus_balance)
         except Exception:
-            return JsonResponse({"detail": {"bonus_balance": ["Неверное число"]}}, status=400)
+            return json_response({"detail": {"bonus_balance": ["Неверное число"]}}, status=400)
         current = user.bonuses or D("0")
         if current != new_balance:
             logger.info(
@@ -682,42 +969,31 @@ def onec_customer_sync(request):
             )
         user.bonuses = new_balance
 
+    ref_tid = None
     if referrer_tid:
         try:
             ref_tid = int(referrer_tid)
         except (TypeError, ValueError):
             ref_tid = None
-        if ref_tid and ref_tid != telegram_id and not getattr(user, "referrer", None):
-            ref_user = CustomUser.objects.filter(telegram_id=ref_tid).first()
-            if ref_user:
-                user.referrer = ref_user
+        if ref_tid == user.telegram_id or user.referrer is not None:
+            ref_tid = None
 
     if hasattr(user, "created_at") and not user.created_at:
         user.created_at = dt_aware if settings.USE_TZ else dt_naive
 
-    if write_mode:
-        user.save()
+    return {"one_c_guid": one_c_guid, "referrer_telegram_id": ref_tid, "write_mode": write_mode}
 
-    if one_c_guid:
-        OneCClientMap.objects.update_or_create(
-            one_c_guid=one_c_guid,
-            defaults={"user": user},
-        )
-
-    mapping = OneCClientMap.objects.filter(user=user).first()
-    guid_for_resp = getattr(mapping, "one_c_guid", None) or (one_c_guid or None)
 
-    return JsonResponse(
+def _customer_response(user: CustomUser, guid: str | None, write_mode: bool) -> HttpResponse:
+    return json_response(
         {
             "status": "ok" if write_mode else "lookup",
             "customer": {
                 "telegram_id": user.telegram_id,
-                "one_c_guid": guid_for_resp,
+                "one_c_guid": guid,
                 "qr_code": user.qr_code,
-                "bonus_balance": float(user.bonuses or 0),
-                "referrer_telegram_id": getattr(
-                    getattr(user, "referrer", None), "telegram_id", None
-                ),
+                "bonus_balance": user.bonuses or D("0"),
+                "referrer_telegram_id": getattr(user.referrer, "telegram_id", None),
             },
         }
     )
@@ -725,44 +1001,417 @@ def onec_customer_sync(request):
 
 @csrf_exempt
 @require_POST
-@require_onec_auth
-def onec_product_sync(request):
-    raw_body = request.body or b"{}"
-    if isinstance(raw_body, (bytes, bytearray)):
-        raw_body = raw_body.decode("utf-8")
+@require_onec_auth(scope="customers")
+def onec_customer_sync(request):
+    parsed = _parse_customer_request(request)
+    if isinstance(parsed, HttpResponse):
+        return parsed
+    data, telegram_id, qr_code = parsed
+
+    # Поиск без изменений читает с реплики, если она настроена
+    with nullcontext() if _customer_write_mode(data) else read_from_replica():
+        return _sync_customer(data, telegram_id, qr_code)
+
+
+def _sync_customer(data: dict[str, Any], telegram_id: int | None, qr_code: str) -> HttpResponse:
+    customers = CustomUser.objects.select_related("referrer")
+    user = _match_customer(
+        telegram_id,
+        qr_code,
+        customers.filter(qr_code=qr_code).first() if qr_code else None,
+        customers.filter(telegram_id=telegram_id).first() if telegram_id is not None else None,
+    )
+    if isinstance(user, HttpResponse):
+        return user
+
+    update = _prepare_customer_update(data, user)
+    if isinstance(update, HttpResponse):
+        return update
+
+    if update["referrer_telegram_id"]:
+        ref_user = CustomUser.objects.filter(telegram_id=update["referrer_telegram_id"]).first()
+        if ref_user:
+            user.referrer = ref_user
+
+    if update["write_mode"]:
+        user.save()
+
+    one_c_guid = update["one_c_guid"]
+    if one_c_guid:
+        OneCClientMap.objects.update_or_create(
+            one_c_guid=one_c_guid,
+            defaults={"user": user},
+        )
+
+    mapping = OneCClientMap.objects.filter(user=user).first()
+    guid_for_resp = getattr(mapping, "one_c_guid", None) or (one_c_guid or None)
+    return _customer_response(user, guid_for_resp, update["write_mode"])
+
+
+def _apply_product_update(data: dict[str, Any]) -> str:
+    """Last-writer-wins upsert of one product, ordered by ``updated_at``.
+
+    The conditional UPDATE only touches the row when the incoming version is
+    newer, so identical re-syncs and late (out-of-order) deliveries cost no
+    write. Returns ``created``, ``updated`` or ``unchanged``.
+    """
+
+    code = data["product_code"]
+    fields = {field: data.get(field) for field in PRODUCT_SYNC_FIELDS}
+    is_newer = Q(updated_at__isnull=True) | Q(updated_at__lt=data["updated_at"])
+
+    with db_tx.atomic():
+        if Product.objects.filter(is_newer, product_code=code).update(**fields):
+            return "updated"
+        if Product.objects.filter(product_code=code).exists():
+            return "unchanged"
+        try:
+            with db_tx.atomic():
+                Product.objects.create(product_code=code, store_id=0, **fields)
+        except IntegrityError:
+            # Товар мог быть создан параллельным запросом — повторяем условный UPDATE.
+            if not Product.objects.filter(product_code=code).exists():
+                raise
+            if Product.objects.filter(is_newer, product_code=code).update(**fields):
+                return "updated"
+            return "unchanged"
+    return "created"
+
+
+def _parse_product_request(request) -> dict[str, Any] | HttpResponse:
     try:
-        payload = json.loads(raw_body)
-    except json.JSONDecodeError:
-        return JsonResponse({"detail": "invalid_json"}, status=400)
+        payload = codec.loads(request.body or b"{}")
+    except codec.JSONDecodeError:
+        return json_response({"detail": "invalid_json"}, status=400)
 
     serializer = ProductUpdateSerializer(data=payload)
     if not serializer.is_valid():
-        return JsonResponse({"detail": serializer.errors}, status=400)
-    data = serializer.validated_data
-
-    defaults = {
-        "one_c_guid": data.get("one_c_guid"),
-        "name": data["name"],
-        "price": data["price"],
-        "category": data["category"],
-        "is_promotional": data["is_promotional"],
-    }
-    if hasattr(Product, "store_id"):
-        defaults.setdefault("store_id", 0)
+        return json_response({"detail": serializer.errors}, status=400)
+    return serializer.validated_data
 
-    product, created = Product.objects.update_or_create(
-        product_code=data["product_code"], defaults=defaults
-    )
 
+def _product_response(product: Product, sync_status: str) -> HttpResponse:
     resp = {
-        "status": "created" if created else "updated",
+        "status": sync_status,
         "product": {
             "product_code": product.product_code,
             "one_c_guid": product.one_c_guid,
             "name": product.name,
-            "price": float(product.price),
+            "price": product.price,
             "category": product.category,
             "is_promotional": product.is_promotional,
+            "updated_at": product.updated_at.isoformat() if product.updated_at else None,
         },
     }
-    return JsonResponse(resp, status=201 if created else 200)
+    return json_response(resp, status=201 if sync_status == "created" else 200)
+
+
+@csrf_exempt
+@require_POST
+@require_onec_auth(scope="products")
+def onec_product_sync(request):
+    data = _parse_product_request(request)
+    if isinstance(data, HttpResponse):
+        return data
+
+    sync_status = _apply_product_update(data)
+    product = Product.objects.get(product_code=data["product_code"])
+    return _product_response(product, sync_status)
+
+
+def _iter_product_batch(request):
+    """Yield ``(item, error)`` pairs from a JSON array or an NDJSON stream.
+
+    NDJSON is read line by line straight from the request stream, so memory
+    stays bounded by the chunk size rather than by the upload size.
+    """
+
+    if (request.content_type or "").lower() in NDJSON_CONTENT_TYPES:
+        for raw_line in request:
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                yield codec.loads(line), None
+            except codec.JSONDecodeError as exc:
+                yield None, str(exc)
+        return
+
+    payload = codec.loads(request.read())
+    if not isinstance(payload, list):
+        raise ValueError("JSON body must be an array of products")
+    for item in payload:
+        yield item, None
+
+
+def _existing_product_codes(codes: list[str]) -> set[str]:
+    return set(Product.objects.filter(product_code__in=codes).values_list("product_code", flat=True))
+
+
+def _upsert_newer_products(rows: list[dict[str, Any]]) -> set[str]:
+    """Insert or update products in one statement; return the codes written.
+
+    ``ON CONFLICT … DO UPDATE … WHERE`` compares ``updated_at`` inside the
+    write itself, so an older row never overwrites a newer one, even when a
+    single-product sync commits between our read and this statement.
+    """
+
+    qn = db_connection.ops.quote_name
+    table = qn(Product._meta.db_table)
+    fields = [Product._meta.get_field(name) for name in ("product_code", "store_id", *PRODUCT_SYNC_FIELDS)]
+    params: list[Any] = []
+    for data in rows:
+        values = {"product_code": data["product_code"], "store_id": 0}
+        values.update((name, data.get(name)) for name in PRODUCT_SYNC_FIELDS)
+        params.extend(field.get_db_prep_save(values[field.name], db_connection) for field in fields)
+
+    columns = [qn(field.column) for field in fields]
+    row_sql = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    updated_at = qn(Product._meta.get_field("updated_at").column)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(rows))} "
+        f"ON CONFLICT ({columns[0]}) DO UPDATE SET "
+        + ", ".join(f"{column} = EXCLUDED.{column}" for column in columns[2:])
+        + f" WHERE {table}.{updated_at} IS NULL OR {table}.{updated_at} < EXCLUDED.{updated_at}"
+        f" RETURNING {columns[0]}"
+    )
+    with db_connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _upsert_product_chunk(chunk: list[tuple[int, dict[str, Any]]], results: dict[int, dict[str, Any]]):
+    latest: dict[str, tuple[int, dict[str, Any]]] = {}
+    for index, data in chunk:
+        code = data["product_code"]
+        previous = latest.get(code)
+        if previous is None:
+            latest[code] = (index, data)
+            continue
+        older, newer = sorted((previous, (index, data)), key=lambda item: item[1]["updated_at"])
+        results[older[0]] = {"product_code": code, "status": "superseded"}
+        latest[code] = newer
+
+    # Только для статуса created/updated; решение о записи принимает сам UPSERT.
+    existing = _existing_product_codes(list(latest))
+    pending = list(latest.values())
+
+    try:
+        with db_tx.atomic():
+            written = _upsert_newer_products([data for _, data in pending])
+    except IntegrityError as exc:
+        # Например, one_c_guid уже занят другим товаром — разбираем чанк поштучно.
+        logger.warning("onec_product_batch_sync: chunk conflict, retrying per item: %s", exc)
+        for index, data in pending:
+            try:
+                sync_status = _apply_product_update(data)
+            except IntegrityError as item_exc:
+                results[index] = {
+                    "product_code": data["product_code"],
+                    "status": "error",
+                    "details": str(item_exc),
+                }
+                continue
+            results[index] = {"product_code": data["product_code"], "status": sync_status}
+        return
+
+    for code, (index, _data) in latest.items():
+        if code not in written:
+            sync_status = "unchanged"
+        else:
+            sync_status = "updated" if code in existing else "created"
+        results[index] = {"product_code": code, "status": sync_status}
+
+
+@csrf_exempt
+@require_POST
+@require_onec_auth(scope="products")
+def onec_product_batch_sync(request):
+    """Upsert a price list sent as a JSON array or NDJSON, in chunks."""
+
+    results: dict[int, dict[str, Any]] = {}
+    chunk: list[tuple[int, dict[str, Any]]] = []
+    total = 0
+
+    try:
+        for index, (item, parse_error) in enumerate(_iter_product_batch(request)):
+            total += 1
+            if parse_error is not None:
+                results[index] = {"status": "invalid", "details": {"error": parse_error}}
+                continue
+            serializer = ProductUpdateSerializer(data=item if isinstance(item, dict) else {})
+            if not serializer.is_valid():
+                results[index] = {
+                    "product_code": item.get("product_code") if isinstance(item, dict) else None,
+                    "status": "invalid",
+                    "details": serializer.errors,
+                }
+                continue
+            chunk.append((index, serializer.validated_data))
+            if len(chunk) >= PRODUCT_BATCH_CHUNK_SIZE:
+                _upsert_product_chunk(chunk, results)
+                chunk = []
+        if chunk:
+            _upsert_product_chunk(chunk, results)
+    except (codec.JSONDecodeError, UnicodeDecodeError):
+        return json_response({"detail": "invalid_json"}, status=400)
+    except ValueError as exc:
+        return json_response({"detail": str(exc)}, status=400)
+
+    items = [{"index": index, **results[index]} for index in sorted(results)]
+    summary = Counter(item["status"] for item in items)
+    return json_response(
+        {
+            "status": "ok",
+            "processed": total,
+            "summary": dict(summary),
+            "items": items,
+        }
+    )
+
+
+def _parse_export_filters(params) -> dict[str, Any]:
+    """Translate query parameters into ``Transaction`` filters; raises ValueError.
+
+    Dates filter on ``purchased_at``, the partition key, so PostgreSQL scans
+    only the months in range. Day bounds are in the server's time zone.
+    """
+
+    filters: dict[str, Any] = {}
+    for param, lookup, days in (("date_from", "purchased_at__gte", 0), ("date_to", "purchased_at__lt", 1)):
+        raw = params.get(param)
+        if raw:
+            try:
+                day = date.fromisoformat(raw)
+            except ValueError:
+                raise ValueError(f"{param} must be YYYY-MM-DD") from None
+            bound = datetime.combine(day + timedelta(days=days), datetime.min.time())
+            filters[lookup] = dj_tz.make_aware(bound) if settings.USE_TZ else bound
+    for param, lookup in (("store_id", "store_id"), ("telegram_id", "customer__telegram_id")):
+        raw = params.get(param)
+        if raw:
+            try:
+                filters[lookup] = int(raw)
+            except ValueError:
+                raise ValueError(f"{param} must be an integer") from None
+    return filters
+
+
+def _export_page(filters: dict[str, Any], last_id: int, page_size: int) -> list[tuple]:
+    """Return one keyset page of export rows after ``last_id``."""
+
+    return list(
+        Transaction.objects.filter(id__gt=last_id, **filters)
+        .order_by("id")
+        .values_list(*EXPORT_FIELDS)[:page_size]
+    )
+
+
+def _iter_export_rows(filters: dict[str, Any], after_id: int, limit: int | None):
+    """Yield export rows in ``id`` order, one keyset page at a time.
+
+    Every page is a fresh ``WHERE id > last_id ORDER BY id LIMIT n`` query read
+    through a server-side cursor, so memory stays flat and no query has to skip
+    over rows already sent.
+    """
+
+    remaining = limit
+    last_id = after_id
+    while remaining is None or remaining > 0:
+        page_size = EXPORT_PAGE_SIZE if remaining is None else min(EXPORT_PAGE_SIZE, remaining)
+        rows = (
+            Transaction.objects.filter(id__gt=last_id, **filters)
+            .order_by("id")
+            .values_list(*EXPORT_FIELDS)[:page_size]
+            .iterator(chunk_size=1000)
+        )
+        count = 0
+        for row in rows:
+            count += 1
+            last_id = row[0]
+            yield row
+        if remaining is not None:
+            remaining -= count
+        if count < page_size:
+            return
+
+
+class _Echo:
+    """File-like object for ``csv.writer`` that hands each line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _ndjson_line(row) -> bytes:
+    return codec.dumps(dict(zip(EXPORT_COLUMNS, row)), decimal_as_string=True) + b"\n"
+
+
+def _csv_line(writer, row) -> str:
+    return writer.writerow(["" if value is None else value for value in row])
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield _ndjson_line(row)
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield _csv_line(writer, row)
+
+
+def _parse_export_request(request) -> tuple[str, dict[str, Any], int, int | None] | HttpResponse:
+    """Decode an export call into ``(format, filters, after_id, limit)``."""
+
+    export_format = request.GET.get("format", "ndjson").lower()
+    if export_format not in {"ndjson", "csv"}:
+        return _onec_error("invalid_format", "format must be ndjson or csv")
+    try:
+        filters = _parse_export_filters(request.GET)
+        after_id = int(request.GET.get("after_id") or 0)
+        limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+    except ValueError as exc:
+        return _onec_error("invalid_filter", str(exc))
+    if limit is not None and limit < 1:
+        return _onec_error("invalid_filter", "limit must be positive")
+
+    # Ключ магазина видит только свои продажи
+    store_id = getattr(request, "onec_store_id", None)
+    if store_id is not None:
+        if filters.setdefault("store_id", store_id) != store_id:
+            return _onec_error(
+                "store_not_allowed",
+                "API key is not allowed to export this store.",
+                details={"store_id": filters["store_id"]},
+                status_code=403,
+            )
+    return export_format, filters, after_id, limit
+
+
+def _export_response(lines, export_format: str) -> StreamingHttpResponse:
+    if export_format == "csv":
+        response = StreamingHttpResponse(lines, content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="transactions.csv"'
+    else:
+        response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@csrf_exempt
+@require_GET
+@require_onec_auth(scope="export")
+def onec_export_transactions(request):
+    """Stream transactions as NDJSON (default) or CSV in constant memory."""
+
+    parsed = _parse_export_request(request)
+    if isinstance(parsed, HttpResponse):
+        return parsed
+    export_format, filters, after_id, limit = parsed
+
+    rows = _iter_export_rows(filters, after_id, limit)
+    lines = _csv_lines(rows) if export_format == "csv" else _ndjson_lines(rows)
+    return _export_response(lines, export_format)
@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.backend.settings')
 
@@ -10,9 +11,21 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_shutdown.connect
+def drop_pushed_metrics(**kwargs):
+    # Группа остановленного процесса иначе навсегда осталась бы в Pushgateway
+    from src.metrics import delete_pushed_metrics
+
+    delete_pushed_metrics()
+
+
 app.conf.beat_schedule = {
     'send-birthday-congratulations-every-day': {
         'task': 'api.tasks.send_birthday_congratulations',
         'schedule': crontab(hour=9, minute=0),
     },
+    'ensure-transaction-partitions-every-day': {
+        'task': 'main.tasks.ensure_transaction_partitions',
+        'schedule': crontab(hour=3, minute=30),
+    },
 }
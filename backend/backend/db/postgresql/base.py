@@ -0,0 +1,82 @@
+"""PostgreSQL backend: django_prometheus query metrics plus psycopg3 pool metrics.
+
+django_prometheus wraps ``cursor_factory`` each time Django opens a
+connection. With ``OPTIONS["pool"]`` opening is only a checkout of a
+connection the pool already holds, so the wrapper would nest once per
+request. Here the wrapper is applied once, when the pool creates the
+connection. Each checkout is timed into ``django_db_pool_checkout_seconds``,
+and pool state is read from ``ConnectionPool.get_stats()`` at scrape time.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.db.backends.postgresql import base as postgresql_base
+from django_prometheus.db.backends.common import get_postgres_cursor_class
+from django_prometheus.db.backends.postgresql import base as prometheus_base
+from django_prometheus.db.common import ExportingCursorWrapper
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "django_db_pool_checkout_seconds",
+    "Time to get a connection from the psycopg pool, including waiting for a free one",
+    ["alias"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class PoolCollector:
+    """Expose ``get_stats()`` of every pool opened in this process."""
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "django_db_pool_connections",
+            "Connections held by the pool: open in total and idle",
+            labels=["alias", "state"],
+        )
+        max_size = GaugeMetricFamily(
+            "django_db_pool_max_connections", "Pool max_size", labels=["alias"]
+        )
+        waiting = GaugeMetricFamily(
+            "django_db_pool_waiting_requests",
+            "Checkouts currently waiting for a connection",
+            labels=["alias"],
+        )
+        errors = CounterMetricFamily(
+            "django_db_pool_checkout_errors",
+            "Checkouts that failed, usually on DJANGO_DB_POOL_TIMEOUT",
+            labels=["alias"],
+        )
+        for alias, pool in list(postgresql_base.DatabaseWrapper._connection_pools.items()):
+            stats = pool.get_stats()
+            connections.add_metric([alias, "open"], stats.get("pool_size", 0))
+            connections.add_metric([alias, "idle"], stats.get("pool_available", 0))
+            max_size.add_metric([alias], stats.get("pool_max", 0))
+            waiting.add_metric([alias], stats.get("requests_waiting", 0))
+            errors.add_metric([alias], stats.get("requests_errors", 0))
+        yield from (connections, max_size, waiting, errors)
+
+
+REGISTRY.register(PoolCollector())
+
+
+class DatabaseWrapper(prometheus_base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        if not self.pool:
+            return super().get_new_connection(conn_params)
+        started = time.perf_counter()
+        try:
+            # Минуя django_prometheus: курсор оборачивается в _configure_connection
+            return postgresql_base.DatabaseWrapper.get_new_connection(self, conn_params)
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.alias).observe(time.perf_counter() - started)
+
+    def _configure_connection(self, connection):
+        commit = super()._configure_connection(connection)
+        if self.pool:
+            # Вызывается пулом один раз на новое физическое соединение
+            cursor_class = connection.cursor_factory or get_postgres_cursor_class()
+            connection.cursor_factory = ExportingCursorWrapper(cursor_class, self.alias, self.vendor)
+        return commit
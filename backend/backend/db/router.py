@@ -0,0 +1,220 @@
+"""Route read-only work to the optional ``replica`` database.
+
+Reads go to the primary unless code opts in with ``read_from_replica()``,
+which works as a context manager and as a decorator. Inside such a block:
+
+* any ORM write pins later reads to the primary, so code reads its own
+  writes. With ``ReplicaRoutingMiddleware`` the pin lasts for the rest of
+  the request. ``pin_primary()`` sets it explicitly, and ``use_primary()``
+  forces the primary for a nested block;
+* the replica is skipped while its replay lag exceeds
+  ``settings.DB_REPLICA_MAX_LAG`` seconds or cannot be measured. The lag is
+  checked at most every ``DB_REPLICA_LAG_CHECK_INTERVAL`` seconds per
+  process and exported as ``django_db_replica_lag_seconds``.
+
+Without a ``replica`` entry in ``settings.DATABASES`` everything goes to
+``default``. The routing state lives in a ContextVar, so under ASGI it
+follows the request into ``sync_to_async`` threads.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+REPLICA = "replica"
+
+REPLICA_LAG_SECONDS = Gauge(
+    "django_db_replica_lag_seconds",
+    "Replay lag of the read replica at the last check; -1 if it could not be measured",
+)
+
+# На первичном сервере обе функции LSN возвращают NULL, и задержка считается нулевой
+_LAG_SQL = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+@dataclass
+class _Route:
+    replica: bool = False
+    pinned: bool = False
+
+
+_route: ContextVar[_Route | None] = ContextVar("db_route", default=None)
+
+
+@contextmanager
+def _routing(replica: bool):
+    route = _route.get()
+    token = None
+    if route is None:
+        route = _Route()
+        token = _route.set(route)
+    previous = route.replica
+    route.replica = replica
+    try:
+        yield
+    finally:
+        route.replica = previous
+        if token is not None:
+            _route.reset(token)
+
+
+def read_from_replica():
+    """Let reads in this block use the replica (unless pinned or lagging)."""
+
+    return _routing(True)
+
+
+def use_primary():
+    """Force reads in this block to the primary."""
+
+    return _routing(False)
+
+
+def pin_primary():
+    """Send every later read of the current block or request to the primary."""
+
+    route = _route.get()
+    if route is not None:
+        route.pinned = True
+
+
+def read_from_replica_unless(option: str):
+    """Decorate ``Command.handle``: run on the replica unless ``option`` (e.g. ``apply``) is set."""
+
+    def decorator(handle):
+        @wraps(handle)
+        def wrapper(self, *args, **options):
+            if options.get(option):
+                return handle(self, *args, **options)
+            with read_from_replica():
+                return handle(self, *args, **options)
+
+        return wrapper
+
+    return decorator
+
+
+class ReplicaLagGuard:
+    def __init__(self):
+        self._checked_at: float | None = None
+        self._ok = False
+        self._lock = threading.Lock()
+
+    def _measure(self) -> bool:
+        try:
+            with connections[REPLICA].cursor() as cursor:
+                cursor.execute(_LAG_SQL)
+                lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError as exc:
+            logger.warning("Replica lag check failed, reading from primary: %s", exc)
+            REPLICA_LAG_SECONDS.set(-1)
+            return False
+        REPLICA_LAG_SECONDS.set(lag)
+        max_lag = getattr(settings, "DB_REPLICA_MAX_LAG", 10)
+        if lag > max_lag:
+            logger.warning("Replica is %.1fs behind (max %ss), reading from primary", lag, max_lag)
+            return False
+        return True
+
+    def ok(self) -> bool:
+        interval = getattr(settings, "DB_REPLICA_LAG_CHECK_INTERVAL", 5)
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at >= interval:
+            with self._lock:
+                checked_at = self._checked_at
+                if checked_at is None or time.monotonic() - checked_at >= interval:
+                    self._ok = self._measure()
+                    self._checked_at = time.monotonic()
+        return self._ok
+
+    def reset(self):
+        with self._lock:
+            self._checked_at = None
+
+
+replica_lag_guard = ReplicaLagGuard()
+
+
+def _replica_configured() -> bool:
+    return REPLICA in connections.settings
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or not route.replica or route.pinned or not _replica_configured():
+            return None
+        return REPLICA if replica_lag_guard.ok() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        # Явно: иначе объект, прочитанный с реплики, сохранялся бы туда же
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA else None
+
+
+class ReplicaRoutingMiddleware:
+    """Give each request its own routing state, so a write pins the whole request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _route.set(_Route())
+        try:
+            return self.get_response(request)
+        finally:
+            _route.reset(token)
+
+    async def __acall__(self, request):
+        token = _route.set(_Route())
+        try:
+            return await self.get_response(request)
+        finally:
+            _route.reset(token)
+
+
+__all__ = [
+    "REPLICA",
+    "ReplicaLagGuard",
+    "ReplicaRouter",
+    "ReplicaRoutingMiddleware",
+    "pin_primary",
+    "read_from_replica",
+    "read_from_replica_unless",
+    "replica_lag_guard",
+    "use_primary",
+]
@@ -68,6 +68,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django_prometheus.middleware.PrometheusBeforeMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.ratelimit.OnecRateLimitMiddleware',
+    'backend.db.router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -96,15 +98,28 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Сервер приложения: "wsgi" — sync-воркеры gunicorn, "asgi" — gunicorn с uvicorn-воркерами.
+DJANGO_SERVER = os.getenv("DJANGO_SERVER", "wsgi").strip().lower()
+
+# Пул соединений psycopg3 (Django 5.1+): на процесс не больше DJANGO_DB_POOL_MAX_SIZE
+# соединений; бюджет на app, Celery и бота — в README («Database connections»).
+# С пулом постоянные соединения (CONN_MAX_AGE) не используются. Под ASGI их нет и
+# без пула: каждый запрос идёт в своём потоке, и постоянные соединения копились бы.
+DB_POOL_ENABLED = _env_bool("DJANGO_DB_POOL", True)
+if DB_POOL_ENABLED or DJANGO_SERVER == "asgi":
+    DB_CONN_MAX_AGE = 0
+else:
+    DB_CONN_MAX_AGE = _env_int("DJANGO_DB_CONN_MAX_AGE", 60)
+
 DATABASES = {
     "default": {
-        "ENGINE": "django_prometheus.db.backends.postgresql",
+        "ENGINE": "backend.db.postgresql",
         "NAME": os.getenv("POSTGRES_DB"),
         "USER": os.getenv("POSTGRES_USER"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("POSTGRES_HOST"),
         "PORT": os.getenv("POSTGRES_PORT", "5432"),
-        "CONN_MAX_AGE": _env_int("DJANGO_DB_CONN_MAX_AGE", 60),
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
     }
 }
 
@@ -112,9 +127,34 @@ db_options = {}
 ssl_mode = os.getenv("POSTGRES_SSLMODE")
 if ssl_mode:
     db_options["sslmode"] = ssl_mode
+if DB_POOL_ENABLED:
+    db_options["pool"] = {
+        "min_size": _env_int("DJANGO_DB_POOL_MIN_SIZE", 1),
+        "max_size": _env_int("DJANGO_DB_POOL_MAX_SIZE", 4),
+        # Сколько секунд ждать свободное соединение, прежде чем запрос упадёт
+        "timeout": _env_int("DJANGO_DB_POOL_TIMEOUT", 10),
+        # Простаивающие сверх min_size соединения закрываются через max_idle секунд
+        "max_idle": _env_int("DJANGO_DB_POOL_MAX_IDLE", 300),
+    }
 if db_options:
     DATABASES["default"]["OPTIONS"] = db_options
 
+# Реплика только для чтения (опционально): админка, dry-run команд, поиск клиентов
+# в /onec/customer. Чтение идёт туда только внутри read_from_replica() (backend/db/router.py).
+POSTGRES_REPLICA_HOST = os.getenv("POSTGRES_REPLICA_HOST")
+if POSTGRES_REPLICA_HOST:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": POSTGRES_REPLICA_HOST,
+        "PORT": os.getenv("POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "OPTIONS": dict(db_options),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["backend.db.router.ReplicaRouter"]
+# При отставании реплики больше DB_REPLICA_MAX_LAG секунд чтение уходит на primary
+DB_REPLICA_MAX_LAG = _env_int("DB_REPLICA_MAX_LAG", 10)
+DB_REPLICA_LAG_CHECK_INTERVAL = _env_int("DB_REPLICA_LAG_CHECK_INTERVAL", 5)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -164,9 +204,61 @@ TELEGRAM_BOT_TOKEN = os.getenv("BOT_TOKEN")
 
 GUEST_TELEGRAM_ID = _env_int("GUEST_TELEGRAM_ID", 0)
 
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        }
+    }
+
+# Ключи интеграции (api/keys.py): хранятся как HMAC с этим секретом.
+# Смена секрета делает недействительными все выпущенные ключи.
+INTEGRATION_KEY_PEPPER = os.getenv("INTEGRATION_KEY_PEPPER") or SECRET_KEY
+# Как часто воркер перечитывает ключи из БД; отзыв ключа доходит за это время
+INTEGRATION_KEY_CACHE_TTL = _env_int("INTEGRATION_KEY_CACHE_TTL", 60)
+
+# Ограничение частоты запросов к /onec/* (api/ratelimit.py).
+# rate — запросов в секунду, burst — запас бакета. reserve — доля общего
+# бюджета, которую эндпоинт занять не может: при перегрузке он отбрасывается
+# раньше. У чеков reserve 0 — их отбрасываем последними.
+ONEC_RATE_LIMIT_ENABLED = _env_bool("ONEC_RATE_LIMIT_ENABLED", True)
+ONEC_RATE_LIMIT_REDIS_URL = os.getenv("ONEC_RATE_LIMIT_REDIS_URL") or REDIS_CACHE_URL
+ONEC_RATE_LIMITS = {
+    "receipt": {"rate": 10, "burst": 30, "reserve": 0.0},
+    "customer": {"rate": 5, "burst": 20, "reserve": 0.2},
+    "product": {"rate": 5, "burst": 20, "reserve": 0.4},
+    "export": {"rate": 0.2, "burst": 2, "reserve": 0.6},
+    "default": {"rate": 5, "burst": 10, "reserve": 0.4},
+}
+ONEC_RATE_LIMIT_GLOBAL = {
+    "rate": _env_int("ONEC_RATE_LIMIT_GLOBAL_RATE", 30),
+    "burst": _env_int("ONEC_RATE_LIMIT_GLOBAL_BURST", 60),
+}
+
+# Проверка чеков /onec/receipt: "compiled" — быстрый валидатор (api/receipt_schema.py),
+# "drf" — только ReceiptSerializer. Ошибки в обоих режимах формирует DRF.
+ONEC_RECEIPT_VALIDATOR = os.getenv("ONEC_RECEIPT_VALIDATOR", "compiled")
+
+# Магазины, которые получают свою метку store в метриках /onec/receipt (api/metrics.py).
+# Ключи, привязанные к магазину, всегда дают метку своего магазина; остальные — "other".
+ONEC_METRICS_STORES = frozenset(_env_list("ONEC_METRICS_STORES", []))
+
+# При ASGI /healthz/ и горячие /onec/* обслуживают async-версии из api/async_views.py.
+ONEC_ASYNC_VIEWS = _env_bool("ONEC_ASYNC_VIEWS", DJANGO_SERVER == "asgi")
+
+# HTTP-клиент Bot API для /api/send-message/ и Celery-задач (api/telegram.py)
+TELEGRAM_HTTP_POOL_SIZE = _env_int("TELEGRAM_HTTP_POOL_SIZE", 10)
+TELEGRAM_HTTP_TIMEOUT = _env_int("TELEGRAM_HTTP_TIMEOUT", 5)
+# Ставить отправку в очередь Celery и отвечать 202 вместо синхронного вызова
+TELEGRAM_SEND_ASYNC = _env_bool("TELEGRAM_SEND_ASYNC", False)
+
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+# Число процессов воркера входит в бюджет соединений с Postgres (README)
+CELERY_WORKER_CONCURRENCY = _env_int("CELERY_WORKER_CONCURRENCY", 4)
 
 SECURE_SSL_REDIRECT = _env_bool("SECURE_SSL_REDIRECT", not DEBUG)
 SESSION_COOKIE_SECURE = _env_bool("SESSION_COOKIE_SECURE", not DEBUG)
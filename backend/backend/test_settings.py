@@ -12,3 +12,5 @@ DATABASES = {
 USE_TZ = False
 APPEND_SLASH = False
 SECURE_SSL_REDIRECT = False
+ONEC_RATE_LIMIT_ENABLED = False
+ONEC_RATE_LIMIT_REDIS_URL = None
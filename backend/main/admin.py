@@ -3,18 +3,36 @@ import logging
 from django.contrib import admin, messages
 from django.db.models import Count
 
+from backend.db.router import read_from_replica
+
 from .models import (
+    BirthdayGreeting,
     BotActivity,
     BroadcastMessage,
     CustomUser,
     NewsletterDelivery,
     NewsletterOpenEvent,
     Product,
+    Receipt,
     Transaction,
 )
 from .tasks import broadcast_send_task
 
 logger = logging.getLogger(__name__)
+
+
+class ReplicaChangeListMixin:
+    """Списки (GET) читаются с реплики; сохранение и действия идут на primary."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "GET":
+            return super().changelist_view(request, extra_context)
+        with read_from_replica():
+            response = super().changelist_view(request, extra_context)
+            # Запросы списка и date_hierarchy выполняются при рендеринге шаблона
+            if hasattr(response, "render"):
+                response.render()
+        return response
 
 
 class ProductAdmin(admin.ModelAdmin):
@@ -42,7 +60,7 @@ class ReferralInline(admin.TabularInline):
         return False
 
 
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = (
         'full_name',
         'telegram_id',
@@ -71,11 +89,20 @@ class CustomUserAdmin(admin.ModelAdmin):
     get_referrals_count.short_description = 'Кол-во рефералов'
 
 
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('customer', 'total_amount', 'bonus_earned', 'purchase_date', 'store_id')
     list_filter = ('is_promotional', 'store_id')
     search_fields = ('customer__full_name', 'product__name')
-    date_hierarchy = 'purchase_date'
+    date_hierarchy = 'purchased_at'
+
+
+@admin.register(Receipt)
+class ReceiptAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('receipt_guid', 'customer', 'store_id', 'total_amount', 'bonus_earned', 'purchased_at')
+    list_filter = ('store_id',)
+    search_fields = ('receipt_guid', 'customer__telegram_id')
+    raw_id_fields = ('customer',)
+    date_hierarchy = 'purchased_at'
 
 
 @admin.register(BroadcastMessage)
@@ -129,6 +156,14 @@ class NewsletterDeliveryAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+@admin.register(BirthdayGreeting)
+class BirthdayGreetingAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'year', 'sent_at', 'error')
+    list_filter = ('year', 'error')
+    search_fields = ('customer__telegram_id',)
+    raw_id_fields = ('customer',)
+
+
 @admin.register(NewsletterOpenEvent)
 class NewsletterOpenEventAdmin(admin.ModelAdmin):
     list_display = ('id', 'delivery', 'occurred_at', 'telegram_user_id')
@@ -0,0 +1,127 @@
+"""Run the hot lookups through EXPLAIN and flag sequential scans.
+
+Each query below mirrors a lookup done on every request or task run: receipt
+ingestion, customer sync, the birthday task and so on. On PostgreSQL the plans
+come from ``EXPLAIN (ANALYZE, BUFFERS)``. On other backends a plain EXPLAIN is
+used. A sequential scan is reported only when the scanned table holds at least
+``--min-rows`` rows, since the planner rightly prefers seq scans on tiny
+tables. Run it against a seeded or staging database. ``--fail-on-seqscan``
+makes the command exit non-zero, so an index regression fails CI.
+
+Usage:
+    python manage.py audit_query_plans
+    python manage.py audit_query_plans --verbose --min-rows 10000
+    python manage.py audit_query_plans --fail-on-seqscan
+"""
+
+from __future__ import annotations
+
+import re
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.models import OneCClientMap
+from main.models import CustomUser, Product, Receipt, Transaction
+
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING)")
+
+
+def hot_queries():
+    """Return ``(label, queryset)`` pairs for the lookups that must use an index."""
+
+    today = timezone.now().date()
+    since = timezone.now() - timedelta(days=90)
+    return [
+        ("customer_by_telegram_id", CustomUser.objects.filter(telegram_id=1)),
+        ("customer_by_qr_code", CustomUser.objects.filter(qr_code="/media/qr_codes/user_1.png")),
+        (
+            "birthday_customers",
+            CustomUser.objects.filter(birth_date__month=today.month, birth_date__day=today.day),
+        ),
+        ("onec_map_by_user", OneCClientMap.objects.filter(user_id=1)),
+        ("product_by_code", Product.objects.filter(product_code="SKU-1")),
+        ("receipt_by_idempotency_key", Receipt.objects.filter(idempotency_key=uuid.UUID(int=1))),
+        (
+            "receipt_lines",
+            Transaction.objects.filter(receipt_guid="R-1").values_list("receipt_line", flat=True),
+        ),
+        (
+            "customer_history",
+            Transaction.objects.filter(customer_id=1, purchased_at__gte=since).order_by("-purchased_at"),
+        ),
+    ]
+
+
+def _explain(queryset) -> str:
+    if connection.vendor == "postgresql":
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def _scanned_tables(plan: str) -> set[str]:
+    pattern = _PG_SEQ_SCAN if connection.vendor == "postgresql" else _SQLITE_SCAN
+    return set(pattern.findall(plan))
+
+
+def _row_count(table: str) -> int:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            return max(int(row[0]), 0) if row else 0
+        cursor.execute(f'SELECT count(*) FROM "{table}"')
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries and report sequential scans on large tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="Ignore seq scans on tables smaller than this (default 1000)",
+        )
+        parser.add_argument(
+            "--fail-on-seqscan",
+            action="store_true",
+            help="Exit with an error if any seq scan is flagged",
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print full plans",
+        )
+
+    def handle(self, *args, **options):
+        min_rows = options["min_rows"]
+        flagged: list[str] = []
+
+        for label, queryset in hot_queries():
+            plan = _explain(queryset)
+            tables = {t: _row_count(t) for t in _scanned_tables(plan)}
+            large = sorted(t for t, rows in tables.items() if rows >= min_rows)
+            if large:
+                flagged.append(label)
+                self.stdout.write(
+                    self.style.ERROR(f"SEQ SCAN  {label}: {', '.join(large)}")
+                )
+            else:
+                self.stdout.write(f"ok        {label}")
+            if options["verbose"] or large:
+                self.stdout.write(plan)
+                self.stdout.write("")
+
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS("\nNo sequential scans on large tables."))
+            return
+        message = f"Sequential scans in: {', '.join(flagged)}"
+        if options["fail_on_seqscan"]:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(f"\n{message}"))
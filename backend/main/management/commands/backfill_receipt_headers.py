@@ -0,0 +1,114 @@
+"""Create Receipt headers for transactions written before the receipts table.
+
+Receipt-level data used to be spread over line rows: totals and the
+idempotency key on the first line of each delivery, bonuses per line. For
+each receipt_guid that has no header yet, this command aggregates its lines
+once and inserts a Receipt:
+
+* total_amount  — sum of receipt_total_amount over the deliveries, or the
+  sum of line totals when no line has it
+* discount_total — sum of receipt_discount_total over the deliveries
+* bonus_spent / bonus_earned — sums of receipt_bonus_spent / bonus_earned
+* idempotency_key — the key of the first delivery (min receipt_line)
+
+It then links the lines to their header (Transaction.receipt). Re-running is
+safe: receipts that already have a header are skipped.
+
+Usage:
+    python manage.py backfill_receipt_headers         # dry-run
+    python manage.py backfill_receipt_headers --apply  # apply
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from backend.db.router import read_from_replica_unless
+from main.models import Receipt, Transaction
+
+
+class Command(BaseCommand):
+    help = "Create Receipt headers from transaction lines and link the lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Apply changes (default is dry-run)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Headers per INSERT (default 1000)",
+        )
+
+    @read_from_replica_unless("apply")
+    def handle(self, *args, **options):
+        apply = options["apply"]
+        batch_size = max(1, options["batch_size"])
+
+        lines = Transaction.objects.filter(receipt_guid__isnull=False).exclude(receipt_guid="")
+        first_line = Transaction.objects.filter(
+            receipt_guid=OuterRef("receipt_guid")
+        ).order_by("receipt_line")
+
+        receipts = (
+            lines.exclude(receipt_guid__in=Receipt.objects.values("receipt_guid"))
+            .values("receipt_guid")
+            .annotate(
+                total=Coalesce(Sum("receipt_total_amount"), Sum("total_amount")),
+                discount=Sum("receipt_discount_total"),
+                bonus_spent_sum=Sum("receipt_bonus_spent"),
+                bonus_earned_sum=Sum("bonus_earned"),
+                first_key=Subquery(first_line.values("idempotency_key")[:1]),
+                first_customer=Subquery(first_line.values("customer_id")[:1]),
+                first_store=Subquery(first_line.values("store_id")[:1]),
+                first_purchased_at=Subquery(first_line.values("purchased_at")[:1]),
+            )
+            .order_by("receipt_guid")
+        )
+
+        created = 0
+        batch: list[Receipt] = []
+        for row in receipts.iterator(chunk_size=batch_size):
+            created += 1
+            if not apply:
+                continue
+            batch.append(
+                Receipt(
+                    receipt_guid=row["receipt_guid"],
+                    customer_id=row["first_customer"],
+                    store_id=row["first_store"],
+                    purchased_at=row["first_purchased_at"],
+                    total_amount=row["total"],
+                    discount_total=row["discount"],
+                    bonus_spent=row["bonus_spent_sum"],
+                    bonus_earned=row["bonus_earned_sum"],
+                    idempotency_key=row["first_key"],
+                )
+            )
+            if len(batch) >= batch_size:
+                Receipt.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            Receipt.objects.bulk_create(batch, ignore_conflicts=True)
+
+        unlinked = lines.filter(receipt__isnull=True)
+        if apply:
+            header = Receipt.objects.filter(receipt_guid=OuterRef("receipt_guid")).values("pk")[:1]
+            linked = unlinked.update(receipt=Subquery(header))
+        else:
+            linked = unlinked.count()
+
+        self.stdout.write(f"Receipt headers to create: {created}")
+        self.stdout.write(f"Lines to link: {linked}")
+
+        if not apply:
+            self.stdout.write(
+                self.style.WARNING("\nDry-run. Use --apply to update.")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"\nCreated {created} receipts.")
+            )
@@ -11,6 +11,7 @@ Usage:
 from django.core.management.base import BaseCommand
 from django.db.models import Min, Sum
 
+from backend.db.router import read_from_replica_unless
 from main.models import Transaction
 
 
@@ -24,6 +25,7 @@ class Command(BaseCommand):
             help="Apply changes (default is dry-run)",
         )
 
+    @read_from_replica_unless("apply")
     def handle(self, *args, **options):
         apply = options["apply"]
 
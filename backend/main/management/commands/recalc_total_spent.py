@@ -1,7 +1,10 @@
 """Recalculate total_spent and purchase_count for all customers.
 
 total_spent = sum of Transaction.total_amount grouped by customer
-purchase_count = count of distinct receipt_guid per customer
+purchase_count = number of Receipt headers per customer
+
+Receipts written before the receipts table existed need headers first:
+run ``backfill_receipt_headers --apply`` before this command.
 
 Usage:
     python manage.py recalc_total_spent          # dry-run (показывает расхождения)
@@ -11,10 +14,11 @@ Usage:
 from decimal import Decimal as D
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Count, Sum
 
-from main.models import CustomUser, Transaction
+from backend.db.router import read_from_replica_unless
+from main.models import CustomUser, Receipt, Transaction
 
 
 class Command(BaseCommand):
@@ -27,25 +31,39 @@ class Command(BaseCommand):
             help="Apply changes (default is dry-run)",
         )
 
+    @read_from_replica_unless("apply")
     def handle(self, *args, **options):
         apply = options["apply"]
         guest_tid = getattr(settings, "GUEST_TELEGRAM_ID", 0)
 
+        if Transaction.objects.filter(
+            receipt__isnull=True, receipt_guid__isnull=False
+        ).exclude(receipt_guid="").exists():
+            raise CommandError(
+                "Some transactions have no Receipt header; "
+                "run backfill_receipt_headers --apply first."
+            )
+
         # Агрегируем по клиентам из транзакций (без гостя)
-        aggregated = (
+        spent = (
             Transaction.objects.filter(customer__isnull=False)
             .exclude(customer__telegram_id=guest_tid)
             .values("customer_id")
-            .annotate(
-                calc_spent=Sum("total_amount"),
-                calc_count=Count("receipt_guid", distinct=True),
-            )
+            .annotate(calc_spent=Sum("total_amount"))
+        )
+        # Количество покупок считаем по заголовкам чеков, а не по строкам
+        counts = (
+            Receipt.objects.filter(customer__isnull=False)
+            .exclude(customer__telegram_id=guest_tid)
+            .values("customer_id")
+            .annotate(calc_count=Count("id"))
         )
 
-        agg_map = {
-            row["customer_id"]: row
-            for row in aggregated
-        }
+        agg_map: dict[int, dict] = {}
+        for row in spent:
+            agg_map.setdefault(row["customer_id"], {"calc_count": 0})["calc_spent"] = row["calc_spent"]
+        for row in counts:
+            agg_map.setdefault(row["customer_id"], {"calc_spent": D("0")})["calc_count"] = row["calc_count"]
 
         users = CustomUser.objects.exclude(telegram_id=guest_tid)
         fixed = 0
@@ -0,0 +1,168 @@
+"""Normalize customer QR codes in bulk and optionally export PNG images.
+
+The bot renders QR images in memory (see ``src/qr_code.py``), so the database
+value ``CustomUser.qr_code`` is the only per-user state. This command walks the
+whole customer base in keyset pages, rewrites missing or legacy values
+(``qr_<id>.png``, ``/app/media/...``) with batched UPDATEs and, when
+``--export-dir`` is given, renders PNG files (e.g. for printed loyalty cards)
+in a process pool. The directory is listed once with ``os.scandir``; files that
+already exist and are non-empty are skipped, so re-runs are incremental.
+
+Usage:
+    python manage.py regenerate_qr_codes                                # dry-run
+    python manage.py regenerate_qr_codes --apply                        # fix qr_code values
+    python manage.py regenerate_qr_codes --apply --export-dir /app/media/qr_codes --workers 4
+    python manage.py regenerate_qr_codes --apply --start-id 150000      # resume
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.db.router import read_from_replica_unless
+from main.models import CustomUser
+from src.qr_code import qr_code_filename, qr_code_url, render_qr_code
+
+
+def _existing_files(directory: Path) -> set[str]:
+    """List exported PNGs in one pass; empty files count as corrupt."""
+    names: set[str] = set()
+    if not directory.exists():
+        return names
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_size > 0:
+                names.add(entry.name)
+    return names
+
+
+def _write_png(directory: str, telegram_id: int) -> int:
+    target = os.path.join(directory, qr_code_filename(telegram_id))
+    tmp_path = f"{target}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(render_qr_code(telegram_id))
+    os.replace(tmp_path, target)
+    return telegram_id
+
+
+class Command(BaseCommand):
+    help = "Normalize CustomUser.qr_code for all customers and optionally export QR PNGs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Apply changes (default is dry-run)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Customers per keyset page (default 1000)",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="Resume after this customer id",
+        )
+        parser.add_argument(
+            "--export-dir",
+            help="Render PNG files for customers missing in this directory",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Render processes for --export-dir",
+        )
+
+    @read_from_replica_unless("apply")
+    def handle(self, *args, **options):
+        apply = options["apply"]
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+        if workers < 1:
+            raise CommandError("--workers must be positive")
+
+        guest_tid = getattr(settings, "GUEST_TELEGRAM_ID", 0)
+        export_dir = options["export_dir"]
+        existing: set[str] = set()
+        pool = None
+        if export_dir:
+            export_path = Path(export_dir)
+            existing = _existing_files(export_path)
+            if apply:
+                export_path.mkdir(parents=True, exist_ok=True)
+                pool = ProcessPoolExecutor(max_workers=workers)
+
+        last_id = options["start_id"]
+        processed = updated = exported = 0
+
+        try:
+            while True:
+                page = list(
+                    CustomUser.objects.filter(id__gt=last_id, telegram_id__gt=0)
+                    .exclude(telegram_id=guest_tid)
+                    .order_by("id")
+                    .only("id", "telegram_id", "qr_code")[:batch_size]
+                )
+                if not page:
+                    break
+                last_id = page[-1].id
+                processed += len(page)
+
+                stale = []
+                for user in page:
+                    expected = qr_code_url(user.telegram_id)
+                    if user.qr_code != expected:
+                        user.qr_code = expected
+                        user.qr_file_id = None
+                        stale.append(user)
+                if stale and apply:
+                    CustomUser.objects.bulk_update(stale, ["qr_code", "qr_file_id"])
+                updated += len(stale)
+
+                if export_dir:
+                    missing = [
+                        user.telegram_id
+                        for user in page
+                        if qr_code_filename(user.telegram_id) not in existing
+                    ]
+                    if missing and pool is not None:
+                        chunksize = max(1, len(missing) // (workers * 4))
+                        for _ in pool.map(
+                            _write_png, repeat(export_dir), missing, chunksize=chunksize
+                        ):
+                            pass
+                    exported += len(missing)
+
+                self.stdout.write(
+                    f"Up to id {last_id}: processed={processed} "
+                    f"updated={updated} exported={exported}"
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write("")
+        self.stdout.write(f"Customers processed: {processed}")
+        self.stdout.write(f"qr_code values to update: {updated}")
+        if export_dir:
+            self.stdout.write(f"PNG files to export: {exported}")
+        self.stdout.write(f"Last customer id: {last_id}")
+
+        if not apply:
+            self.stdout.write(
+                self.style.WARNING("\nDry-run. Use --apply to update.")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("\nDone."))
@@ -0,0 +1,119 @@
+"""Maintain monthly partitions of the ``transactions`` table.
+
+Creates partitions for the current month and ``--ahead`` months after it, so
+new receipts never land in ``transactions_default``. With ``--retain-months``
+the command detaches partitions older than that many months. A detached
+partition is then moved to ``--archive-schema``, dropped with ``--drop``, or
+left as a standalone table in ``public``. Months are calendar months in
+``settings.TIME_ZONE`` (see ``main.partitions``).
+
+Usage:
+    python manage.py transaction_partitions                                   # dry-run
+    python manage.py transaction_partitions --apply                           # pre-create 3 months
+    python manage.py transaction_partitions --apply --retain-months 36 --archive-schema archive
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from main import partitions
+
+
+class Command(BaseCommand):
+    help = "Pre-create future transaction partitions and detach old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Apply changes (default is dry-run)",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Months to create after the current one (default 3)",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="Detach partitions older than this many months (months in TIME_ZONE)",
+        )
+        parser.add_argument(
+            "--archive-schema",
+            help="Move detached partitions into this schema",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of keeping them",
+        )
+
+    def handle(self, *args, **options):
+        apply = options["apply"]
+        ahead = options["ahead"]
+        retain = options["retain_months"]
+        archive_schema = options["archive_schema"]
+        if ahead < 0:
+            raise CommandError("--ahead must not be negative")
+        if retain is not None and retain < 1:
+            raise CommandError("--retain-months must be positive")
+        if archive_schema and options["drop"]:
+            raise CommandError("--archive-schema and --drop are mutually exclusive")
+        if connection.vendor != "postgresql":
+            raise CommandError("Transaction partitioning requires PostgreSQL")
+
+        current = partitions.month_start(date.today())
+        with connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                raise CommandError(
+                    "Table transactions is not partitioned; run migrate first."
+                )
+            existing = partitions.list_partitions(cursor)
+
+        names = {p.name for p in existing}
+        to_create = [
+            month
+            for month in (partitions.add_months(current, i) for i in range(ahead + 1))
+            if partitions.partition_name(month) not in names
+        ]
+        to_detach = []
+        if retain is not None:
+            cutoff = partitions.add_months(current, -retain)
+            to_detach = [p for p in existing if p.month is not None and p.month < cutoff]
+
+        for partition in existing:
+            label = partition.month.strftime("%Y-%m") if partition.month else "default"
+            self.stdout.write(f"{partition.name} ({label})")
+        for month in to_create:
+            self.stdout.write(f"Create: {partitions.partition_name(month)}")
+        for partition in to_detach:
+            self.stdout.write(f"Detach: {partition.name}")
+
+        if not apply:
+            self.stdout.write(self.style.WARNING("\nDry-run. Use --apply to update."))
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for month in to_create:
+                partitions.create_month_partition(cursor, month)
+            if archive_schema and to_detach:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"')
+            for partition in to_detach:
+                partitions.detach_partition(cursor, partition.name)
+                if options["drop"]:
+                    cursor.execute(f'DROP TABLE "{partition.name}"')
+                elif archive_schema:
+                    cursor.execute(
+                        f'ALTER TABLE "{partition.name}" SET SCHEMA "{archive_schema}"'
+                    )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nCreated {len(to_create)} partitions, detached {len(to_detach)}."
+            )
+        )
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0011_newsletterdelivery_uc"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="qr_file_id",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0012_customuser_qr_file_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Receipt",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("receipt_guid", models.CharField(max_length=64, unique=True)),
+                ("store_id", models.IntegerField()),
+                ("purchased_at", models.DateTimeField(blank=True, null=True)),
+                ("total_amount", models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ("discount_total", models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ("bonus_spent", models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ("bonus_earned", models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ("idempotency_key", models.UUIDField(blank=True, null=True, unique=True)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="receipts",
+                        to="main.customuser",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Чек",
+                "verbose_name_plural": "Чеки",
+                "db_table": "receipts",
+            },
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="receipt",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="lines",
+                to="main.receipt",
+            ),
+        ),
+    ]
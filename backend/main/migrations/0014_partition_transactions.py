@@ -0,0 +1,234 @@
+"""Convert ``transactions`` into a table partitioned by month of ``purchased_at``.
+
+PostgreSQL only. See ``main/partitions.py`` for the layout. The migration is
+not atomic and runs in three steps, each committed on its own:
+
+1. the old table is renamed to ``transactions_legacy``. A partitioned table
+   with ``PRIMARY KEY (id, purchased_at)`` and its monthly partitions takes
+   its place;
+2. rows are copied in batches of ``COPY_BATCH`` ids. ``purchased_at`` is
+   filled from ``purchase_date`` and ``purchase_time`` where it is NULL. They
+   are local to ``settings.TIME_ZONE``, like the partition bounds;
+3. the legacy table is dropped, and the unique constraints, indexes and
+   foreign keys are created.
+
+If the migration is interrupted, running ``migrate`` again continues from the
+last committed batch.
+
+Unique constraints of a partitioned table must include the partition key.
+The state operations record them, so the model matches the database. On
+other backends (the sqlite test database) the same operations run as regular
+schema changes.
+"""
+
+from datetime import date
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+from main import partitions
+
+LEGACY = "transactions_legacy"
+SEQUENCE = "transactions_id_seq"
+COPY_BATCH = 50_000
+
+# Строки без даты покупки попадают в секцию по умолчанию
+_PURCHASED_AT = (
+    'COALESCE("purchased_at", '
+    '("purchase_date" + COALESCE("purchase_time", TIME \'00:00\')) AT TIME ZONE %s, '
+    "TIMESTAMPTZ 'epoch')"
+)
+
+
+def _table(apps, model):
+    return apps.get_model("main", model)._meta.db_table
+
+
+def _exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    return cursor.fetchone()[0] is not None
+
+
+def _create_partitioned_table(cursor):
+    table = partitions.TABLE
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{LEGACY}"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{LEGACY}" INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE ("purchased_at")'
+    )
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "purchased_at" SET NOT NULL')
+    cursor.execute(
+        f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ("id", "purchased_at")'
+    )
+    # Последовательность старой таблицы (serial или identity) удалится
+    # вместе с ней, поэтому id получает собственную.
+    cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}_new" AS bigint')
+    cursor.execute(
+        f'ALTER TABLE "{table}" ALTER COLUMN "id" SET DEFAULT nextval(\'{SEQUENCE}_new\')'
+    )
+    cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}_new" OWNED BY "{table}"."id"')
+    cursor.execute(
+        f"SELECT setval('{SEQUENCE}_new', COALESCE(max(\"id\"), 0) + 1, false) FROM \"{LEGACY}\""
+    )
+
+    cursor.execute(
+        'SELECT min(COALESCE("purchased_at", "purchase_date"::timestamp AT TIME ZONE %s)), '
+        'max(COALESCE("purchased_at", "purchase_date"::timestamp AT TIME ZONE %s)) '
+        f'FROM "{LEGACY}"',
+        [settings.TIME_ZONE, settings.TIME_ZONE],
+    )
+    oldest, newest = cursor.fetchone()
+    tz = ZoneInfo(settings.TIME_ZONE)
+    today = date.today()
+    month = partitions.month_start(oldest.astimezone(tz).date() if oldest else today)
+    last = partitions.add_months(
+        partitions.month_start(max(newest.astimezone(tz).date() if newest else today, today)), 3
+    )
+    while month <= last:
+        partitions.create_month_partition(cursor, month)
+        month = partitions.add_months(month, 1)
+    partitions.create_default_partition(cursor)
+
+
+def _copy_rows(connection, cursor):
+    table = partitions.TABLE
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = %s AND table_schema = current_schema() ORDER BY ordinal_position",
+        [LEGACY],
+    )
+    columns = [row[0] for row in cursor.fetchall()]
+    target = ", ".join(f'"{column}"' for column in columns)
+    source = ", ".join(
+        _PURCHASED_AT if column == "purchased_at" else f'"{column}"' for column in columns
+    )
+    tz_params = [settings.TIME_ZONE] if "purchased_at" in columns else []
+
+    cursor.execute(f'SELECT COALESCE(max("id"), 0) FROM "{LEGACY}"')
+    legacy_max = cursor.fetchone()[0]
+    # Новые id начинаются после legacy_max, так что всё, что ниже, уже скопировано
+    cursor.execute(f'SELECT COALESCE(max("id"), 0) FROM "{table}" WHERE "id" <= %s', [legacy_max])
+    copied = cursor.fetchone()[0]
+    while copied < legacy_max:
+        upper = copied + COPY_BATCH
+        with transaction.atomic(using=connection.alias):
+            cursor.execute(
+                f'INSERT INTO "{table}" ({target}) SELECT {source} FROM "{LEGACY}" '
+                'WHERE "id" > %s AND "id" <= %s',
+                [*tz_params, copied, upper],
+            )
+        copied = upper
+
+
+def _finish(apps, cursor):
+    table = partitions.TABLE
+    cursor.execute(f'DROP TABLE "{LEGACY}"')
+    cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}_new" RENAME TO "{SEQUENCE}"')
+    cursor.execute(
+        f'ALTER TABLE "{table}" ADD CONSTRAINT "uniq_receipt_line" '
+        'UNIQUE ("receipt_guid", "receipt_line", "purchased_at")'
+    )
+    cursor.execute(
+        f'ALTER TABLE "{table}" ADD CONSTRAINT "transactions_idempotency_key_uniq" '
+        'UNIQUE ("idempotency_key", "purchased_at")'
+    )
+    cursor.execute(f'CREATE INDEX "transactions_purchased_at_idx" ON "{table}" ("purchased_at")')
+    cursor.execute(f'CREATE INDEX "transactions_receipt_guid_idx" ON "{table}" ("receipt_guid")')
+    for column, model in (
+        ("customer_id", "CustomUser"),
+        ("product_id", "Product"),
+        ("receipt_id", "Receipt"),
+    ):
+        cursor.execute(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{column}_fk" '
+            f'FOREIGN KEY ("{column}") REFERENCES "{_table(apps, model)}" ("id") '
+            "DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f'CREATE INDEX "{table}_{column}_idx" ON "{table}" ("{column}")')
+
+
+def partition_transactions(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        if not partitions.is_partitioned(cursor):
+            with transaction.atomic(using=connection.alias):
+                _create_partitioned_table(cursor)
+        if not _exists(cursor, LEGACY):
+            return
+        _copy_rows(connection, cursor)
+        with transaction.atomic(using=connection.alias):
+            _finish(apps, cursor)
+
+
+class UnlessPostgreSQL(migrations.SeparateDatabaseAndState):
+    """Run ``database_operations`` on every backend except PostgreSQL."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+STATE_OPERATIONS = [
+    migrations.AlterField(
+        model_name="transaction",
+        name="purchased_at",
+        field=models.DateTimeField(default=timezone.now),
+    ),
+    migrations.AlterField(
+        model_name="transaction",
+        name="idempotency_key",
+        field=models.UUIDField(blank=True, null=True),
+    ),
+    migrations.RemoveConstraint(
+        model_name="transaction",
+        name="uniq_receipt_line",
+    ),
+    migrations.AddConstraint(
+        model_name="transaction",
+        constraint=models.UniqueConstraint(
+            fields=("receipt_guid", "receipt_line", "purchased_at"), name="uniq_receipt_line"
+        ),
+    ),
+    migrations.AddConstraint(
+        model_name="transaction",
+        constraint=models.UniqueConstraint(
+            fields=("idempotency_key", "purchased_at"), name="transactions_idempotency_key_uniq"
+        ),
+    ),
+    migrations.AddIndex(
+        model_name="transaction",
+        index=models.Index(fields=["purchased_at"], name="transactions_purchased_at_idx"),
+    ),
+    migrations.AddIndex(
+        model_name="transaction",
+        index=models.Index(fields=["receipt_guid"], name="transactions_receipt_guid_idx"),
+    ),
+]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("main", "0013_receipt"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=STATE_OPERATIONS,
+            database_operations=[
+                migrations.RunPython(partition_transactions, migrations.RunPython.noop),
+                UnlessPostgreSQL(database_operations=STATE_OPERATIONS),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 23:10
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_partition_transactions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['qr_code'], name='customers_qr_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.datetime.ExtractMonth('birth_date'), django.db.models.functions.datetime.ExtractDay('birth_date'), name='customers_birth_month_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', 'purchased_at'], name='transactions_customer_at_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 23:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BirthdayGreeting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('run_id', models.UUIDField()),
+                ('telegram_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='birthday_greetings', to='main.customuser')),
+            ],
+            options={
+                'verbose_name': 'Поздравление с ДР',
+                'verbose_name_plural': 'Поздравления с ДР',
+                'db_table': 'birthday_greetings',
+                'constraints': [models.UniqueConstraint(fields=('customer', 'year'), name='birthday_greeting_customer_year_uc')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import ExtractDay, ExtractMonth
 from django.utils import timezone
 
 
@@ -27,6 +28,7 @@ class CustomUser(models.Model):
     birth_date = models.DateTimeField(null=True, blank=True)
     registration_date = models.DateTimeField(null=True, blank=True)
     qr_code = models.CharField(max_length=500, null=True, blank=True)
+    qr_file_id = models.CharField(max_length=255, null=True, blank=True)
     bonuses = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     referrer = models.ForeignKey(
         "self",
@@ -45,11 +47,49 @@ class CustomUser(models.Model):
 
     class Meta:
         db_table = "customers"
+        indexes = [
+            models.Index(fields=["qr_code"], name="customers_qr_code_idx"),
+            # Поиск именинников: birth_date__month / birth_date__day
+            models.Index(
+                ExtractMonth("birth_date"),
+                ExtractDay("birth_date"),
+                name="customers_birth_month_day_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.full_name or f"User {self.telegram_id}"
 
+
+class Receipt(models.Model):
+    """One row per 1C receipt; line items live in ``Transaction``."""
+
+    receipt_guid = models.CharField(max_length=64, unique=True)
+    customer = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name="receipts"
+    )
+    store_id = models.IntegerField()
+    purchased_at = models.DateTimeField(null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    bonus_spent = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    bonus_earned = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    idempotency_key = models.UUIDField(unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Чек"
+        verbose_name_plural = "Чеки"
+        db_table = "receipts"
+
+    def __str__(self):
+        return f"Receipt {self.receipt_guid}"
+
+
 class Transaction(models.Model):
+    receipt = models.ForeignKey(
+        Receipt, on_delete=models.SET_NULL, null=True, blank=True, related_name="lines"
+    )
     customer = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, null=True, blank=True)
     quantity = models.IntegerField(null=True, blank=True)
@@ -60,8 +100,8 @@ class Transaction(models.Model):
     store_id = models.IntegerField()
     is_promotional = models.BooleanField(null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    purchased_at = models.DateTimeField(null=True, blank=True)
-    idempotency_key = models.UUIDField(unique=True, null=True, blank=True)
+    purchased_at = models.DateTimeField(default=timezone.now)
+    idempotency_key = models.UUIDField(null=True, blank=True)
     receipt_total_amount   = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     receipt_discount_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     receipt_bonus_spent    = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -71,8 +111,21 @@ class Transaction(models.Model):
 
     class Meta:
         db_table = "transactions"
+        # В PostgreSQL таблица секционирована по purchased_at (см. main/partitions.py):
+        # первичный ключ и уникальные ограничения обязаны включать ключ секционирования.
+        # Повтор строки чека с другим временем отсекает onec_receipt под блокировкой Receipt.
         constraints = [
-            models.UniqueConstraint(fields=["receipt_guid", "receipt_line"], name="uniq_receipt_line")
+            models.UniqueConstraint(
+                fields=["receipt_guid", "receipt_line", "purchased_at"], name="uniq_receipt_line"
+            ),
+            models.UniqueConstraint(
+                fields=["idempotency_key", "purchased_at"], name="transactions_idempotency_key_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["purchased_at"], name="transactions_purchased_at_idx"),
+            models.Index(fields=["receipt_guid"], name="transactions_receipt_guid_idx"),
+            models.Index(fields=["customer", "purchased_at"], name="transactions_customer_at_idx"),
         ]
 
     def __str__(self):
@@ -172,3 +225,33 @@ class NewsletterOpenEvent(models.Model):
 
     def __str__(self):
         return f"Open event #{self.id} for delivery {self.delivery_id}"
+
+
+class BirthdayGreeting(models.Model):
+    """Поздравление с днём рождения: не больше одного на клиента в год."""
+
+    customer = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="birthday_greetings",
+    )
+    year = models.IntegerField()
+    run_id = models.UUIDField()
+    telegram_message_id = models.BigIntegerField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "birthday_greetings"
+        verbose_name = "Поздравление с ДР"
+        verbose_name_plural = "Поздравления с ДР"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["customer", "year"],
+                name="birthday_greeting_customer_year_uc",
+            )
+        ]
+
+    def __str__(self):
+        return f"Birthday greeting {self.year} for {self.customer_id}"
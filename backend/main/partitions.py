@@ -0,0 +1,139 @@
+"""Monthly range partitions of the ``transactions`` table (PostgreSQL only).
+
+``transactions`` is partitioned by ``RANGE (purchased_at)``. Each calendar month
+lives in ``transactions_pYYYYMM``. Months are calendar months in
+``settings.TIME_ZONE``: the bounds are local midnights, not UTC ones, so a
+receipt from the night of the 1st belongs to the new month. Rows with an
+out-of-range ``purchased_at`` fall into ``transactions_default``. PostgreSQL requires the primary key and
+every unique constraint of a partitioned table to contain the partition key:
+
+* the primary key is ``(id, purchased_at)``, and ``purchased_at`` is NOT NULL;
+* ``uniq_receipt_line`` is ``(receipt_guid, receipt_line, purchased_at)``;
+* ``transactions_idempotency_key_uniq`` is ``(idempotency_key, purchased_at)``.
+
+The model declares the same constraints. A receipt line replayed with a
+different timestamp is therefore not caught by the database. ``onec_receipt``
+writes the lines of a receipt while holding a lock on its ``Receipt`` row, and
+it skips lines that already exist.
+
+These helpers are shared by migration ``0014_partition_transactions`` and the
+``transaction_partitions`` management command.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+TABLE = "transactions"
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    month: date | None
+    schema: str = "public"
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def month_bound(month: date) -> datetime:
+    """Local midnight of the 1st of ``month`` in ``settings.TIME_ZONE``."""
+
+    return datetime(month.year, month.month, 1, tzinfo=ZoneInfo(settings.TIME_ZONE))
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def parse_partition_name(name: str) -> date | None:
+    match = _PARTITION_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(cursor) -> bool:
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+        [TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor) -> list[Partition]:
+    """Return attached partitions ordered by month; the default partition is last."""
+
+    cursor.execute(
+        "SELECT n.nspname, c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE i.inhparent = %s::regclass",
+        [TABLE],
+    )
+    partitions = [
+        Partition(name=name, month=parse_partition_name(name), schema=schema)
+        for schema, name in cursor.fetchall()
+    ]
+    return sorted(partitions, key=lambda p: (p.month is None, p.month or date.min))
+
+
+def create_month_partition(cursor, month: date) -> str:
+    """Create the partition for ``month`` if it does not exist yet.
+
+    Fails if the default partition already holds rows of that month; create
+    partitions ahead of time (see ``transaction_partitions --ahead``).
+    """
+
+    month = month_start(month)
+    name = partition_name(month)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+        "FOR VALUES FROM (%s) TO (%s)",
+        [month_bound(month).isoformat(), month_bound(add_months(month, 1)).isoformat()],
+    )
+    return name
+
+
+def create_default_partition(cursor) -> str:
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT'
+    )
+    return DEFAULT_PARTITION
+
+
+def detach_partition(cursor, name: str):
+    cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+
+
+__all__ = [
+    "DEFAULT_PARTITION",
+    "Partition",
+    "TABLE",
+    "add_months",
+    "create_default_partition",
+    "create_month_partition",
+    "detach_partition",
+    "is_partitioned",
+    "list_partitions",
+    "month_bound",
+    "month_start",
+    "parse_partition_name",
+    "partition_name",
+]
@@ -17,6 +17,7 @@ def broadcast_send_task(self, message_id: int) -> None:
     from aiogram.client.default import DefaultBotProperties
 
     from src.broadcast import _send_with_django, BOT_TOKEN
+    from src.metrics import push_metrics
 
     async def runner():
         bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
@@ -25,5 +26,28 @@ def broadcast_send_task(self, message_id: int) -> None:
         finally:
             await bot.session.close()
 
-    asyncio.run(runner())
+    try:
+        asyncio.run(runner())
+    finally:
+        push_metrics()
 
+
+@shared_task
+def ensure_transaction_partitions() -> None:
+    """Заранее создаёт месячные секции таблицы transactions."""
+    close_old_connections()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from main import partitions
+
+    if connection.vendor != "postgresql":
+        logger.info("Секционирование transactions пропущено: база %s", connection.vendor)
+        return
+    with connection.cursor() as cursor:
+        if not partitions.is_partitioned(cursor):
+            logger.warning("Таблица transactions не секционирована, выполните migrate")
+            return
+
+    call_command("transaction_partitions", "--apply")
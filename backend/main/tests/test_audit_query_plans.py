@@ -0,0 +1,46 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from main.management.commands.audit_query_plans import hot_queries
+from main.models import CustomUser
+
+COMMAND = "main.management.commands.audit_query_plans"
+
+# В SQLite Django передаёт вид EXTRACT параметром, поэтому индекс по выражению
+# для именинников планировщик там не использует; проверяется только в PostgreSQL.
+SQLITE_UNINDEXABLE = {"birthday_customers"}
+
+
+class AuditQueryPlansCommandTests(TestCase):
+    def _call(self, *args):
+        out = StringIO()
+        call_command("audit_query_plans", *args, stdout=out)
+        return out.getvalue()
+
+    def test_hot_queries_use_indexes(self):
+        output = self._call("--min-rows", "0")
+
+        for label, _ in hot_queries():
+            if label in SQLITE_UNINDEXABLE:
+                continue
+            self.assertIn(f"ok        {label}", output)
+
+    def test_seq_scan_is_flagged(self):
+        unindexed = [("customer_by_name", CustomUser.objects.filter(full_name="Гость"))]
+        with mock.patch(f"{COMMAND}.hot_queries", return_value=unindexed):
+            output = self._call("--min-rows", "0")
+            self.assertIn("SEQ SCAN  customer_by_name: customers", output)
+
+            with self.assertRaisesMessage(CommandError, "customer_by_name"):
+                self._call("--min-rows", "0", "--fail-on-seqscan")
+
+    def test_small_tables_are_ignored(self):
+        unindexed = [("customer_by_name", CustomUser.objects.filter(full_name="Гость"))]
+        with mock.patch(f"{COMMAND}.hot_queries", return_value=unindexed):
+            output = self._call("--fail-on-seqscan")
+
+        self.assertIn("ok        customer_by_name", output)
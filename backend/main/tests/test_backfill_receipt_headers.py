@@ -0,0 +1,76 @@
+import uuid
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from main.models import CustomUser, Receipt, Transaction
+
+
+class BackfillReceiptHeadersCommandTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(telegram_id=301)
+        self.key = uuid.uuid4()
+        Transaction.objects.create(
+            customer=self.user, total_amount=Decimal("60.00"), store_id=5,
+            receipt_guid="LEGACY-1", receipt_line=1, idempotency_key=self.key,
+            receipt_total_amount=Decimal("100.00"), receipt_discount_total=Decimal("3.00"),
+            bonus_earned=Decimal("1.00"), receipt_bonus_spent=Decimal("2.00"),
+        )
+        Transaction.objects.create(
+            customer=self.user, total_amount=Decimal("40.00"), store_id=5,
+            receipt_guid="LEGACY-1", receipt_line=2,
+            bonus_earned=Decimal("0.50"), receipt_bonus_spent=Decimal("1.00"),
+        )
+        Transaction.objects.create(
+            customer=self.user, total_amount=Decimal("25.00"), store_id=6,
+            receipt_guid="LEGACY-2", receipt_line=1,
+        )
+
+    def _call(self, *args):
+        out = StringIO()
+        call_command("backfill_receipt_headers", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_does_not_write(self):
+        output = self._call()
+
+        self.assertIn("Receipt headers to create: 2", output)
+        self.assertIn("Lines to link: 3", output)
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_apply_creates_headers_and_links_lines(self):
+        self._call("--apply", "--batch-size", "1")
+
+        first = Receipt.objects.get(receipt_guid="LEGACY-1")
+        self.assertEqual(first.customer_id, self.user.id)
+        self.assertEqual(first.store_id, 5)
+        self.assertEqual(first.total_amount, Decimal("100.00"))
+        self.assertEqual(first.discount_total, Decimal("3.00"))
+        self.assertEqual(first.bonus_spent, Decimal("3.00"))
+        self.assertEqual(first.bonus_earned, Decimal("1.50"))
+        self.assertEqual(first.idempotency_key, self.key)
+
+        second = Receipt.objects.get(receipt_guid="LEGACY-2")
+        self.assertEqual(second.total_amount, Decimal("25.00"))
+        self.assertFalse(Transaction.objects.filter(receipt__isnull=True).exists())
+
+        output = self._call("--apply")
+        self.assertIn("Receipt headers to create: 0", output)
+        self.assertEqual(Receipt.objects.count(), 2)
+
+    def test_receipt_delivered_in_parts_sums_delivery_totals(self):
+        later_key = uuid.uuid4()
+        Transaction.objects.create(
+            customer=self.user, total_amount=Decimal("30.00"), store_id=5,
+            receipt_guid="LEGACY-1", receipt_line=3, idempotency_key=later_key,
+            receipt_total_amount=Decimal("30.00"), receipt_discount_total=Decimal("1.00"),
+        )
+
+        self._call("--apply")
+
+        header = Receipt.objects.get(receipt_guid="LEGACY-1")
+        self.assertEqual(header.total_amount, Decimal("130.00"))
+        self.assertEqual(header.discount_total, Decimal("4.00"))
+        self.assertEqual(header.idempotency_key, self.key)
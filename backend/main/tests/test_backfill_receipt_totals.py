@@ -0,0 +1,35 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from main.models import CustomUser, Transaction
+
+
+class BackfillReceiptTotalsCommandTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(telegram_id=302)
+        self.first = Transaction.objects.create(
+            customer=user, total_amount=Decimal("60.00"), store_id=5,
+            receipt_guid="LEGACY-1", receipt_line=1,
+        )
+        Transaction.objects.create(
+            customer=user, total_amount=Decimal("40.00"), store_id=5,
+            receipt_guid="LEGACY-1", receipt_line=2,
+        )
+
+    def _call(self, *args):
+        out = StringIO()
+        call_command("backfill_receipt_totals", *args, stdout=out)
+        return out.getvalue()
+
+    def test_apply_sets_total_on_first_line(self):
+        self.assertIn("Receipts to update: 1", self._call())
+        self.first.refresh_from_db()
+        self.assertIsNone(self.first.receipt_total_amount)
+
+        self._call("--apply")
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.receipt_total_amount, Decimal("100.00"))
+        self.assertIn("Already filled: 1", self._call())
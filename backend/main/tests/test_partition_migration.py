@@ -0,0 +1,96 @@
+import importlib
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps as global_apps
+from django.test import SimpleTestCase
+
+migration = importlib.import_module("main.migrations.0014_partition_transactions")
+
+
+class FakeCursor:
+    """Answer the catalog queries of the migration and record every statement."""
+
+    def __init__(self, *, partitioned=False, legacy=True, legacy_max=120_000, copied=0):
+        self.partitioned = partitioned
+        self.legacy = legacy
+        self.legacy_max = legacy_max
+        self.copied = copied
+        self.statements = []
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        if "pg_partitioned_table" in sql:
+            self._result = (1,) if self.partitioned else None
+        elif "to_regclass" in sql:
+            self._result = (migration.LEGACY if self.legacy else None,)
+        elif sql.startswith("SELECT min("):
+            self._result = (
+                datetime(2025, 1, 5, tzinfo=timezone.utc),
+                datetime(2025, 2, 1, tzinfo=timezone.utc),
+            )
+        elif "information_schema.columns" in sql:
+            self._result = [("id",), ("purchased_at",), ("receipt_guid",)]
+        elif f'FROM "{migration.LEGACY}"' in sql and 'max("id")' in sql:
+            self._result = (self.legacy_max,)
+        elif 'max("id")' in sql:
+            self._result = (self.copied,)
+        else:
+            self._result = None
+
+    def fetchone(self):
+        return self._result
+
+    def fetchall(self):
+        return self._result
+
+    def matching(self, fragment):
+        return [sql for sql in self.statements if fragment in sql]
+
+
+class PartitionMigrationTests(SimpleTestCase):
+    def _run(self, cursor):
+        connection = SimpleNamespace(vendor="postgresql", alias="default", cursor=lambda: cursor)
+        with mock.patch.object(migration.transaction, "atomic", return_value=nullcontext()):
+            migration.partition_transactions(global_apps, SimpleNamespace(connection=connection))
+        return cursor
+
+    def test_creates_primary_key_copies_in_batches_then_adds_constraints(self):
+        cursor = self._run(FakeCursor())
+
+        self.assertEqual(len(cursor.matching('PRIMARY KEY ("id", "purchased_at")')), 1)
+        inserts = cursor.matching("INSERT INTO")
+        self.assertEqual(len(inserts), 3)
+        self.assertIn("COALESCE(\"purchased_at\"", inserts[0])
+        self.assertIn("AT TIME ZONE %s", inserts[0])
+        self.assertIn("transactions_p202501", " ".join(cursor.matching("PARTITION OF")))
+
+        statements = cursor.statements
+        drop = statements.index(cursor.matching("DROP TABLE")[0])
+        self.assertGreater(drop, statements.index(inserts[-1]))
+        after_copy = " ".join(statements[drop:])
+        self.assertIn('UNIQUE ("receipt_guid", "receipt_line", "purchased_at")', after_copy)
+        self.assertIn('UNIQUE ("idempotency_key", "purchased_at")', after_copy)
+        self.assertIn('"transactions_purchased_at_idx"', after_copy)
+        self.assertIn('"transactions_receipt_guid_idx"', after_copy)
+
+    def test_interrupted_copy_resumes_after_last_batch(self):
+        cursor = self._run(FakeCursor(partitioned=True, copied=100_000))
+
+        self.assertEqual(cursor.matching(f'RENAME TO "{migration.LEGACY}"'), [])
+        self.assertEqual(len(cursor.matching("INSERT INTO")), 1)
+
+    def test_already_partitioned_is_a_no_op(self):
+        cursor = self._run(FakeCursor(partitioned=True, legacy=False))
+
+        self.assertEqual(cursor.matching("INSERT INTO"), [])
+        self.assertEqual(cursor.matching("ALTER TABLE"), [])
@@ -0,0 +1,62 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from main.models import CustomUser
+
+
+class RegenerateQrCodesCommandTests(TestCase):
+    def setUp(self):
+        self.legacy = CustomUser.objects.create(
+            telegram_id=101, qr_code="/app/media/qr_codes/qr_101.png", qr_file_id="OLD"
+        )
+        self.missing = CustomUser.objects.create(telegram_id=102)
+        self.ok = CustomUser.objects.create(
+            telegram_id=103, qr_code="/media/qr_codes/user_103.png", qr_file_id="KEEP"
+        )
+
+    def _call(self, *args):
+        out = StringIO()
+        call_command("regenerate_qr_codes", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_does_not_write(self):
+        output = self._call("--batch-size", "2")
+
+        self.assertIn("qr_code values to update: 2", output)
+        self.legacy.refresh_from_db()
+        self.assertEqual(self.legacy.qr_code, "/app/media/qr_codes/qr_101.png")
+
+    def test_apply_normalizes_values_and_is_idempotent(self):
+        self._call("--apply", "--batch-size", "2")
+
+        self.legacy.refresh_from_db()
+        self.missing.refresh_from_db()
+        self.ok.refresh_from_db()
+        self.assertEqual(self.legacy.qr_code, "/media/qr_codes/user_101.png")
+        self.assertIsNone(self.legacy.qr_file_id)
+        self.assertEqual(self.missing.qr_code, "/media/qr_codes/user_102.png")
+        self.assertEqual(self.ok.qr_file_id, "KEEP")
+
+        output = self._call("--apply")
+        self.assertIn("qr_code values to update: 0", output)
+
+    def test_export_writes_only_missing_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            export_dir = Path(tmp)
+            (export_dir / "user_101.png").write_bytes(b"existing")
+            (export_dir / "user_102.png").write_bytes(b"")  # битый файл
+
+            output = self._call(
+                "--apply", "--export-dir", tmp, "--workers", "1"
+            )
+
+            self.assertIn("PNG files to export: 2", output)
+            self.assertEqual((export_dir / "user_101.png").read_bytes(), b"existing")
+            self.assertTrue(
+                (export_dir / "user_102.png").read_bytes().startswith(b"\x89PNG")
+            )
+            self.assertTrue((export_dir / "user_103.png").exists())
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from backend.db import router
+from backend.db.router import (
+    ReplicaLagGuard,
+    ReplicaRouter,
+    ReplicaRoutingMiddleware,
+    pin_primary,
+    read_from_replica,
+    read_from_replica_unless,
+    use_primary,
+)
+from main.models import CustomUser
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        configured = mock.patch.object(router, "_replica_configured", return_value=True)
+        configured.start()
+        self.addCleanup(configured.stop)
+        lag_ok = mock.patch.object(router.replica_lag_guard, "ok", return_value=True)
+        self.lag_ok = lag_ok.start()
+        self.addCleanup(lag_ok.stop)
+
+    def _read(self):
+        return self.router.db_for_read(CustomUser)
+
+    def test_reads_use_primary_unless_opted_in(self):
+        self.assertIsNone(self._read())
+        with read_from_replica():
+            self.assertEqual(self._read(), "replica")
+            with use_primary():
+                self.assertIsNone(self._read())
+            self.assertEqual(self._read(), "replica")
+        self.assertIsNone(self._read())
+
+    def test_write_pins_the_rest_of_the_block_to_primary(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_write(CustomUser), "default")
+            self.assertIsNone(self._read())
+        with read_from_replica():
+            self.assertEqual(self._read(), "replica")
+
+    def test_lagging_replica_is_skipped(self):
+        self.lag_ok.return_value = False
+
+        with read_from_replica():
+            self.assertEqual(self._read(), "default")
+
+    def test_without_replica_everything_goes_to_default(self):
+        with mock.patch.object(router, "_replica_configured", return_value=False):
+            with read_from_replica():
+                self.assertIsNone(self._read())
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate("replica", "main"))
+        self.assertIsNone(self.router.allow_migrate("default", "main"))
+
+    def test_middleware_pin_lasts_for_the_request_only(self):
+        reads = []
+
+        def view(request):
+            with read_from_replica():
+                reads.append(self._read())
+                pin_primary()
+            with read_from_replica():
+                reads.append(self._read())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        middleware(RequestFactory().get("/"))
+        middleware(RequestFactory().get("/"))
+
+        self.assertEqual(reads, ["replica", None, "replica", None])
+
+    def test_command_decorator_reads_from_replica_only_in_dry_run(self):
+        test = self
+
+        class Command:
+            @read_from_replica_unless("apply")
+            def handle(self, *args, **options):
+                return test._read()
+
+        self.assertEqual(Command().handle(apply=False), "replica")
+        self.assertIsNone(Command().handle(apply=True))
+
+
+@override_settings(DB_REPLICA_MAX_LAG=10, DB_REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaLagGuardTests(SimpleTestCase):
+    def test_result_is_cached_for_the_check_interval(self):
+        guard = ReplicaLagGuard()
+        with mock.patch.object(guard, "_measure", return_value=True) as measure:
+            self.assertTrue(guard.ok())
+            self.assertTrue(guard.ok())
+            guard.reset()
+            guard.ok()
+
+        self.assertEqual(measure.call_count, 2)
+
+    def _measure_with(self, **cursor_behaviour):
+        cursor = mock.MagicMock(**cursor_behaviour)
+        connection = mock.MagicMock()
+        connection.cursor.return_value.__enter__.return_value = cursor
+        with mock.patch.object(router, "connections", {"replica": connection}):
+            return ReplicaLagGuard()._measure()
+
+    def test_lag_above_limit_or_errors_fall_back_to_primary(self):
+        self.assertTrue(self._measure_with(**{"fetchone.return_value": (2.5,)}))
+        self.assertFalse(self._measure_with(**{"fetchone.return_value": (30.0,)}))
+        self.assertFalse(self._measure_with(**{"execute.side_effect": DatabaseError("down")}))
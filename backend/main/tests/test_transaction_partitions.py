@@ -0,0 +1,137 @@
+import importlib
+from contextlib import nullcontext
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main import partitions
+from main.tasks import ensure_transaction_partitions
+
+command_module = importlib.import_module("main.management.commands.transaction_partitions")
+
+
+class PartitionHelpersTests(SimpleTestCase):
+    def test_add_months_wraps_years(self):
+        self.assertEqual(partitions.add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+
+    def test_partition_name_round_trip(self):
+        name = partitions.partition_name(date(2025, 3, 17))
+        self.assertEqual(name, "transactions_p202503")
+        self.assertEqual(partitions.parse_partition_name(name), date(2025, 3, 1))
+        self.assertIsNone(partitions.parse_partition_name(partitions.DEFAULT_PARTITION))
+
+    @override_settings(TIME_ZONE="Asia/Yakutsk")
+    def test_month_bounds_are_local_midnights(self):
+        calls = []
+        cursor = mock.Mock(execute=lambda sql, params=None: calls.append(params))
+
+        partitions.create_month_partition(cursor, date(2025, 3, 17))
+
+        self.assertEqual(calls, [["2025-03-01T00:00:00+09:00", "2025-04-01T00:00:00+09:00"]])
+
+
+class TransactionPartitionsCommandTests(TestCase):
+    def test_requires_postgresql(self):
+        with self.assertRaisesMessage(CommandError, "requires PostgreSQL"):
+            call_command("transaction_partitions")
+
+    def test_rejects_conflicting_archive_options(self):
+        with self.assertRaises(CommandError):
+            call_command("transaction_partitions", "--archive-schema", "archive", "--drop")
+
+    def test_apply_creates_missing_months_and_archives_old_ones(self):
+        cursor = FakeCursor(["transactions_p202401", "transactions_p202506", "transactions_default"])
+        with mock.patch.object(command_module, "connection", FakeConnection(cursor)), \
+                mock.patch.object(command_module, "date", FakeDate), \
+                mock.patch.object(command_module.transaction, "atomic", return_value=nullcontext()):
+            call_command(
+                "transaction_partitions", "--apply", "--ahead", "1",
+                "--retain-months", "12", "--archive-schema", "archive", stdout=StringIO(),
+            )
+
+        created = cursor.matching("PARTITION OF")
+        self.assertEqual(len(created), 1)
+        self.assertIn('"transactions_p202507" PARTITION OF "transactions"', created[0])
+        self.assertEqual(
+            cursor.matching("DETACH PARTITION"),
+            ['ALTER TABLE "transactions" DETACH PARTITION "transactions_p202401"'],
+        )
+        self.assertEqual(
+            cursor.matching("SET SCHEMA"),
+            ['ALTER TABLE "transactions_p202401" SET SCHEMA "archive"'],
+        )
+
+
+class FakeDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2025, 6, 15)
+
+
+class FakeCursor:
+    def __init__(self, names, partitioned=True):
+        self.names = names
+        self.partitioned = partitioned
+        self.statements = []
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        if "pg_partitioned_table" in sql:
+            self._result = (1,) if self.partitioned else None
+        elif "pg_inherits" in sql:
+            self._result = [("public", name) for name in self.names]
+        else:
+            self._result = None
+
+    def fetchone(self):
+        return self._result
+
+    def fetchall(self):
+        return self._result
+
+    def matching(self, fragment):
+        return [sql for sql in self.statements if fragment in sql]
+
+
+class FakeConnection:
+    vendor = "postgresql"
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+class EnsurePartitionsTaskTests(SimpleTestCase):
+    def test_skips_non_postgresql_database(self):
+        with mock.patch("django.core.management.call_command") as command:
+            ensure_transaction_partitions()
+        command.assert_not_called()
+
+    def test_skips_table_that_is_not_partitioned(self):
+        cursor = FakeCursor([], partitioned=False)
+        with mock.patch("django.db.connection", FakeConnection(cursor)), \
+                mock.patch("django.core.management.call_command") as command, \
+                mock.patch("main.tasks.close_old_connections"):
+            ensure_transaction_partitions()
+        command.assert_not_called()
+
+    def test_applies_on_partitioned_table(self):
+        with mock.patch("django.db.connection", FakeConnection(FakeCursor([]))), \
+                mock.patch("django.core.management.call_command") as command, \
+                mock.patch("main.tasks.close_old_connections"):
+            ensure_transaction_partitions()
+        command.assert_called_once_with("transaction_partitions", "--apply")
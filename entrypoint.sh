@@ -5,6 +5,7 @@ IFS=$'\n\t'
 
 GUNICORN_WORKERS=${GUNICORN_WORKERS:-3}
 GUNICORN_TIMEOUT=${GUNICORN_TIMEOUT:-60}
+DJANGO_SERVER=${DJANGO_SERVER:-wsgi}
 ENABLE_TELEGRAM_BOT=${ENABLE_TELEGRAM_BOT:-true}
 
 echo "Applying database migrations..."
@@ -13,13 +14,20 @@ python backend/manage.py migrate --noinput
 echo "Collecting static files..."
 python backend/manage.py collectstatic --noinput
 
+if [[ "${DJANGO_SERVER,,}" == "asgi" ]]; then
+  echo "Starting gunicorn with uvicorn workers (ASGI)..."
+  server_args=(--worker-class uvicorn_worker.UvicornWorker backend.asgi:application)
+else
+  server_args=(backend.wsgi:application)
+fi
+
 gunicorn \
   --bind 0.0.0.0:8000 \
   --workers "$GUNICORN_WORKERS" \
   --timeout "$GUNICORN_TIMEOUT" \
   --access-logfile - \
   --error-logfile - \
-  backend.wsgi:application &
+  "${server_args[@]}" &
 gunicorn_pid=$!
 
 trap 'kill -TERM $gunicorn_pid 2>/dev/null || true' EXIT
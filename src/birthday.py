@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import html
+import logging
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from src import config
+from src.broadcast import RateLimiter, _send_message_with_retry
+
+logger = logging.getLogger(__name__)
+
+GREETING_TEMPLATE = (
+    "🎉 Поздравляем тебя с Днём Рождения, {name}! "
+    "Желаем счастья, здоровья и успехов! 🎂"
+)
+
+
+@dataclass(frozen=True)
+class BirthdayRecipient:
+    customer_id: int
+    telegram_id: int
+    full_name: str | None
+
+
+def greeting_text(full_name: str | None) -> str:
+    return GREETING_TEMPLATE.format(name=html.escape(full_name or "друг"))
+
+
+async def send_birthday_greetings(
+    today: date,
+    *,
+    bot_instance: Bot,
+    concurrency: int | None = None,
+    rate: float | None = None,
+    batch_size: int | None = None,
+) -> dict[str, int]:
+    """Поздравляет всех именинников ``today``; повторный запуск в тот же год никого не дублирует.
+
+    Получатели читаются страницами по id. Перед отправкой каждая страница
+    «забирается» вставкой BirthdayGreeting с уникальностью (customer, year):
+    отправляем только тем, чью запись вставил именно этот запуск. Записи без
+    отправки и без ошибки старше ``BIRTHDAY_LEASE_SECONDS`` (запуск упал между
+    захватом и записью результата) удаляются и забираются заново.
+    """
+    from asgiref.sync import sync_to_async
+    from django.utils import timezone
+    from main.models import BirthdayGreeting, CustomUser
+
+    run_id = uuid.uuid4()
+    batch_size = batch_size or config.BIRTHDAY_BATCH_SIZE
+    semaphore = asyncio.Semaphore(max(1, concurrency or config.BIRTHDAY_CONCURRENCY))
+    limiter = RateLimiter(rate if rate is not None else config.BIRTHDAY_RATE_PER_SECOND)
+    stats: Counter[str] = Counter()
+
+    @sync_to_async(thread_sensitive=True)
+    def fetch_page(after_id: int) -> List[BirthdayRecipient]:
+        rows = (
+            CustomUser.objects.filter(
+                birth_date__month=today.month,
+                birth_date__day=today.day,
+                telegram_id__gt=0,
+                id__gt=after_id,
+            )
+            .order_by("id")
+            .values_list("id", "telegram_id", "full_name")[:batch_size]
+        )
+        return [BirthdayRecipient(*row) for row in rows]
+
+    @sync_to_async(thread_sensitive=True)
+    def claim(page: List[BirthdayRecipient]) -> set[int]:
+        expired = timezone.now() - timedelta(seconds=config.BIRTHDAY_LEASE_SECONDS)
+        BirthdayGreeting.objects.filter(
+            customer_id__in=[r.customer_id for r in page],
+            year=today.year,
+            sent_at__isnull=True,
+            error="",
+            created_at__lt=expired,
+        ).delete()
+        BirthdayGreeting.objects.bulk_create(
+            [
+                BirthdayGreeting(customer_id=r.customer_id, year=today.year, run_id=run_id)
+                for r in page
+            ],
+            ignore_conflicts=True,
+        )
+        return set(
+            BirthdayGreeting.objects.filter(
+                run_id=run_id, customer_id__in=[r.customer_id for r in page]
+            ).values_list("customer_id", flat=True)
+        )
+
+    @sync_to_async(thread_sensitive=True)
+    def record(results: list[tuple[BirthdayRecipient, object, str | None]]):
+        now = timezone.now()
+        sent, blocked, failed = [], [], []
+        for recipient, message, error in results:
+            if message is not None:
+                sent.append((recipient.customer_id, message.message_id))
+            elif error == "forbidden":
+                blocked.append(recipient.customer_id)
+            else:
+                failed.append(recipient.customer_id)
+
+        claims = BirthdayGreeting.objects.filter(run_id=run_id)
+        greetings = list(claims.filter(customer_id__in=[cid for cid, _ in sent]))
+        message_ids = dict(sent)
+        for greeting in greetings:
+            greeting.telegram_message_id = message_ids[greeting.customer_id]
+            greeting.sent_at = now
+        BirthdayGreeting.objects.bulk_update(greetings, ["telegram_message_id", "sent_at"])
+        # Заблокировавшим бота повторно не пишем; остальные ошибки — освобождаем
+        # запись, чтобы следующий запуск попробовал ещё раз.
+        claims.filter(customer_id__in=blocked).update(error="forbidden")
+        claims.filter(customer_id__in=failed).delete()
+
+    async def send_one(recipient: BirthdayRecipient):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                message = await _send_message_with_retry(
+                    bot_instance, recipient.telegram_id, greeting_text(recipient.full_name), None
+                )
+            except TelegramForbiddenError:
+                return recipient, None, "forbidden"
+            except Exception as exc:
+                logger.warning(
+                    "Birthday greeting to %s failed: %s", recipient.telegram_id, exc
+                )
+                return recipient, None, "error"
+            return recipient, message, None
+
+    last_id = 0
+    while True:
+        page = await fetch_page(last_id)
+        if not page:
+            break
+        last_id = page[-1].customer_id
+
+        claimed = await claim(page)
+        stats["skipped"] += len(page) - len(claimed)
+        results = await asyncio.gather(
+            *(send_one(r) for r in page if r.customer_id in claimed)
+        )
+        await record(results)
+        for _, message, error in results:
+            stats["sent" if message is not None else error] += 1
+
+    logger.info(
+        "Birthday greetings for %s: sent=%s skipped=%s forbidden=%s errors=%s",
+        today.isoformat(),
+        stats["sent"],
+        stats["skipped"],
+        stats["forbidden"],
+        stats["error"],
+    )
+    return dict(stats)
+
+
+__all__ = ["greeting_text", "send_birthday_greetings"]
@@ -27,6 +27,7 @@ from src.database.models import (
     CustomUser,
     NewsletterDelivery,
 )
+from src.metrics import RETRY_AFTER_SECONDS, SEND_FAILED, SEND_FORBIDDEN, SEND_SENT
 
 load_dotenv()
 
@@ -98,6 +99,25 @@ def parse_target_user_ids(raw_value: str | None) -> List[int]:
     return result
 
 
+class RateLimiter:
+    """Равномерно распределяет отправки: не больше ``rate`` в секунду."""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self._interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(loop.time(), self._next) + self._interval
+
+
 def _chunked(sequence: Sequence[Recipient], size: int) -> Iterable[Sequence[Recipient]]:
     for index in range(0, len(sequence), size):
         yield sequence[index : index + size]
@@ -108,11 +128,13 @@ async def _send_message_with_retry(bot_instance: Bot, chat_id: int, text: str, r
     while True:
         attempts += 1
         try:
-            return await bot_instance.send_message(chat_id, text, reply_markup=reply_markup)
+            sent = await bot_instance.send_message(chat_id, text, reply_markup=reply_markup)
         except TelegramForbiddenError as exc:
+            SEND_FORBIDDEN.inc()
             logger.warning("Telegram forbids sending to %s: %s", chat_id, exc)
             raise
         except TelegramRetryAfter as exc:
+            RETRY_AFTER_SECONDS.observe(exc.retry_after)
             logger.warning(
                 "Rate limited when sending to %s; retrying in %s seconds (attempt %s)",
                 chat_id,
@@ -122,6 +144,7 @@ async def _send_message_with_retry(bot_instance: Bot, chat_id: int, text: str, r
             await asyncio.sleep(exc.retry_after)
         except (TelegramNetworkError, TelegramAPIError, asyncio.TimeoutError) as exc:
             if attempts >= 3:
+                SEND_FAILED.inc()
                 logger.error("Giving up sending to %s after %s attempts: %s", chat_id, attempts, exc)
                 raise
             delay = min(5, 2 ** attempts)
@@ -132,6 +155,9 @@ async def _send_message_with_retry(bot_instance: Bot, chat_id: int, text: str, r
                 delay,
             )
             await asyncio.sleep(delay)
+        else:
+            SEND_SENT.inc()
+            return sent
 
 
 async def _send_with_sqlalchemy(message_id: int, bot_instance: Bot) -> None:
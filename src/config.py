@@ -3,9 +3,60 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 # TOKEN
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
 # 1C integration
 ONEC_CUSTOMER_URL = os.getenv("ONEC_CUSTOMER_URL")
 ONEC_API_KEY = os.getenv("INTEGRATION_API_KEY")
+ONEC_TIMEOUT = _env_float("ONEC_TIMEOUT", 10.0)
+ONEC_POOL_SIZE = _env_int("ONEC_POOL_SIZE", 10)
+ONEC_KEEPALIVE_TIMEOUT = _env_float("ONEC_KEEPALIVE_TIMEOUT", 60.0)
+ONEC_OUTBOX_WORKERS = _env_int("ONEC_OUTBOX_WORKERS", 2)
+ONEC_OUTBOX_MAX_ATTEMPTS = _env_int("ONEC_OUTBOX_MAX_ATTEMPTS", 8)
+ONEC_OUTBOX_POLL_SECONDS = _env_float("ONEC_OUTBOX_POLL_SECONDS", 5.0)
+ONEC_OUTBOX_LEASE_SECONDS = _env_float("ONEC_OUTBOX_LEASE_SECONDS", 300.0)
+
+# Birthday greetings
+BIRTHDAY_CONCURRENCY = _env_int("BIRTHDAY_CONCURRENCY", 8)
+BIRTHDAY_RATE_PER_SECOND = _env_float("BIRTHDAY_RATE_PER_SECOND", 25.0)
+BIRTHDAY_BATCH_SIZE = _env_int("BIRTHDAY_BATCH_SIZE", 500)
+BIRTHDAY_RETRIES = _env_int("BIRTHDAY_RETRIES", 3)
+BIRTHDAY_RETRY_SECONDS = _env_int("BIRTHDAY_RETRY_SECONDS", 900)
+BIRTHDAY_LEASE_SECONDS = _env_int("BIRTHDAY_LEASE_SECONDS", 600)
+
+# Batched /api/send-message/batch/ jobs
+MESSAGE_JOB_CONCURRENCY = _env_int("MESSAGE_JOB_CONCURRENCY", 8)
+MESSAGE_JOB_RATE_PER_SECOND = _env_float("MESSAGE_JOB_RATE_PER_SECOND", 25.0)
+MESSAGE_JOB_BATCH_SIZE = _env_int("MESSAGE_JOB_BATCH_SIZE", 500)
+MESSAGE_JOB_LEASE_SECONDS = _env_int("MESSAGE_JOB_LEASE_SECONDS", 600)
+
+# QR codes
+# Сколько последних отрендеренных PNG держать в памяти процесса.
+QR_CACHE_SIZE = _env_int("QR_CACHE_SIZE", 1024)
+# Рендер (Reed-Solomon + PIL) выполняется вне event loop бота в ограниченном пуле.
+QR_RENDER_WORKERS = _env_int("QR_RENDER_WORKERS", 2)
+
+# Event-loop lag monitoring
+LOOP_LAG_INTERVAL = _env_float("LOOP_LAG_INTERVAL", 1.0)
+LOOP_LAG_WARN_SECONDS = _env_float("LOOP_LAG_WARN_SECONDS", 0.25)
+
+# Prometheus metrics
+BOT_METRICS_PORT = _env_int("BOT_METRICS_PORT", 9108)
+BOT_METRICS_ADDR = os.getenv("BOT_METRICS_ADDR", "0.0.0.0")
+METRICS_PUSHGATEWAY_URL = os.getenv("METRICS_PUSHGATEWAY_URL", "")
@@ -20,6 +20,7 @@ from sqlalchemy import (
     Text,
     Time,
     UniqueConstraint,
+    func,
     select,
 )
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -142,6 +143,7 @@ class CustomUser(Base):
     birth_date = Column(DateTime, nullable=True)
     registration_date = Column(DateTime, default=datetime.utcnow)
     qr_code = Column(String, nullable=True)
+    qr_file_id = Column(String(255), nullable=True)
     bonuses = Column(Numeric(10, 2), default=0.0)
     referrer_id = Column(BigInteger, ForeignKey("customers.telegram_id"), nullable=True)
     referrals = relationship("CustomUser", backref="referrer", remote_side=[telegram_id])
@@ -281,6 +283,20 @@ class OneCClientMap(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class OneCCustomerOutbox(Base):
+    """Mirror of ``api.OneCCustomerOutbox``; the schema is owned by Django."""
+
+    __tablename__ = "api_onec_customer_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
+    referrer_id = Column(BigInteger, nullable=True)
+    status = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
+
+
 async def get_onec_guid_by_user_id(session: AsyncSession, user_id: int):
     result = await session.execute(
         select(OneCClientMap.one_c_guid).where(OneCClientMap.user_id == user_id)
@@ -0,0 +1,46 @@
+"""Event-loop lag monitoring for the Telegram bot process."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable
+
+try:
+    from src import config
+except ImportError:  # бот запускается из src/ как run.py
+    import config
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_INTERVAL = config.LOOP_LAG_INTERVAL
+LOOP_LAG_WARN_SECONDS = config.LOOP_LAG_WARN_SECONDS
+
+last_lag: float = 0.0
+
+
+async def monitor_event_loop_lag(
+    *,
+    interval: float = LOOP_LAG_INTERVAL,
+    warn_threshold: float = LOOP_LAG_WARN_SECONDS,
+    on_sample: Callable[[float], None] | None = None,
+) -> None:
+    """Periodically measure how late ``asyncio.sleep`` wakes up.
+
+    Any delay beyond ``interval`` is time the loop spent running blocking code
+    instead of handling other users' updates.
+    """
+
+    global last_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        last_lag = lag
+        if on_sample is not None:
+            on_sample(lag)
+        if lag >= warn_threshold:
+            logger.warning(
+                "Event loop lag %.3fs exceeds %.3fs", lag, warn_threshold
+            )
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from typing import List, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from src import config
+from src.broadcast import RateLimiter, _send_message_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+async def send_message_job(
+    job_id,
+    *,
+    bot_instance: Bot,
+    concurrency: int | None = None,
+    rate: float | None = None,
+    batch_size: int | None = None,
+) -> dict[str, int]:
+    """Рассылает текст задания всем ожидающим получателям и сохраняет результат по каждому.
+
+    Перед отправкой каждая страница «забирается»: получатели переводятся из
+    ``pending`` в ``sending`` под ``select_for_update(skip_locked=True)``, так что
+    два воркера одного задания никогда не пишут одному человеку. Получатели,
+    застрявшие в ``sending`` дольше ``MESSAGE_JOB_LEASE_SECONDS`` (воркер упал
+    между отправкой и записью результата), забираются снова.
+    """
+    from datetime import timedelta
+
+    from asgiref.sync import sync_to_async
+    from django.db import transaction
+    from django.db.models import Q
+    from django.utils import timezone
+    from api.models import MessageJob, MessageJobRecipient
+
+    batch_size = batch_size or config.MESSAGE_JOB_BATCH_SIZE
+    semaphore = asyncio.Semaphore(max(1, concurrency or config.MESSAGE_JOB_CONCURRENCY))
+    limiter = RateLimiter(rate if rate is not None else config.MESSAGE_JOB_RATE_PER_SECOND)
+    stats: Counter[str] = Counter()
+
+    @sync_to_async(thread_sensitive=True)
+    def start() -> str | None:
+        job = MessageJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return None
+        MessageJob.objects.filter(pk=job_id).update(status=MessageJob.STATUS_RUNNING)
+        return job.text
+
+    @sync_to_async(thread_sensitive=True)
+    def claim_page() -> List[Tuple[int, int]]:
+        now = timezone.now()
+        expired = now - timedelta(seconds=config.MESSAGE_JOB_LEASE_SECONDS)
+        with transaction.atomic():
+            page = list(
+                MessageJobRecipient.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=MessageJobRecipient.STATUS_PENDING)
+                    | Q(status=MessageJobRecipient.STATUS_SENDING, claimed_at__lt=expired),
+                    job_id=job_id,
+                )
+                .order_by("id")
+                .values_list("id", "telegram_id")[:batch_size]
+            )
+            MessageJobRecipient.objects.filter(id__in=[rid for rid, _ in page]).update(
+                status=MessageJobRecipient.STATUS_SENDING, claimed_at=now
+            )
+        return page
+
+    @sync_to_async(thread_sensitive=True)
+    def record(results):
+        now = timezone.now()
+        rows = []
+        for recipient_id, status, message_id, error in results:
+            rows.append(
+                MessageJobRecipient(
+                    id=recipient_id,
+                    status=status,
+                    telegram_message_id=message_id,
+                    error=error[:255],
+                    sent_at=now if status == MessageJobRecipient.STATUS_SENT else None,
+                )
+            )
+        MessageJobRecipient.objects.bulk_update(
+            rows, ["status", "telegram_message_id", "error", "sent_at"]
+        )
+
+    @sync_to_async(thread_sensitive=True)
+    def finish():
+        # Задание завершено, только когда не осталось ни ожидающих, ни забранных
+        # другим воркером получателей.
+        open_statuses = [MessageJobRecipient.STATUS_PENDING, MessageJobRecipient.STATUS_SENDING]
+        if MessageJobRecipient.objects.filter(job_id=job_id, status__in=open_statuses).exists():
+            return
+        MessageJob.objects.filter(pk=job_id).update(
+            status=MessageJob.STATUS_DONE, finished_at=timezone.now()
+        )
+
+    text = await start()
+    if text is None:
+        logger.warning("Message job %s not found", job_id)
+        return {}
+
+    async def send_one(recipient_id: int, telegram_id: int):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                message = await _send_message_with_retry(bot_instance, telegram_id, text, None)
+            except TelegramForbiddenError as exc:
+                return recipient_id, MessageJobRecipient.STATUS_FORBIDDEN, None, str(exc)
+            except Exception as exc:
+                logger.warning("Message job %s: send to %s failed: %s", job_id, telegram_id, exc)
+                return recipient_id, MessageJobRecipient.STATUS_FAILED, None, str(exc)
+            return recipient_id, MessageJobRecipient.STATUS_SENT, message.message_id, ""
+
+    while True:
+        page = await claim_page()
+        if not page:
+            break
+        results = await asyncio.gather(*(send_one(rid, tid) for rid, tid in page))
+        await record(results)
+        stats.update(status for _, status, _, _ in results)
+
+    await finish()
+    logger.info(
+        "Message job %s completed: sent=%s forbidden=%s failed=%s",
+        job_id,
+        stats["sent"],
+        stats["forbidden"],
+        stats["failed"],
+    )
+    return dict(stats)
+
+
+__all__ = ["send_message_job"]
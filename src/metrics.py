@@ -0,0 +1,222 @@
+"""Prometheus metrics for the Telegram bot process and the Celery senders.
+
+The bot serves them over HTTP on ``BOT_METRICS_PORT`` (``start_metrics_server``).
+Celery workers have no server of their own: after each sending task they push
+the same metrics to a Pushgateway (``push_metrics``) when
+``METRICS_PUSHGATEWAY_URL`` is set. A worker process deletes its group when it
+shuts down (``delete_pushed_metrics``).
+
+The metrics use a separate ``REGISTRY``. ``run.py`` imports this module as
+``metrics`` and the Celery tasks import it as ``src.metrics``. With a
+separate registry the two copies do not collide, and bot metrics stay out of
+Django's ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import logging
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    ProcessCollector,
+    delete_from_gateway,
+    push_to_gateway,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+try:
+    from src import config
+except ImportError:  # бот запускается из src/ как run.py
+    import config
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = config.BOT_METRICS_PORT
+METRICS_ADDR = config.BOT_METRICS_ADDR
+PUSHGATEWAY_URL = config.METRICS_PUSHGATEWAY_URL
+
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds",
+    "Time to handle an update, per aiogram handler",
+    ["handler"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    registry=REGISTRY,
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors",
+    "Updates whose handler raised an exception",
+    ["handler"],
+    registry=REGISTRY,
+)
+LOOP_LAG_SECONDS = Histogram(
+    "bot_event_loop_lag_seconds",
+    "How late the event loop wakes up from asyncio.sleep (see loop_monitor)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    registry=REGISTRY,
+)
+TELEGRAM_SENDS = Counter(
+    "bot_telegram_sends",
+    "Messages sent by broadcasts, birthday greetings and message jobs",
+    ["result"],
+    registry=REGISTRY,
+)
+RETRY_AFTER_SECONDS = Histogram(
+    "bot_telegram_retry_after_seconds",
+    "Waits requested by Telegram flood control (RetryAfter)",
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300),
+    registry=REGISTRY,
+)
+NEWSLETTER_OPENS = Counter(
+    "bot_newsletter_open_callbacks",
+    "Presses of the newsletter 'Показать' button",
+    ["result"],
+    registry=REGISTRY,
+)
+
+SEND_SENT = TELEGRAM_SENDS.labels("sent")
+SEND_FORBIDDEN = TELEGRAM_SENDS.labels("forbidden")
+SEND_FAILED = TELEGRAM_SENDS.labels("failed")
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: time each handled update under the handler's function name."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def instrument_dispatcher(dispatcher) -> None:
+    middleware = HandlerMetricsMiddleware()
+    dispatcher.message.middleware(middleware)
+    dispatcher.callback_query.middleware(middleware)
+
+
+class DbPoolCollector:
+    """Read the SQLAlchemy (asyncpg) pool counters at scrape time."""
+
+    def __init__(self, engine):
+        self._engine = engine
+
+    def collect(self):
+        pool = getattr(self._engine, "pool", None)
+        if pool is None or not hasattr(pool, "checkedout"):
+            return
+        connections = GaugeMetricFamily(
+            "bot_db_pool_connections",
+            "Pool connections: checked out by sessions and idle in the pool",
+            labels=["state"],
+        )
+        connections.add_metric(["checked_out"], pool.checkedout())
+        connections.add_metric(["idle"], pool.checkedin())
+        yield connections
+        yield GaugeMetricFamily("bot_db_pool_size", "SQLALCHEMY_POOL_SIZE", value=pool.size())
+        yield GaugeMetricFamily(
+            "bot_db_pool_overflow",
+            "Connections opened above pool_size (up to SQLALCHEMY_MAX_OVERFLOW)",
+            value=max(0, pool.overflow()),
+        )
+
+
+def start_metrics_server(engine=None, *, port: int = METRICS_PORT, addr: str = METRICS_ADDR):
+    """Serve ``REGISTRY`` from a background thread; ``port <= 0`` disables it."""
+
+    if engine is not None:
+        REGISTRY.register(DbPoolCollector(engine))
+    if port <= 0:
+        logger.info("Bot metrics server is disabled")
+        return
+    start_http_server(port, addr=addr, registry=REGISTRY)
+    logger.info("Bot metrics are served on %s:%s", addr, port)
+
+
+def _grouping_key() -> dict[str, str]:
+    """``instance`` is the host plus the prefork pool index of this process.
+
+    A replaced child reuses the index of the one it replaces, so the number of
+    groups stays at hosts x concurrency instead of growing with every pid.
+    """
+
+    try:
+        from billiard.process import current_process
+    except ImportError:  # pragma: no cover - bot process without Celery
+        index = None
+    else:
+        index = getattr(current_process(), "index", None)
+    return {"instance": f"{socket.gethostname()}-{'main' if index is None else index}"}
+
+
+def push_metrics(job: str = "celery") -> None:
+    """Push this process's metrics to the Pushgateway, if one is configured.
+
+    Each worker process pushes its own cumulative counters under its own
+    ``instance``, so pushes from prefork children do not overwrite each other.
+    """
+
+    if not PUSHGATEWAY_URL:
+        return
+    try:
+        push_to_gateway(
+            PUSHGATEWAY_URL,
+            job=job,
+            registry=REGISTRY,
+            grouping_key=_grouping_key(),
+            timeout=5,
+        )
+    except OSError as exc:
+        logger.warning("Failed to push metrics to %s: %s", PUSHGATEWAY_URL, exc)
+
+
+def delete_pushed_metrics(job: str = "celery") -> None:
+    """Remove this process's group from the Pushgateway; called on worker shutdown."""
+
+    if not PUSHGATEWAY_URL:
+        return
+    try:
+        delete_from_gateway(PUSHGATEWAY_URL, job=job, grouping_key=_grouping_key(), timeout=5)
+    except OSError as exc:
+        logger.warning("Failed to delete metrics from %s: %s", PUSHGATEWAY_URL, exc)
+
+
+__all__ = [
+    "DbPoolCollector",
+    "HANDLER_ERRORS",
+    "HANDLER_SECONDS",
+    "HandlerMetricsMiddleware",
+    "LOOP_LAG_SECONDS",
+    "NEWSLETTER_OPENS",
+    "REGISTRY",
+    "RETRY_AFTER_SECONDS",
+    "SEND_FAILED",
+    "SEND_FORBIDDEN",
+    "SEND_SENT",
+    "TELEGRAM_SENDS",
+    "delete_pushed_metrics",
+    "instrument_dispatcher",
+    "push_metrics",
+    "start_metrics_server",
+]
@@ -1,27 +1,69 @@
 import aiohttp
+import asyncio
 import json
 import logging
 import uuid
-from datetime import timezone
+from dataclasses import dataclass
+from datetime import timedelta, timezone
+
+from sqlalchemy import delete, func, select, update
 
 import config
-from database.models import upsert_onec_client_map
+from database.models import (
+    CustomUser,
+    OneCCustomerOutbox,
+    SessionLocal,
+    upsert_onec_client_map,
+)
 
+# Пространство имён для стабильных ключей идемпотентности клиентов в 1С.
+ONEC_CUSTOMER_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "lakshmi-bot/onec/customer")
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
 
-async def send_customer_to_onec(session, user, referrer_id=None):
-    """
-    Отправляет данные клиента в 1С (или в ваш Django-/proxy-эндпоинт).
-    Требуются переменные окружения:
-      - ONEC_CUSTOMER_URL
-      - INTEGRATION_API_KEY
-    Заголовки: X-Api-Key, X-Idempotency-Key
-    """
-    if not config.ONEC_CUSTOMER_URL or not config.ONEC_API_KEY:
-        logging.info(
-            "Skipping 1C customer sync: ONEC_CUSTOMER_URL/ONEC_API_KEY not configured"
-        )
-        return
 
+def customer_idempotency_key(telegram_id: int) -> str:
+    """Один и тот же ключ для всех повторных отправок одного клиента."""
+    return str(uuid.uuid5(ONEC_CUSTOMER_NAMESPACE, str(int(telegram_id))))
+
+
+class OneCClient:
+    """Долгоживущая HTTP-сессия к 1С: пул соединений, keep-alive и таймауты."""
+
+    def __init__(
+        self,
+        *,
+        pool_size: int | None = None,
+        timeout: float | None = None,
+        keepalive_timeout: float | None = None,
+    ):
+        self._pool_size = pool_size or config.ONEC_POOL_SIZE
+        self._timeout = timeout or config.ONEC_TIMEOUT
+        self._keepalive_timeout = keepalive_timeout or config.ONEC_KEEPALIVE_TIMEOUT
+        self._session: aiohttp.ClientSession | None = None
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_size,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+onec_client = OneCClient()
+
+
+def _build_customer_payload(user, referrer_id=None) -> dict:
     # Готовим payload (created_at в UTC ISO-8601)
     reg_dt = user.registration_date
     if getattr(reg_dt, "tzinfo", None) is None:
@@ -43,59 +85,265 @@ async def send_customer_to_onec(session, user, referrer_id=None):
 
     if referrer_id is not None:
         payload["referrer_telegram_id"] = referrer_id
+    return payload
+
+
+async def send_customer_to_onec(session, user, referrer_id=None, *, client: OneCClient | None = None) -> bool:
+    """
+    Отправляет данные клиента в 1С (или в ваш Django-/proxy-эндпоинт).
+    Требуются переменные окружения:
+      - ONEC_CUSTOMER_URL
+      - INTEGRATION_API_KEY
+    Заголовки: X-Api-Key, X-Idempotency-Key
 
-    body = json.dumps(payload, ensure_ascii=False)
+    Возвращает False, если ошибка временная (сеть, таймаут, 429/5xx) и отправку
+    стоит повторить; True — если повторять не нужно.
+    """
+    if not config.ONEC_CUSTOMER_URL or not config.ONEC_API_KEY:
+        logging.info(
+            "Skipping 1C customer sync: ONEC_CUSTOMER_URL/ONEC_API_KEY not configured"
+        )
+        return True
+
+    body = json.dumps(_build_customer_payload(user, referrer_id), ensure_ascii=False)
 
     headers = {
         "Content-Type": "application/json",
         "X-Api-Key": config.ONEC_API_KEY,
-        "X-Idempotency-Key": str(uuid.uuid4()),
+        "X-Idempotency-Key": customer_idempotency_key(user.telegram_id),
     }
 
+    client = client or onec_client
     try:
-        async with aiohttp.ClientSession() as client:
-            async with client.post(config.ONEC_CUSTOMER_URL, data=body, headers=headers) as resp:
-                text = await resp.text()
-                if resp.status == 200:
-                    # Ответ может быть как {"one_c_guid": "...", "bonus_balance": ...}
-                    # так и {"status":"ok","customer":{...}} — поддержим оба.
-                    try:
-                        data = json.loads(text)
-                    except Exception:
-                        logging.error("1C registration: invalid JSON response: %s", text)
-                        return
-
-                    customer_block = data.get("customer") or {}
-                    guid = data.get("one_c_guid") or customer_block.get("one_c_guid")
-                    bonus = data.get("bonus_balance")
-                    if bonus is None:
-                        bonus = customer_block.get("bonus_balance")
-
-                    if guid:
-                        # Сохраняем соответствие user.id <-> GUID в маппинге
-                        await upsert_onec_client_map(session, user.id, guid)
-
-                    if bonus is not None:
-                        # Обновим баланс в нашей БД
-                        try:
-                            user.bonuses = bonus
-                            session.add(user)
-                            await session.commit()
-                            refresh = getattr(session, "refresh", None)
-                            if callable(refresh):
-                                await refresh(user)
-                        except Exception as e:
-                            logging.warning("Failed to update bonuses locally: %s", e)
-                            rollback = getattr(session, "rollback", None)
-                            if callable(rollback):
-                                try:
-                                    await rollback()
-                                except Exception:
-                                    logging.exception("Failed to rollback bonuses update")
-
-                    logging.info("1C registration OK for tg=%s", user.telegram_id)
-                else:
-                    logging.error("1C registration failed: %s", text)
+        async with client.session().post(config.ONEC_CUSTOMER_URL, data=body, headers=headers) as resp:
+            text = await resp.text()
+            status = resp.status
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        logging.warning("1C registration: transport error for tg=%s: %r", user.telegram_id, exc)
+        return False
     except Exception:
         logging.exception("Failed to send customer data to 1C")
+        return False
+
+    if status == 429 or status >= 500:
+        logging.warning("1C registration: temporary failure %s: %s", status, text)
+        return False
+    if status != 200:
+        logging.error("1C registration failed: %s", text)
+        return True
+
+    # Ответ может быть как {"one_c_guid": "...", "bonus_balance": ...}
+    # так и {"status":"ok","customer":{...}} — поддержим оба.
+    try:
+        data = json.loads(text)
+    except Exception:
+        logging.error("1C registration: invalid JSON response: %s", text)
+        return True
+
+    customer_block = data.get("customer") or {}
+    guid = data.get("one_c_guid") or customer_block.get("one_c_guid")
+    bonus = data.get("bonus_balance")
+    if bonus is None:
+        bonus = customer_block.get("bonus_balance")
+
+    if guid:
+        # Сохраняем соответствие user.id <-> GUID в маппинге
+        await upsert_onec_client_map(session, user.id, guid)
+
+    if bonus is not None:
+        # Обновим баланс в нашей БД
+        try:
+            user.bonuses = bonus
+            session.add(user)
+            await session.commit()
+            refresh = getattr(session, "refresh", None)
+            if callable(refresh):
+                await refresh(user)
+        except Exception as e:
+            logging.warning("Failed to update bonuses locally: %s", e)
+            rollback = getattr(session, "rollback", None)
+            if callable(rollback):
+                try:
+                    await rollback()
+                except Exception:
+                    logging.exception("Failed to rollback bonuses update")
+
+    logging.info("1C registration OK for tg=%s", user.telegram_id)
+    return True
+
+
+@dataclass(frozen=True)
+class CustomerSyncJob:
+    id: int
+    user_id: int
+    referrer_id: int | None = None
+    attempt: int = 0
+
+
+class OutboxStore:
+    """Строки таблицы api_onec_customer_outbox, общие для всех процессов бота."""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+
+    def _session(self):
+        return (self._session_factory or SessionLocal)()
+
+    async def add(self, session, user_id: int, referrer_id: int | None):
+        session.add(OneCCustomerOutbox(user_id=user_id, referrer_id=referrer_id))
+        await session.commit()
+
+    async def claim(self, lease: float) -> CustomerSyncJob | None:
+        """Забирает одну готовую к отправке строку и продлевает её на ``lease`` секунд.
+
+        Если процесс упадёт до записи результата, строку после аренды заберёт
+        любой другой воркер.
+        """
+        async with self._session() as session:
+            row = (
+                await session.execute(
+                    select(OneCCustomerOutbox)
+                    .where(
+                        OneCCustomerOutbox.status == "pending",
+                        OneCCustomerOutbox.next_attempt_at <= func.now(),
+                    )
+                    .order_by(OneCCustomerOutbox.next_attempt_at, OneCCustomerOutbox.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+            ).scalar_one_or_none()
+            if row is None:
+                return None
+            job = CustomerSyncJob(row.id, row.user_id, row.referrer_id, row.attempts)
+            row.next_attempt_at = func.now() + timedelta(seconds=lease)
+            await session.commit()
+            return job
+
+    async def done(self, job: CustomerSyncJob):
+        async with self._session() as session:
+            await session.execute(delete(OneCCustomerOutbox).where(OneCCustomerOutbox.id == job.id))
+            await session.commit()
+
+    async def retry(self, job: CustomerSyncJob, attempts: int, delay: float):
+        await self._update(
+            job, attempts=attempts, next_attempt_at=func.now() + timedelta(seconds=delay)
+        )
+
+    async def give_up(self, job: CustomerSyncJob, attempts: int):
+        await self._update(job, attempts=attempts, status="failed")
+
+    async def _update(self, job: CustomerSyncJob, **values):
+        async with self._session() as session:
+            await session.execute(
+                update(OneCCustomerOutbox).where(OneCCustomerOutbox.id == job.id).values(**values)
+            )
+            await session.commit()
+
+
+class CustomerOutbox:
+    """Регистрации для 1С, которые фоновые воркеры отправляют с ретраями.
+
+    Задачи хранятся в таблице api_onec_customer_outbox, а не в памяти, поэтому
+    переживают перезапуск бота: после старта воркеры продолжают с того места,
+    где остановились.
+    """
+
+    def __init__(
+        self,
+        client: OneCClient,
+        session_factory=None,
+        *,
+        store: OutboxStore | None = None,
+        workers: int | None = None,
+        max_attempts: int | None = None,
+        poll_interval: float | None = None,
+        lease: float | None = None,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+    ):
+        self._client = client
+        self._session_factory = session_factory
+        self._store = store or OutboxStore(session_factory)
+        self._workers_count = workers or config.ONEC_OUTBOX_WORKERS
+        self._max_attempts = max_attempts or config.ONEC_OUTBOX_MAX_ATTEMPTS
+        self._poll_interval = poll_interval or config.ONEC_OUTBOX_POLL_SECONDS
+        self._lease = lease or config.ONEC_OUTBOX_LEASE_SECONDS
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._wakeup: asyncio.Event | None = None
+        self._workers: list[asyncio.Task] = []
+
+    def _get_wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    async def enqueue(self, session, user_id: int, referrer_id: int | None = None):
+        """Сохраняет задачу в ``session`` и будит воркеры."""
+        await self._store.add(session, user_id, referrer_id)
+        self._get_wakeup().set()
+
+    def start(self):
+        for index in range(max(1, self._workers_count)):
+            self._workers.append(
+                asyncio.create_task(self._worker(), name=f"onec-outbox-{index}")
+            )
+
+    async def stop(self):
+        # Незавершённые задачи остаются в таблице и будут отправлены после перезапуска
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        await self._client.close()
+
+    async def _worker(self):
+        wakeup = self._get_wakeup()
+        while True:
+            wakeup.clear()
+            try:
+                job = await self._store.claim(self._lease)
+            except Exception:
+                logging.exception("1C outbox: failed to claim a job")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(job)
+            except Exception:
+                logging.exception("1C outbox: unexpected error for user %s", job.user_id)
+
+    async def process(self, job: CustomerSyncJob):
+        session_factory = self._session_factory or SessionLocal
+        async with session_factory() as session:
+            user = await session.get(CustomUser, job.user_id)
+            if user is None:
+                logging.warning("1C outbox: user %s no longer exists", job.user_id)
+                await self._store.done(job)
+                return
+            done = await send_customer_to_onec(
+                session, user, job.referrer_id, client=self._client
+            )
+
+        if done:
+            await self._store.done(job)
+            return
+        attempt = job.attempt + 1
+        if attempt >= self._max_attempts:
+            logging.error(
+                "1C outbox: giving up on user %s after %s attempts", job.user_id, attempt
+            )
+            await self._store.give_up(job, attempt)
+            return
+        delay = min(self._max_delay, self._base_delay * 2 ** job.attempt)
+        logging.info(
+            "1C outbox: retrying user %s in %.1fs (attempt %s)", job.user_id, delay, attempt + 1
+        )
+        await self._store.retry(job, attempt, delay)
+
 
+customer_outbox = CustomerOutbox(onec_client)
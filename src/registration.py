@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from database.models import CustomUser
-from qr_code import generate_qr_code
+from qr_code import qr_code_url
 
 
 class UserRegistration:
@@ -28,7 +28,7 @@ class UserRegistration:
         referrer_id: int | None = None,
         personal_data_consent: bool = False,
     ) -> CustomUser:
-        qr_code = generate_qr_code(telegram_id, telegram_id=telegram_id)
+        qr_code = qr_code_url(telegram_id)
 
         user = CustomUser(
             telegram_id=telegram_id,
@@ -5,7 +5,7 @@ from datetime import datetime
 
 from aiogram import Bot, Dispatcher
 from aiogram.filters import CommandStart
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
@@ -19,7 +19,7 @@ from dotenv import load_dotenv
 
 import config
 from registration import UserRegistration
-from onec_client import send_customer_to_onec
+from onec_client import customer_outbox
 from keyboards import get_qr_code_button, get_consent_button
 from database.models import (
     SessionLocal,
@@ -27,11 +27,19 @@ from database.models import (
     CustomUser,
     NewsletterDelivery,
     NewsletterOpenEvent,
+    engine,
 )
 from qr_code import (
-    resolve_qr_code_path,
-    generate_qr_code,
     qr_code_filename,
+    qr_code_url,
+    render_qr_code_async,
+)
+from loop_monitor import monitor_event_loop_lag
+from metrics import (
+    LOOP_LAG_SECONDS,
+    NEWSLETTER_OPENS,
+    instrument_dispatcher,
+    start_metrics_server,
 )
 
 load_dotenv()
@@ -122,49 +130,59 @@ async def save_bot_activity(session, telegram_id: int, action: str):
         await session.commit()
 
 
-async def ensure_qr_code_path(session, user: CustomUser):
-    """Возвращает путь к файлу QR-кода, восстанавливая его при необходимости."""
+async def ensure_qr_code(session, user: CustomUser) -> str | None:
+    """Возвращает нормализованное значение QR-кода, исправляя устаревшее при необходимости."""
     if not user or not user.qr_code:
         return None
 
-    qr_code_value = str(user.qr_code).strip()
-    path = None
-    normalized_url = None
-
-    try:
-        path, normalized_url = resolve_qr_code_path(
-            qr_code_value, telegram_id=user.telegram_id
-        )
-    except ValueError:
-        logger.warning(
-            "Не удалось преобразовать значение QR-кода в путь (telegram_id=%s, value=%r)",
-            user.telegram_id,
-            qr_code_value,
-        )
-    else:
-        if path.exists():
-            if normalized_url and normalized_url != qr_code_value:
-                user.qr_code = normalized_url
-                session.add(user)
-                await session.commit()
-            return path
-        logger.warning(
-            "Файл QR-кода не найден на диске (telegram_id=%s, path=%s)",
+    normalized_url = qr_code_url(user.telegram_id)
+    if str(user.qr_code).strip() != normalized_url:
+        logger.info(
+            "Нормализуем значение QR-кода (telegram_id=%s, value=%r)",
             user.telegram_id,
-            path,
+            user.qr_code,
         )
-
-    data_for_qr = qr_code_value if qr_code_value and path is None else str(user.telegram_id)
-    filename = qr_code_filename(user.telegram_id)
-    new_qr_value = generate_qr_code(
-        data_for_qr, filename=filename, telegram_id=user.telegram_id
-    )
-    if user.qr_code != new_qr_value:
-        user.qr_code = new_qr_value
+        # Старое значение могло указывать на картинку с другим содержимым.
+        user.qr_code = normalized_url
+        user.qr_file_id = None
         session.add(user)
         await session.commit()
-    new_path, _ = resolve_qr_code_path(new_qr_value, telegram_id=user.telegram_id)
-    return new_path
+    return normalized_url
+
+
+async def _store_qr_file_id(session, user: CustomUser, file_id: str | None):
+    if user.qr_file_id == file_id:
+        return
+    user.qr_file_id = file_id
+    session.add(user)
+    await session.commit()
+
+
+async def send_qr_photo(session, message: Message, user: CustomUser) -> bool:
+    """Отправляет QR-код, переиспользуя file_id Telegram вместо повторной загрузки PNG."""
+    if user.qr_file_id:
+        try:
+            await message.answer_photo(user.qr_file_id)
+            return True
+        except TelegramBadRequest as exc:
+            logger.warning(
+                "Telegram отклонил сохранённый file_id QR-кода (telegram_id=%s): %s",
+                user.telegram_id,
+                exc,
+            )
+            await _store_qr_file_id(session, user, None)
+
+    if not await ensure_qr_code(session, user):
+        return False
+
+    photo = BufferedInputFile(
+        await render_qr_code_async(user.telegram_id),
+        filename=qr_code_filename(user.telegram_id),
+    )
+    sent = await message.answer_photo(photo)
+    if sent and sent.photo:
+        await _store_qr_file_id(session, user, sent.photo[-1].file_id)
+    return True
 
 
 @dp.message(CommandStart())
@@ -176,8 +194,7 @@ async def command_start_handler(message: Message, state: FSMContext):
 
         if user:
             text = "Привет!"
-            qr_path = await ensure_qr_code_path(session, user)
-            if qr_path and qr_path.exists():
+            if await ensure_qr_code(session, user):
                 await message.answer(text, reply_markup=get_qr_code_button())
                 return
             await message.answer(text)
@@ -233,18 +250,15 @@ async def consent_callback(callback: CallbackQuery, state: FSMContext):
             personal_data_consent=True,
         )
 
-        await send_customer_to_onec(session, user, data.get("referrer_id"))
+        # Синхронизация с 1С идёт в фоне и не задерживает ответ пользователю.
+        await customer_outbox.enqueue(session, user.id, data.get("referrer_id"))
 
     await callback.message.answer("Спасибо! Вы успешно зарегистрированы.")
     if user.qr_code:
-        qr_path, _ = resolve_qr_code_path(
-            user.qr_code, telegram_id=user.telegram_id
+        await callback.message.answer(
+            "Вот ваша кнопка для получения QR-кода:",
+            reply_markup=get_qr_code_button(),
         )
-        if qr_path.exists():
-            await callback.message.answer(
-                "Вот ваша кнопка для получения QR-кода:",
-                reply_markup=get_qr_code_button(),
-            )
     await state.clear()
     await callback.answer()
 
@@ -262,13 +276,9 @@ async def callback_handler(callback: CallbackQuery):
         await save_bot_activity(session, telegram_id=callback.from_user.id, action=callback.data)
 
         if callback.data == "show_qr":
-            qr_path = await ensure_qr_code_path(session, user)
-            if not qr_path or not qr_path.exists():
+            if not await send_qr_photo(session, callback.message, user):
                 await callback.message.answer("QR-код не найден. Пожалуйста, обратитесь в поддержку")
                 return await callback.answer()
-
-            photo = FSInputFile(str(qr_path))
-            await callback.message.answer_photo(photo)
 
         elif callback.data == "show_bonuses":
             await callback.message.answer(f"Ваши бонусы: {user.bonuses}")
@@ -286,11 +296,13 @@ async def callback_handler(callback: CallbackQuery):
 async def newsletter_open_callback(callback: CallbackQuery):
     data = callback.data or ""
     if len(data) > 64:
+        NEWSLETTER_OPENS.labels("invalid").inc()
         logger.warning("Received oversized callback payload: %s", data)
         return await callback.answer("Некорректный запрос", show_alert=True)
 
     token = data[len(OPEN_CALLBACK_PREFIX) :]
     if not TOKEN_RE.fullmatch(token):
+        NEWSLETTER_OPENS.labels("invalid").inc()
         logger.warning("Invalid newsletter token: %s", data)
         return await callback.answer("Некорректный токен", show_alert=True)
 
@@ -303,6 +315,7 @@ async def newsletter_open_callback(callback: CallbackQuery):
         )
 
     if not delivery:
+        NEWSLETTER_OPENS.labels("not_found").inc()
         logger.warning(
             "Newsletter delivery not found for token %s (user=%s)",
             token,
@@ -310,6 +323,7 @@ async def newsletter_open_callback(callback: CallbackQuery):
         )
         return await callback.answer("Сообщение не найдено", show_alert=True)
 
+    NEWSLETTER_OPENS.labels("opened" if newly_opened else "repeat").inc()
     if newly_opened:
         try:
             await callback.message.edit_text(delivery.message.message_text)
@@ -333,7 +347,17 @@ async def main():
         token=config.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    await dp.start_polling(bot)
+    instrument_dispatcher(dp)
+    start_metrics_server(engine)
+    lag_monitor = asyncio.create_task(
+        monitor_event_loop_lag(on_sample=LOOP_LAG_SECONDS.observe)
+    )
+    customer_outbox.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        lag_monitor.cancel()
+        await customer_outbox.stop()
 
 
 if __name__ == "__main__":
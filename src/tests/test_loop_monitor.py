@@ -0,0 +1,30 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import loop_monitor
+
+
+def test_blocking_call_is_reported_as_lag(caplog):
+    samples = []
+
+    async def run_test():
+        monitor = asyncio.create_task(
+            loop_monitor.monitor_event_loop_lag(
+                interval=0.01, warn_threshold=0.05, on_sample=samples.append
+            )
+        )
+        await asyncio.sleep(0)
+        time.sleep(0.1)  # имитируем синхронный рендер внутри event loop
+        await asyncio.sleep(0.05)
+        monitor.cancel()
+
+    with caplog.at_level("WARNING", logger="loop_monitor"):
+        asyncio.run(run_test())
+
+    assert max(samples) >= 0.05
+    assert loop_monitor.last_lag >= 0
+    assert any("Event loop lag" in record.message for record in caplog.records)
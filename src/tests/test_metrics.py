@@ -0,0 +1,140 @@
+import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+os.environ.setdefault("BOT_TOKEN", "123456:TESTTOKEN")
+
+test_dir = Path(__file__).resolve().parents[1]
+sys.path.append(str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+import broadcast  # noqa: E402  pylint: disable=wrong-import-position
+import metrics  # noqa: E402  pylint: disable=wrong-import-position
+from src import metrics as src_metrics  # noqa: E402  pylint: disable=wrong-import-position
+
+
+def _value(registry, name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_handler_middleware_times_handlers_and_counts_errors():
+    middleware = metrics.HandlerMetricsMiddleware()
+
+    async def show_qr(event, data):
+        return "ok"
+
+    async def broken(event, data):
+        raise ValueError("boom")
+
+    def data_for(callback):
+        return {"handler": SimpleNamespace(callback=callback)}
+
+    before = _value(metrics.REGISTRY, "bot_handler_seconds_count", handler="show_qr")
+    errors = _value(metrics.REGISTRY, "bot_handler_errors_total", handler="broken")
+
+    assert asyncio.run(middleware(show_qr, None, data_for(show_qr))) == "ok"
+    with pytest.raises(ValueError):
+        asyncio.run(middleware(broken, None, data_for(broken)))
+
+    assert _value(metrics.REGISTRY, "bot_handler_seconds_count", handler="show_qr") == before + 1
+    assert _value(metrics.REGISTRY, "bot_handler_errors_total", handler="broken") == errors + 1
+
+
+class FakePool:
+    def size(self):
+        return 20
+
+    def checkedout(self):
+        return 3
+
+    def checkedin(self):
+        return 5
+
+    def overflow(self):
+        return -12  # пул ещё не открыл все pool_size соединений
+
+
+def test_db_pool_collector_reads_engine_pool():
+    samples = {
+        (sample.name, tuple(sample.labels.values())): sample.value
+        for family in metrics.DbPoolCollector(SimpleNamespace(pool=FakePool())).collect()
+        for sample in family.samples
+    }
+
+    assert samples[("bot_db_pool_connections", ("checked_out",))] == 3
+    assert samples[("bot_db_pool_connections", ("idle",))] == 5
+    assert samples[("bot_db_pool_size", ())] == 20
+    assert samples[("bot_db_pool_overflow", ())] == 0
+    assert list(metrics.DbPoolCollector(object()).collect()) == []
+
+
+class FlakyBot:
+    def __init__(self, *errors):
+        self._errors = list(errors)
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if self._errors:
+            raise self._errors.pop(0)
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=1)
+
+
+def test_send_retry_records_sends_waits_and_forbidden(monkeypatch):
+    async def no_sleep(_delay):
+        return None
+
+    monkeypatch.setattr(broadcast.asyncio, "sleep", no_sleep)
+    registry = src_metrics.REGISTRY
+    method = SendMessage(chat_id=1, text="hi")
+    sent = _value(registry, "bot_telegram_sends_total", result="sent")
+    forbidden = _value(registry, "bot_telegram_sends_total", result="forbidden")
+    waited = _value(registry, "bot_telegram_retry_after_seconds_sum")
+
+    flaky = FlakyBot(TelegramRetryAfter(method=method, message="flood", retry_after=7))
+    asyncio.run(broadcast._send_message_with_retry(flaky, 1, "hi", None))
+    with pytest.raises(TelegramForbiddenError):
+        asyncio.run(
+            broadcast._send_message_with_retry(
+                FlakyBot(TelegramForbiddenError(method=method, message="blocked")), 2, "hi", None
+            )
+        )
+
+    assert _value(registry, "bot_telegram_sends_total", result="sent") == sent + 1
+    assert _value(registry, "bot_telegram_sends_total", result="forbidden") == forbidden + 1
+    assert _value(registry, "bot_telegram_retry_after_seconds_sum") == waited + 7
+
+
+def test_push_is_skipped_without_pushgateway(monkeypatch):
+    calls = []
+    monkeypatch.setattr(metrics, "PUSHGATEWAY_URL", "")
+    monkeypatch.setattr(metrics, "push_to_gateway", lambda *a, **kw: calls.append(kw))
+    metrics.push_metrics()
+    assert calls == []
+
+    monkeypatch.setattr(metrics, "PUSHGATEWAY_URL", "pushgateway:9091")
+    metrics.push_metrics()
+    assert calls[0]["registry"] is metrics.REGISTRY
+    assert calls[0]["grouping_key"] == {"instance": f"{socket.gethostname()}-main"}
+
+
+def test_group_follows_pool_index_and_is_deleted_on_shutdown(monkeypatch):
+    from billiard import process
+
+    pushed, deleted = [], []
+    monkeypatch.setattr(metrics, "PUSHGATEWAY_URL", "pushgateway:9091")
+    monkeypatch.setattr(metrics, "push_to_gateway", lambda *a, **kw: pushed.append(kw))
+    monkeypatch.setattr(metrics, "delete_from_gateway", lambda *a, **kw: deleted.append(kw))
+    monkeypatch.setattr(process.current_process(), "index", 3, raising=False)
+
+    metrics.push_metrics()
+    metrics.delete_pushed_metrics()
+
+    expected = {"instance": f"{socket.gethostname()}-3"}
+    assert pushed[0]["grouping_key"] == expected
+    assert deleted == [{"job": "celery", "grouping_key": expected, "timeout": 5}]
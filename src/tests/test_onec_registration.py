@@ -72,7 +72,14 @@ def test_send_customer_to_onec(monkeypatch):
 
     monkeypatch.setattr(onec_client, "upsert_onec_client_map", fake_upsert)
 
-    asyncio.run(send_customer_to_onec(session, user, referrer_id=2))
+    async def run_send():
+        client = onec_client.OneCClient()
+        try:
+            return await send_customer_to_onec(session, user, referrer_id=2, client=client)
+        finally:
+            await client.close()
+
+    assert asyncio.run(run_send()) is True
 
     assert called["upsert"] == (42, "GUID123")
     assert session.committed
@@ -84,6 +91,152 @@ def test_send_customer_to_onec(monkeypatch):
     assert payload["referrer_telegram_id"] == 2
     headers = called["headers"]
     assert headers["X-Api-Key"] == "api_key"
-    assert "X-Idempotency-Key" in headers
+    assert headers["X-Idempotency-Key"] == onec_client.customer_idempotency_key(1)
     assert "X-Timestamp" not in headers
     assert "X-Sign" not in headers
+
+
+def test_customer_idempotency_key_is_stable():
+    assert onec_client.customer_idempotency_key(7) == onec_client.customer_idempotency_key("7")
+    assert onec_client.customer_idempotency_key(7) != onec_client.customer_idempotency_key(8)
+
+
+class DummySessionFactory:
+    def __init__(self, user):
+        self.user = user
+
+    def __call__(self):
+        factory = self
+
+        class _Session(DummySession):
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, exc_type, exc, tb):
+                return False
+
+            async def get(self, model, pk):
+                return factory.user if factory.user.id == pk else None
+
+        return _Session()
+
+
+class MemoryStore:
+    """Таблица outbox в памяти: строки переживают пересоздание CustomerOutbox."""
+
+    def __init__(self):
+        self.rows = {}
+        self.added_with = []
+
+    async def add(self, session, user_id, referrer_id):
+        self.added_with.append(session)
+        job_id = len(self.rows) + 1
+        self.rows[job_id] = {"user_id": user_id, "referrer_id": referrer_id, "attempts": 0,
+                             "status": "pending", "due": 0.0}
+
+    async def claim(self, lease):
+        now = asyncio.get_running_loop().time()
+        for job_id, row in sorted(self.rows.items()):
+            if row["status"] == "pending" and row["due"] <= now:
+                row["due"] = now + lease
+                return onec_client.CustomerSyncJob(
+                    job_id, row["user_id"], row["referrer_id"], row["attempts"]
+                )
+        return None
+
+    async def done(self, job):
+        del self.rows[job.id]
+
+    async def retry(self, job, attempts, delay):
+        row = self.rows[job.id]
+        row["attempts"] = attempts
+        row["due"] = asyncio.get_running_loop().time() + delay
+
+    async def give_up(self, job, attempts):
+        self.rows[job.id].update(attempts=attempts, status="failed")
+
+
+def _outbox(user, store, **kwargs):
+    return onec_client.CustomerOutbox(
+        onec_client.OneCClient(),
+        DummySessionFactory(user),
+        store=store,
+        workers=1,
+        poll_interval=0.01,
+        base_delay=0,
+        **kwargs,
+    )
+
+
+async def _wait_until(predicate):
+    for _ in range(100):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+
+
+def _user():
+    user = CustomUser(
+        telegram_id=5,
+        qr_code="code",
+        registration_date=datetime(2025, 1, 1, tzinfo=timezone.utc),
+    )
+    user.id = 50
+    return user
+
+
+def test_outbox_retries_temporary_failures(monkeypatch):
+    user = _user()
+    store = MemoryStore()
+    results = [False, False, True]
+    calls = []
+
+    async def fake_send(session, sent_user, referrer_id=None, *, client=None):
+        calls.append((sent_user.id, referrer_id))
+        return results.pop(0)
+
+    monkeypatch.setattr(onec_client, "send_customer_to_onec", fake_send)
+
+    async def run_outbox():
+        outbox = _outbox(user, store, max_attempts=5)
+        outbox.start()
+        session = DummySession()
+        await outbox.enqueue(session, user.id, referrer_id=3)
+        assert store.added_with == [session]
+        await _wait_until(lambda: not store.rows)
+        await outbox.stop()
+
+    asyncio.run(run_outbox())
+
+    assert calls == [(50, 3)] * 3
+    assert store.rows == {}
+
+
+def test_outbox_jobs_survive_restart_and_give_up_after_max_attempts(monkeypatch):
+    user = _user()
+    store = MemoryStore()
+    calls = []
+
+    async def failing_send(session, sent_user, referrer_id=None, *, client=None):
+        calls.append(sent_user.id)
+        return False
+
+    monkeypatch.setattr(onec_client, "send_customer_to_onec", failing_send)
+
+    async def enqueue_then_stop():
+        outbox = _outbox(user, store)
+        await outbox.enqueue(DummySession(), user.id)
+        await outbox.stop()
+
+    async def restart():
+        outbox = _outbox(user, store, max_attempts=2)
+        outbox.start()
+        await _wait_until(lambda: store.rows[1]["status"] == "failed")
+        await outbox.stop()
+
+    asyncio.run(enqueue_then_stop())
+    assert calls == [] and store.rows[1]["status"] == "pending"
+    asyncio.run(restart())
+
+    assert calls == [50, 50]
+    assert store.rows[1]["attempts"] == 2
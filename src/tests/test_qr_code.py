@@ -1,46 +1,51 @@
+import asyncio
 import sys
+import threading
 from pathlib import Path
 
-import pytest
-
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 import qr_code
 
 
-@pytest.fixture()
-def tmp_media(monkeypatch, tmp_path):
-    media_root = tmp_path / "media"
-    qr_dir = media_root / "qr_codes"
-    qr_dir.mkdir(parents=True)
-    monkeypatch.setattr(qr_code, "MEDIA_ROOT", media_root, raising=False)
-    monkeypatch.setattr(qr_code, "QR_DIR", qr_dir, raising=False)
-    return qr_dir
-
-
 def test_qr_code_filename_and_url():
     assert qr_code.qr_code_filename(42) == "user_42.png"
     assert qr_code.qr_code_media_url_from_filename("user_42.png") == "/media/qr_codes/user_42.png"
-    assert qr_code.get_telegram_id_from_filename("qr_42.png") == 42
-    assert qr_code.get_telegram_id_from_filename("user_42.png") == 42
+    assert qr_code.qr_code_url(42) == "/media/qr_codes/user_42.png"
+    assert qr_code.qr_payload("42") == "42"
+
+
+def test_render_qr_code_returns_png_bytes():
+    png = qr_code.render_qr_code(7)
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+
+
+def test_render_qr_code_is_cached():
+    qr_code._render_png.cache_clear()
+
+    first = qr_code.render_qr_code(8)
+    second = qr_code.render_qr_code(8)
+
+    assert first is second
+    info = qr_code._render_png.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+
 
+def test_render_qr_code_async_runs_in_executor(monkeypatch):
+    threads = []
 
-def test_generate_qr_code_creates_file(tmp_media):
-    url = qr_code.generate_qr_code("payload", telegram_id=7)
-    path, normalized = qr_code.resolve_qr_code_path(url, telegram_id=7)
-    assert normalized == "/media/qr_codes/user_7.png"
-    assert path.exists()
-    assert path.read_bytes()  # файл не пустой
+    def fake_render(data):
+        threads.append(threading.get_ident())
+        return b"png:" + data.encode()
 
+    monkeypatch.setattr(qr_code, "_render_png", fake_render)
 
-def test_resolve_legacy_filename(tmp_media):
-    legacy_path = qr_code.QR_DIR / "qr_55.png"
-    legacy_path.write_bytes(b"legacy")
+    async def run_test():
+        return threading.get_ident(), await qr_code.render_qr_code_async(9)
 
-    path, normalized = qr_code.resolve_qr_code_path("/media/qr_codes/qr_55.png")
+    loop_thread, png = asyncio.run(run_test())
 
-    assert normalized == "/media/qr_codes/user_55.png"
-    assert path.name == "user_55.png"
-    assert path.exists()
-    assert path.read_bytes() == b"legacy"
-    assert not legacy_path.exists()
+    assert png == b"png:9"
+    assert len(threads) == 1
+    assert threads[0] != loop_thread
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+os.environ.setdefault("BOT_TOKEN", "123456:TESTTOKEN")
+
+test_dir = Path(__file__).resolve().parents[1]
+sys.path.append(str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+import run  # noqa: E402  pylint: disable=wrong-import-position
+from database.models import CustomUser  # noqa: E402  pylint: disable=wrong-import-position
+
+
+class DummySession:
+    def __init__(self):
+        self.commits = 0
+
+    def add(self, obj):
+        pass
+
+    async def commit(self):
+        self.commits += 1
+
+
+class DummyMessage:
+    def __init__(self, *, reject_file_id=False):
+        self.photos = []
+        self._reject_file_id = reject_file_id
+
+    async def answer_photo(self, photo):
+        self.photos.append(photo)
+        if isinstance(photo, str) and self._reject_file_id:
+            raise TelegramBadRequest(method=None, message="wrong file identifier")
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id="FILE-1")])
+
+
+def test_cached_file_id_skips_upload(monkeypatch):
+    async def fail_render(telegram_id):  # pragma: no cover - must not be called
+        raise AssertionError("QR must not be rendered when file_id is cached")
+
+    monkeypatch.setattr(run, "render_qr_code_async", fail_render)
+    user = CustomUser(telegram_id=1, qr_code="/media/qr_codes/user_1.png", qr_file_id="FILE-0")
+    message = DummyMessage()
+    session = DummySession()
+
+    assert asyncio.run(run.send_qr_photo(session, message, user)) is True
+    assert message.photos == ["FILE-0"]
+    assert session.commits == 0
+
+
+def test_upload_stores_file_id_and_recovers_from_stale_id():
+    user = CustomUser(telegram_id=2, qr_code="/media/qr_codes/user_2.png", qr_file_id="STALE")
+    message = DummyMessage(reject_file_id=True)
+    session = DummySession()
+
+    assert asyncio.run(run.send_qr_photo(session, message, user)) is True
+    assert message.photos[0] == "STALE"
+    assert isinstance(message.photos[1], BufferedInputFile)
+    assert message.photos[1].filename == "user_2.png"
+    assert user.qr_file_id == "FILE-1"
+
+
+def test_legacy_qr_value_is_normalized_and_file_id_dropped():
+    user = CustomUser(telegram_id=3, qr_code="/app/media/qr_codes/qr_3.png", qr_file_id="OLD")
+    session = DummySession()
+
+    assert asyncio.run(run.ensure_qr_code(session, user)) == "/media/qr_codes/user_3.png"
+    assert user.qr_code == "/media/qr_codes/user_3.png"
+    assert user.qr_file_id is None
+    assert session.commits == 1